@@ -20,6 +20,7 @@
 import json
 import os
 import re
+import threading
 import time
 from datetime import datetime
 
@@ -29,10 +30,9 @@ ACCOUNTS_FILE = os.path.join(ARTBOT_DIR, "config", "accounts.json")
 
 
 def load_account(account_id: str) -> dict:
-    """加载账号配置"""
-    with open(ACCOUNTS_FILE) as f:
-        accounts = json.load(f).get("accounts", [])
-    acc = next((a for a in accounts if a.get("id") == account_id), None)
+    """加载账号配置（scripts/config_assets 缓存，按 id 索引）"""
+    from scripts import config_assets
+    acc = config_assets.get_account(account_id)
     if not acc:
         raise ValueError(f"账号不存在: {account_id}")
     return acc
@@ -40,16 +40,8 @@ def load_account(account_id: str) -> dict:
 
 def _load_writing_style(style_id: str) -> dict:
     """Load a writing style by id, returns dict with 'description' and/or 'articles'"""
-    styles_file = os.path.join(ARTBOT_DIR, "config", "writing_styles.json")
-    if not os.path.exists(styles_file):
-        return {}
-    try:
-        with open(styles_file) as f:
-            data = json.load(f)
-        ws = next((s for s in data.get("styles", []) if s.get("id") == style_id), None)
-        return ws or {}
-    except Exception:
-        return {}
+    from scripts import config_assets
+    return config_assets.get_writing_style(style_id)
 
 
 def _load_writing_style_articles(style_id: str) -> list:
@@ -323,7 +315,7 @@ def save_article(account_id: str, article_data: dict, theme: str = None,
 
     Returns: {"dirname", "html_path", "json_path", "preview_url", "title"}
     """
-    from scripts.html_renderer import render_article
+    from scripts.html_renderer import render_article_to_file
 
     acc = load_account(account_id)
     profile = acc.get("profile", {})
@@ -332,18 +324,16 @@ def save_article(account_id: str, article_data: dict, theme: str = None,
 
     dirname, outpath = make_output_dir(account_id)
 
-    # Render HTML
-    html = render_article(
+    # Render HTML (streamed into the file)
+    html_path = os.path.join(outpath, "article.html")
+    render_article_to_file(
+        html_path,
         title=article_data["title"],
         subtitle=article_data.get("subtitle", ""),
         sections=article_data.get("sections", []),
         theme=theme,
     )
 
-    html_path = os.path.join(outpath, "article.html")
-    with open(html_path, "w") as f:
-        f.write(html)
-
     # Save metadata
     meta = {
         **article_data,
@@ -439,11 +429,110 @@ def create_generation_task(account_id: str, keyword: str, theme: str = None,
     return task
 
 
+def _stream_article_with_prefetch(task: dict, article_prompt: str):
+    """Stream the article completion and prefetch images once title/digest arrive.
+
+    Returns (raw_text, prefetched, pool, staging_dir); prefetched maps
+    (kind, prompt) -> Future as expected by pipeline.execute_pipeline(prefetched_images=...).
+    """
+    from scripts import config
+    from scripts.json_stream import ArticleStreamParser
+    from scripts.llm import chat_stream
+
+    cfg = config.load_config()
+    prefetched: dict = {}
+    pool = None
+    staging_dir = ""
+    img_cfg, style_prefix, inline_count = {}, None, 0
+    if cfg.get("stream_prefetch_images", True):
+        acc = load_account(task["account_id"])
+        img_cfg = (acc.get("profile") or {}).get("image", {})
+        style_prefix = img_cfg.get("cover_prompt", "") or None
+        inline_count = task.get("inline_count", img_cfg.get("inline_count", 2))
+        staging_dir = os.path.join(OUTPUT_DIR, ".staging", task["task_id"])
+
+    parser = ArticleStreamParser()
+    chunks = []
+    try:
+        for delta in chat_stream(article_prompt, model="moonshot-v1-32k", temperature=0.7, max_tokens=3000):
+            chunks.append(delta)
+            parser.feed(delta)
+            if staging_dir and pool is None:
+                pool = _maybe_start_prefetch(task, parser, cfg, img_cfg, style_prefix, inline_count,
+                                             staging_dir, prefetched)
+    except Exception:
+        _release_prefetch(pool, staging_dir)
+        raise
+    return "".join(chunks), prefetched, pool, staging_dir
+
+
+def _maybe_start_prefetch(task, parser, cfg, img_cfg, style_prefix, inline_count, staging_dir, prefetched):
+    from concurrent.futures import ThreadPoolExecutor
+    from scripts.image_gen import generate_cover, generate_inline
+    from scripts.pipeline import auto_inline_prompt
+
+    title = parser.fields.get("title")
+    # digest follows title in the prompt schema; wait for it (or the first section)
+    if not title or ("digest" not in parser.fields and not parser.sections):
+        return None
+    digest = parser.fields.get("digest", "")
+    os.makedirs(staging_dir, exist_ok=True)
+    pool = ThreadPoolExecutor(max_workers=2)
+    cover_prompt = task.get("cover_prompt_template", "").replace("{title}", title).replace("{digest}", digest)
+    if cover_prompt:
+        prefetched[("cover", cover_prompt)] = pool.submit(
+            generate_cover, cover_prompt, staging_dir, style_prefix, fresh=bool(task.get("fresh_images")))
+    if inline_count and inline_count > 0:
+        header_prompt = auto_inline_prompt(title, img_cfg.get("inline_prompt", ""), cfg.get("image_style_prefix", ""))
+        prefetched[("inline", header_prompt)] = pool.submit(
+            generate_inline, header_prompt, staging_dir, 1, style_prefix, fresh=bool(task.get("fresh_images")))
+    return pool
+
+
+def _release_prefetch(pool, staging_dir: str) -> None:
+    """Drop prefetch images the pipeline did not use.
+
+    Jobs that have not started are cancelled; the staging dir is removed in the background
+    once the running ones finish, so neither the fallback chat() nor the task waits on them.
+    """
+    import shutil
+
+    if pool is None:
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    def _cleanup():
+        pool.shutdown(wait=True)
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    threading.Thread(target=_cleanup, name="prefetch-cleanup", daemon=True).start()
+
+
 def execute_generation_task(task: dict) -> dict:
     """执行一个生成任务：AI写文章 → 保存 → 生图 → 排版HTML
 
+    Text LLM calls of this task are collected in their own llm.metrics_context(), so
+    parallel tasks do not mix; the summary is returned as task["llm_metrics"].
+
     Returns: updated task dict with status="done" and output paths
     """
+    from scripts.llm import metrics_context
+
+    prefetch: list = []  # (pool, staging_dir) of stream-prefetched images, if any
+    try:
+        with metrics_context() as m:
+            done = _run_generation_task(task, prefetch)
+    finally:
+        for pool, staging_dir in prefetch:
+            _release_prefetch(pool, staging_dir)
+    done["llm_metrics"] = m.summary()
+    return done
+
+
+def _run_generation_task(task: dict, prefetch: list) -> dict:
     import re as _re
     from scripts.llm import chat
     from scripts.pipeline import execute_pipeline
@@ -520,14 +609,15 @@ def execute_generation_task(task: dict) -> dict:
         except Exception as e:
             search_meta = {"ok": False, "error": str(e), "hot_url": task.get("hot_url"), "hot_title": task.get("hot_title", "")}
 
-    # Reset per-article text LLM metrics so pipeline_debug can report clean counts.
+    # Stream the article: as soon as title/digest are complete, start the cover and the
+    # header inline image in the background (pipeline reuses them when prompts match).
+    prefetched, prefetch_pool, staging_dir = {}, None, ""
     try:
-        from scripts import llm as _llm
-        _llm.reset_metrics()
+        raw, prefetched, prefetch_pool, staging_dir = _stream_article_with_prefetch(task, article_prompt)
+        # released by execute_generation_task however the rest of this task ends
+        prefetch.append((prefetch_pool, staging_dir))
     except Exception:
-        pass
-
-    raw = chat(article_prompt, model="moonshot-v1-32k", temperature=0.7, max_tokens=3000)
+        raw = chat(article_prompt, model="moonshot-v1-32k", temperature=0.7, max_tokens=3000)
 
     # Prefer fenced json block if exists
     m = _re.search(r"```json\s*(\{.*?\})\s*```", raw, _re.DOTALL | _re.IGNORECASE)
@@ -748,7 +838,7 @@ def execute_generation_task(task: dict) -> dict:
         # Attach text LLM metrics (separate from image calls).
         try:
             from scripts import llm as _llm2
-            debug_extras.setdefault("metrics", {}).update(_llm2.get_metrics())
+            debug_extras.setdefault("metrics", {}).update(_llm2.get_metrics(include_calls=True))
         except Exception:
             pass
 
@@ -767,12 +857,20 @@ def execute_generation_task(task: dict) -> dict:
             wechat_appid=cred.get("appid"),
             wechat_secret=cred.get("secret"),
             debug_extras=debug_extras or None,
+            prefetched_images=prefetched or None,
+            fresh_images=bool(task.get("fresh_images")),
         )
         task["status"] = "done"
         task["dirname"] = dirname
         task["title"] = title
         task["preview_url"] = f"/art/api/preview/{dirname}"
         task["images"] = len(pip_result.get("images", []))
+        # Needed to push this article later as part of a multi-article draft (push_drafts_batched)
+        task["html_path"] = pip_result.get("html_path", "")
+        task["cover_media_id"] = pip_result.get("cover_media_id", "")
+        task["digest"] = digest
+        if pip_result.get("draft") is not None:
+            task["draft"] = pip_result["draft"]
         task["done_at"] = datetime.now().isoformat()
     except Exception as e:
         task["status"] = "error"
@@ -809,6 +907,56 @@ def execute_generation_task(task: dict) -> dict:
     return task
 
 
+def push_drafts_batched(tasks: list) -> list:
+    """把已完成的任务按账号合并成多图文草稿推送到公众号草稿箱。
+
+    One draft/add call per account (per 8 articles, see wechat_uploader.create_drafts)
+    instead of one per article. Each task gets task["draft"]:
+    {"media_id", "draft_url", "success", "index"} or {"success": False, "error"}.
+    Tasks that did not finish are left untouched.
+    """
+    from scripts.wechat_uploader import create_drafts, draft_article
+
+    by_account: dict[str, list] = {}
+    for task in tasks:
+        if task.get("status") != "done":
+            continue
+        if not task.get("cover_media_id"):
+            task["draft"] = {"success": False, "error": "cover_media_id 为空（图片上传失败），无法创建微信草稿"}
+            _update_task_status(task)
+            continue
+        by_account.setdefault(task.get("account_id", ""), []).append(task)
+
+    for account_id, group in by_account.items():
+        ready, articles = [], []
+        for t in group:
+            try:
+                with open(t["html_path"], encoding="utf-8") as f:
+                    html = f.read()
+            except Exception as e:
+                t["draft"] = {"success": False, "error": f"article.html 读取失败: {e}"}
+                _update_task_status(t)
+                continue
+            ready.append(t)
+            articles.append(draft_article(t.get("title", ""), html, t["cover_media_id"], t.get("digest", "")))
+        if not ready:
+            continue
+        try:
+            cred = load_account(account_id).get("credentials") or {}
+            drafts = create_drafts(articles, wechat_appid=cred.get("appid"), wechat_secret=cred.get("secret"))
+        except Exception as e:
+            drafts = [{"success": False, "error": str(e)} for _ in ready]
+        for t, d in zip(ready, drafts):
+            t["draft"] = d
+            try:
+                with open(os.path.join(OUTPUT_DIR, t["dirname"], "wechat_draft.json"), "w", encoding="utf-8") as f:
+                    json.dump(t["draft"], f, ensure_ascii=False, indent=2)
+            except Exception:
+                pass
+            _update_task_status(t)
+    return tasks
+
+
 def _update_task_status(task: dict):
     """Update a task's status in pending_tasks.json"""
     task_file = os.path.join(OUTPUT_DIR, "pending_tasks.json")
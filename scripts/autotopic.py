@@ -484,9 +484,8 @@ def run_autotopic(config: dict = None, accounts: list = None) -> dict:
             config = json.load(f)
     
     if accounts is None:
-        accounts_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "accounts.json")
-        with open(accounts_path) as f:
-            accounts = json.load(f).get("accounts", [])
+        from scripts.config_assets import get_accounts
+        accounts = get_accounts(mutable=True)
     
     mode = config.get("mode", "manual")
 
@@ -539,7 +538,7 @@ def run_autotopic(config: dict = None, accounts: list = None) -> dict:
             from scripts.article_service import build_title_prompt
             from scripts.llm import chat
             prompt = build_title_prompt(acc, topic_title, source_platform=source_platform)
-            out = chat(prompt, temperature=0.85, max_tokens=300)
+            out = chat(prompt, temperature=0.85, max_tokens=300, cache=False)
             import re
             lines = []
             for l in out.splitlines():
@@ -600,7 +599,7 @@ def run_autotopic(config: dict = None, accounts: list = None) -> dict:
 
 请输出 {count} 个标题："""
 
-            out = chat(prompt, temperature=0.9, max_tokens=700)
+            out = chat(prompt, temperature=0.9, max_tokens=700, cache=False)
             import re
             raw = []
             for l in out.splitlines():
@@ -673,18 +672,13 @@ def run_autotopic(config: dict = None, accounts: list = None) -> dict:
             return []
 
 
-    def _llm_daily_candidates_once(acc: dict, hot_for_prompt: list, hot_count: int, regular_count: int) -> list:
-        """Generate today's candidates with ONE LLM call per account.
-
-        Returns a list of candidate dicts with category=hot|bank.
-        """
+    def _daily_candidates_prompt(acc: dict, hot_for_prompt: list, hot_count: int, regular_count: int) -> str:
+        """Build today's one-call-per-account candidates prompt ("" when nothing to ask)."""
         total = max(0, int(hot_count or 0)) + max(0, int(regular_count or 0))
         if total <= 0:
-            return []
+            return ""
         try:
             from scripts.topic_banks import load_topic_bank, flatten_atoms
-            from scripts.llm import chat
-            import re
 
             ws = (acc.get('profile') or {}).get('writing_style') or {}
             domain = ws.get('domain', '')
@@ -704,14 +698,19 @@ def run_autotopic(config: dict = None, accounts: list = None) -> dict:
                     hot_lines.append('{} . {}（{}）'.format(i, title, src))
             hot_part = '\n'.join(hot_lines) if hot_lines else '（无）'
 
-            prompt = f"""你是一位{platform}内容创作者，请为账号生成今日候选标题：热点结合 {hot_count} 个 + 常规 {regular_count} 个。\n\n账号定位：\n- 领域：{domain}\n- 人设：{persona}\n- 读者：{audience}\n- 语气：{tone}\n\n今日热点（仅作灵感，不强制写进标题）：\n{hot_part}\n\n账号选题素材（用于生成具体、不空泛的标题）：\n- 痛点：{(atoms.get('problems') or [])[:10]}\n- 场景：{(atoms.get('scenes') or [])[:10]}\n- 冲突：{(atoms.get('conflicts') or [])[:10]}\n- 动作：{(atoms.get('actions') or [])[:10]}\n\n要求：\n1) 10-22字为主，口语化，有画面/情绪冲突\n2) 允许提问/反差：你以为/其实/到底/别再\n3) 禁止空泛句（快节奏时代/不难发现/越来越…）\n4) 每行一个标题，不要编号，不要解释，不要任何前后缀。\n\n必须严格输出可解析的JSON对象（不要Markdown/不要解释/不要多余文字），只输出JSON本体。
+            return f"""你是一位{platform}内容创作者，请为账号生成今日候选标题：热点结合 {hot_count} 个 + 常规 {regular_count} 个。\n\n账号定位：\n- 领域：{domain}\n- 人设：{persona}\n- 读者：{audience}\n- 语气：{tone}\n\n今日热点（仅作灵感，不强制写进标题）：\n{hot_part}\n\n账号选题素材（用于生成具体、不空泛的标题）：\n- 痛点：{(atoms.get('problems') or [])[:10]}\n- 场景：{(atoms.get('scenes') or [])[:10]}\n- 冲突：{(atoms.get('conflicts') or [])[:10]}\n- 动作：{(atoms.get('actions') or [])[:10]}\n\n要求：\n1) 10-22字为主，口语化，有画面/情绪冲突\n2) 允许提问/反差：你以为/其实/到底/别再\n3) 禁止空泛句（快节奏时代/不难发现/越来越…）\n4) 每行一个标题，不要编号，不要解释，不要任何前后缀。\n\n必须严格输出可解析的JSON对象（不要Markdown/不要解释/不要多余文字），只输出JSON本体。
 JSON必须包含两个字段：
 - hot: 数组，元素为对象，字段 original_title 与 title
 - regular: 字符串数组
 数量要求：hot=hot_count，regular=regular_count。
 """
+        except Exception:
+            return ""
 
-            out = chat(prompt, temperature=0.75, max_tokens=900)
+    def _parse_daily_candidates(out: str, hot_for_prompt: list, hot_count: int, regular_count: int) -> list:
+        """Parse the daily candidates LLM output into candidate dicts (category=hot|bank)."""
+        try:
+            import re
             import json as _json
             try:
                 data = _json.loads(out)
@@ -775,15 +774,37 @@ JSON必须包含两个字段：
             return []
 
 
+    # One-call strategy: generate today's titles with a single LLM call per account.
+    # This replaces per-hot rewrite (N calls) + bank brainstorming (1 call).
+    # The per-account calls are independent, so they run concurrently (chat_many):
+    # the whole morning run takes roughly the slowest account, not the sum.
+    plans = []
     for idx, acc in enumerate(enabled_accounts):
         label = labels[idx] if idx < len(labels) else str(idx)
-
-        # One-call strategy: generate today's titles with a single LLM call per account.
-        # This replaces per-hot rewrite (N calls) + bank brainstorming (1 call).
         hot_for_prompt = hot_items[:max(0, hot_title_count)] if hot_items else []
         regular_count = max(0, total_title_count - max(0, hot_title_count))
+        prompt = _daily_candidates_prompt(acc, hot_for_prompt, hot_title_count, regular_count)
+        plans.append((label, acc, hot_for_prompt, regular_count, prompt))
+
+    llm_outputs: dict[str, str] = {}
+    to_ask = [(label, prompt) for label, _, _, _, prompt in plans if prompt]
+    if to_ask:
+        try:
+            from scripts.llm import chat_many
+            batch = chat_many(
+                [{"prompt": p, "temperature": 0.75, "max_tokens": 900} for _, p in to_ask],
+                max_concurrency=int(config.get("llm_concurrency", 4) or 4),
+                timeout=config.get("llm_timeout") or None,
+            )
+            for (label, _), r in zip(to_ask, batch):
+                if r.ok:
+                    llm_outputs[label] = r.text
+        except Exception:
+            llm_outputs = {}
 
-        candidates = _llm_daily_candidates_once(acc, hot_for_prompt, hot_title_count, regular_count)
+    for label, acc, hot_for_prompt, regular_count, _ in plans:
+        out = llm_outputs.get(label)
+        candidates = _parse_daily_candidates(out, hot_for_prompt, hot_title_count, regular_count) if out else []
         if not candidates:
             # fallback: generate regular titles without LLM
             titles = _bank_titles_no_llm(acc, total_title_count)
@@ -2,6 +2,7 @@
 """统一配置管理"""
 import os
 import json
+import threading
 
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), "..", "config.json")
 
@@ -58,10 +59,166 @@ _defaults = {
     "llm_backend": "openclaw",
     "openclaw_agent_id": "writing",
     "openclaw_timeout": 90,
+    # Route moonshot calls to the smallest context window that fits (scripts/llm.py)
+    "llm_context_routing": True,
+    # Backend routing: "fixed" = always llm_backend; "adaptive" = healthiest backend
+    # (llm_backend preferred), slow calls spill over to the other one.
+    "llm_routing": {
+        "mode": "fixed",
+        "spillover_after": 60,
+        "min_samples": 5,
+        "max_error_rate": 0.5,
+    },
+    # Retry/backoff, per-backend circuit breaker and optional p95 hedging (scripts/resilience.py)
+    "llm_resilience": {
+        "retries": 2,
+        "base_delay": 0.5,
+        "max_delay": 8,
+        "breaker_threshold": 5,
+        "breaker_reset": 30,
+        "hedge": False,
+        "hedge_min_samples": 20,
+    },
+    # Resident openclaw agent-session workers (scripts/openclaw_session.py); needs "cmd", off by default
+    "openclaw_session": {
+        "enabled": False,
+        "cmd": None,
+        "pool_size": 2,
+        "ping_interval": 30,
+        "ping_timeout": 5,
+    },
+
+    # Shared keep-alive HTTP pool (scripts/http_pool.py)
+    "http_pool": {
+        "pool_size": 16,
+        "max_per_host": 4,
+        "idle_timeout": 60,
+    },
+
+    # Text LLM response cache (scripts/llm.py -> data/cache/llm/), off by default
+    "llm_cache": {
+        "enabled": False,
+        "ttl_seconds": 86400,
+        "max_bytes": 64 * 1024 * 1024,
+    },
+
+    # Cross-process rate limits per provider+credential (scripts/rate_limit.py)
+    "rate_limits": {
+        "max_wait": 30,
+        "moonshot": {"rps": 3, "tpm": 120000},
+        "hunyuan": {"rps": 2},
+    },
+
+    # Start cover/header image generation while the article is still streaming
+    "stream_prefetch_images": True,
+    # Max images (cover + inline) generated at the same time per article
+    "image_concurrency": 4,
+    # Max concurrent WeChat image uploads per article
+    "upload_concurrency": 4,
+    # Generated-image cache keyed by (full prompt, resolution, provider) -> data/cache/images/
+    "image_cache": {
+        "enabled": True,
+        "max_bytes": 512 * 1024 * 1024,
+    },
+    # Resize/recompress images before WeChat upload (scripts/image_opt.py, needs Pillow)
+    "image_opt": {
+        "enabled": True,
+        "max_width": 800,
+        "max_bytes": 300 * 1024,
+        "quality": 85,
+        "min_quality": 60,
+        "workers": 2,
+    },
+    # Hunyuan job polling (scripts/hunyuan_image.JobManager): adaptive interval bounds, per-job timeout
+    "hunyuan_poll": {
+        "min_interval": 2,
+        "max_interval": 10,
+        "factor": 1.5,
+        "max_wait": 120,
+    },
+    # Skip pipeline stages already completed with the same inputs (<output_dir>/run_journal.json)
+    "pipeline_resume": True,
+    # WeChat API backend: "native" (scripts/wechat_api.py, shared access_token cache) or "md2wechat"
+    "wechat_api": {
+        "backend": "native",
+        "base_url": "https://api.weixin.qq.com",
+        "timeout": 30,
+    },
+    # (appid, image sha256) -> uploaded media_id / url (scripts/media_cache.py)
+    "wechat_media_cache": {
+        "enabled": True,
+        "max_age_days": 90,
+    },
+}
+
+ENV_MAP = {
+    "WECHAT_APPID": "wechat_appid",
+    "WECHAT_SECRET": "wechat_secret",
+    "HUNYUAN_SECRET_ID": "hunyuan_secret_id",
+    "HUNYUAN_SECRET_KEY": "hunyuan_secret_key",
+    "HUNYUAN_REGION": "hunyuan_region",
+    "IMAGE_STYLE_PREFIX": "image_style_prefix",
+    "DEFAULT_THEME": "default_theme",
 }
 
-def load_config() -> dict:
-    """Load config: file overrides defaults, env vars override file."""
+
+class FrozenDict(dict):
+    """Read-only dict (still a dict for isinstance/json). Use thaw() for a mutable copy."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("config snapshot is read-only; use load_config(mutable=True) to edit")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class FrozenList(list):
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("config snapshot is read-only; use load_config(mutable=True) to edit")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def freeze(obj):
+    if isinstance(obj, dict):
+        return FrozenDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return FrozenList(freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj):
+    """Deep mutable copy of a (frozen) config value."""
+    if isinstance(obj, dict):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [thaw(v) for v in obj]
+    return obj
+
+
+# Cached snapshot: re-parsed only when config.json (mtime/size) or env overrides change.
+_CACHE = {"key": None, "cfg": None}
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_key():
+    try:
+        st = os.stat(CONFIG_FILE)
+        file_key = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        file_key = None
+    env_key = tuple(os.environ.get(k) for k in ENV_MAP)
+    return (file_key, env_key)
+
+
+def _load_uncached() -> dict:
     cfg = dict(_defaults)
     
     # Load from file
@@ -70,26 +227,41 @@ def load_config() -> dict:
             cfg.update(json.load(f))
     
     # Env overrides
-    env_map = {
-        "WECHAT_APPID": "wechat_appid",
-        "WECHAT_SECRET": "wechat_secret",
-        "HUNYUAN_SECRET_ID": "hunyuan_secret_id",
-        "HUNYUAN_SECRET_KEY": "hunyuan_secret_key",
-        "HUNYUAN_REGION": "hunyuan_region",
-        "IMAGE_STYLE_PREFIX": "image_style_prefix",
-        "DEFAULT_THEME": "default_theme",
-    }
-    for env_key, cfg_key in env_map.items():
+    for env_key, cfg_key in ENV_MAP.items():
         val = os.environ.get(env_key)
         if val:
             cfg[cfg_key] = val
     
     return cfg
 
+
+def load_config(mutable: bool = False) -> dict:
+    """Load config: file overrides defaults, env vars override file.
+
+    Returns a shared read-only snapshot, re-read only when config.json changes
+    (mtime/size), env overrides change or save_config() is called.
+    Pass mutable=True to get a private deep copy to edit and save.
+    """
+    key = _cache_key()
+    with _CACHE_LOCK:
+        if _CACHE["key"] != key or _CACHE["cfg"] is None:
+            _CACHE["cfg"] = freeze(_load_uncached())
+            _CACHE["key"] = key
+        cfg = _CACHE["cfg"]
+    return thaw(cfg) if mutable else cfg
+
+
+def invalidate_cache():
+    with _CACHE_LOCK:
+        _CACHE["key"] = None
+        _CACHE["cfg"] = None
+
+
 def save_config(cfg: dict):
     """Save config to file."""
     with open(CONFIG_FILE, "w") as f:
         json.dump(cfg, f, ensure_ascii=False, indent=2)
+    invalidate_cache()
 
 def get(key: str, default=None):
     return load_config().get(key, default)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Shared registry for account / writing-style / topic-bank config files.
+
+Why:
+- accounts.json, writing_styles.json and config/topic_banks/<id>.json were
+  re-opened and re-parsed on every load_account() / style lookup / web request,
+  and accounts were found with a linear scan.
+
+Each file is parsed once per process into a read-only snapshot (see
+scripts/config.py FrozenDict) with an id index, and re-parsed only when its
+mtime/size/inode changes. Writers in this process should call invalidate(path)
+after saving; other processes pick the change up through the stat check.
+
+Usage:
+    from scripts import config_assets
+    acc = config_assets.get_account("mp_chaguan")        # private mutable copy or None
+    for a in config_assets.get_accounts():               # read-only snapshot
+        ...
+    ws = config_assets.get_writing_style("warm")         # {} if missing
+    bank = config_assets.get_topic_bank("mp_chaguan")    # {"account_id":..., "banks": []} if missing
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+from scripts.config import freeze, thaw
+
+ARTBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACCOUNTS_FILE = os.path.join(ARTBOT_DIR, "config", "accounts.json")
+STYLES_FILE = os.path.join(ARTBOT_DIR, "config", "writing_styles.json")
+TOPIC_BANKS_DIR = os.path.join(ARTBOT_DIR, "config", "topic_banks")
+
+# path -> (stat key, frozen document, {id: frozen item})
+_CACHE: dict[str, tuple] = {}
+_LOCK = threading.Lock()
+
+
+def _stat_key(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _snapshot(path: str, list_key: str | None = None) -> tuple[dict, dict]:
+    """Return (frozen doc, id index) for a JSON file; {} if the file is missing.
+
+    Malformed JSON raises (ValueError) and is not cached, so a fixed file is
+    picked up on the next call.
+    """
+    path = os.path.abspath(path)
+    key = _stat_key(path)
+    with _LOCK:
+        hit = _CACHE.get(path)
+        if hit is not None and hit[0] == key:
+            return hit[1], hit[2]
+
+    doc: dict = {}
+    if key is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            doc = json.load(f) or {}
+    doc = freeze(doc if isinstance(doc, dict) else {})
+    index = {}
+    if list_key:
+        for item in doc.get(list_key) or []:
+            if isinstance(item, dict) and item.get("id"):
+                index.setdefault(str(item["id"]).strip(), item)
+
+    with _LOCK:
+        _CACHE[path] = (key, doc, index)
+    return doc, index
+
+
+def invalidate(path: str | None = None) -> None:
+    """Drop the cached snapshot for path (or all of them)."""
+    with _LOCK:
+        if path is None:
+            _CACHE.clear()
+        else:
+            _CACHE.pop(os.path.abspath(path), None)
+
+
+# ─── accounts ───
+
+def get_accounts_doc(mutable: bool = False) -> dict:
+    """Whole accounts.json document ({"accounts": [...]})."""
+    doc, _ = _snapshot(ACCOUNTS_FILE, "accounts")
+    doc = doc if "accounts" in doc else freeze({**doc, "accounts": []})
+    return thaw(doc) if mutable else doc
+
+
+def get_accounts(mutable: bool = False) -> list:
+    accounts = get_accounts_doc().get("accounts") or []
+    return thaw(accounts) if mutable else accounts
+
+
+def get_account(account_id: str) -> dict | None:
+    """O(1) lookup by id; returns a private mutable copy (callers may annotate it)."""
+    _, index = _snapshot(ACCOUNTS_FILE, "accounts")
+    acc = index.get((account_id or "").strip())
+    return thaw(acc) if acc is not None else None
+
+
+# ─── writing styles ───
+
+def get_writing_styles(mutable: bool = False) -> list:
+    doc, _ = _snapshot(STYLES_FILE, "styles")
+    styles = doc.get("styles") or []
+    return thaw(styles) if mutable else styles
+
+
+def get_writing_style(style_id: str) -> dict:
+    """Style dict ('description' and/or 'articles'), {} if missing or unreadable."""
+    try:
+        _, index = _snapshot(STYLES_FILE, "styles")
+    except Exception:
+        return {}
+    ws = index.get((style_id or "").strip())
+    return thaw(ws) if ws is not None else {}
+
+
+# ─── topic banks ───
+
+def topic_bank_path(account_id: str) -> str:
+    return os.path.join(TOPIC_BANKS_DIR, f"{account_id}.json")
+
+
+def get_topic_bank(account_id: str) -> dict:
+    """Topic bank for an account (mutable copy); empty bank if missing or unreadable."""
+    account_id = (account_id or "").strip()
+    empty = {"account_id": account_id, "banks": []}
+    if not account_id:
+        return empty
+    try:
+        doc, _ = _snapshot(topic_bank_path(account_id))
+    except Exception:
+        return empty
+    return thaw(doc) if doc else empty
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Content-addressed on-disk cache (data/cache/<namespace>/).
+
+- Keys are sha256 hashes of the inputs (see make_key).
+- Each entry is one file (<key>.bin) plus a small sidecar (<key>.meta.json)
+  holding created_at / expires_at.
+- LRU eviction by total bytes: hits touch the file mtime, eviction drops the
+  oldest mtimes first. Works across processes (plain files, atomic renames).
+
+Used by scripts/llm.py (text responses), scripts/image_gen.py (images),
+scripts/image_opt.py and scripts/media_cache.py. Reads are best-effort (any IO
+error is a cache miss); put / put_file raise OSError, which callers catch and
+ignore so a failed write never fails the caller.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any
+
+
+def _cache_root() -> str:
+    try:
+        from scripts.gzh_store import ensure_dirs
+        base = ensure_dirs()["data"]
+    except Exception:
+        base = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+    return os.path.join(base, "cache")
+
+
+def make_key(*parts: Any) -> str:
+    raw = json.dumps(list(parts), ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, namespace: str, max_bytes: int = 64 * 1024 * 1024,
+                 default_ttl: float | None = None, root: str | None = None):
+        self.dir = os.path.join(root or _cache_root(), namespace)
+        self.max_bytes = int(max_bytes)
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._approx_bytes: int | None = None
+
+    # -----------------
+    # Paths
+    # -----------------
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        d = os.path.join(self.dir, key[:2])
+        return os.path.join(d, f"{key}.bin"), os.path.join(d, f"{key}.meta.json")
+
+    def _read_meta(self, meta_path: str) -> dict:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _expired(self, meta_path: str) -> bool:
+        exp = self._read_meta(meta_path).get("expires_at")
+        return bool(exp) and time.time() > float(exp)
+
+    # -----------------
+    # Operations
+    # -----------------
+
+    def get_path(self, key: str) -> str | None:
+        """Return the entry file path on hit (and mark it recently used), else None."""
+        data_path, meta_path = self._paths(key)
+        if not os.path.exists(data_path):
+            return None
+        if self._expired(meta_path):
+            self.delete(key)
+            return None
+        try:
+            os.utime(data_path, None)
+        except OSError:
+            pass
+        return data_path
+
+    def get(self, key: str) -> bytes | None:
+        path = self.get_path(key)
+        if not path:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, data: bytes, ttl: float | None = None) -> str:
+        data_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        meta = {"created_at": now, "expires_at": (now + ttl) if ttl else None, "size": len(data)}
+        # Size of the entry being overwritten (if any), so the running total is not double-counted.
+        old_size = 0
+        if os.path.exists(data_path):
+            old_size = self._read_meta(meta_path).get("size")
+            if old_size is None:
+                try:
+                    old_size = os.path.getsize(data_path)
+                except OSError:
+                    old_size = 0
+
+        tmp = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, data_path)
+        tmp_meta = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_total()
+            else:
+                self._approx_bytes += len(data) - int(old_size)
+            over = self._approx_bytes > self.max_bytes
+        if over:
+            self.evict()
+        return data_path
+
+    def put_file(self, key: str, src_path: str, ttl: float | None = None) -> str:
+        """Store a copy of an existing file (e.g. a downloaded image)."""
+        with open(src_path, "rb") as f:
+            return self.put(key, f.read(), ttl)
+
+    def delete(self, key: str) -> None:
+        for p in self._paths(key):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        out = []
+        if not os.path.isdir(self.dir):
+            return out
+        for sub in os.listdir(self.dir):
+            d = os.path.join(self.dir, sub)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if not name.endswith(".bin"):
+                    continue
+                p = os.path.join(d, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                out.append((st.st_mtime, st.st_size, p))
+        return out
+
+    def _scan_total(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones until under max_bytes.
+
+        Returns the number of entries removed.
+        """
+        entries = self._entries()
+        removed = 0
+        kept = []
+        for mtime, size, p in entries:
+            key = os.path.basename(p)[:-len(".bin")]
+            if self._expired(self._paths(key)[1]):
+                self.delete(key)
+                removed += 1
+            else:
+                kept.append((mtime, size, p))
+        total = sum(size for _, size, _ in kept)
+        for mtime, size, p in sorted(kept):
+            if total <= self.max_bytes:
+                break
+            self.delete(os.path.basename(p)[:-len(".bin")])
+            total -= size
+            removed += 1
+        with self._lock:
+            self._approx_bytes = total
+        return removed
@@ -186,13 +186,8 @@ def cmd_write_one(args: argparse.Namespace) -> int:
             "output_dir": done.get("dirname", ""),
             "preview_url": done.get("preview_url", ""),
         }
-        metrics = {}
-        try:
-            # from pipeline_debug metrics etc.
-            from scripts.llm import get_metrics
-            metrics.update(get_metrics())
-        except Exception:
-            pass
+        # per-task text LLM metrics (execute_generation_task collects them)
+        metrics = dict(done.get("llm_metrics") or {})
 
         dedup = {}
         if topic_id:
@@ -9,7 +9,7 @@ from __future__ import annotations
 import json
 from typing import Any
 
-from scripts.llm import chat
+from scripts.llm import chat_many
 
 CATEGORY_LIST = [
     "亲密关系",
@@ -22,6 +22,10 @@ CATEGORY_LIST = [
     "社会热点解读",
 ]
 
+# Large batches are split into several independent prompts that run concurrently
+# (one 1800-token completion cannot hold 80+ items anyway).
+TOPICS_PER_CALL = 40
+
 
 TOPIC_GEN_PROMPT = """你是一个公众号主编，负责为账号批量产出“可写成爆款”的选题。
 
@@ -54,34 +58,7 @@ TOPIC_GEN_PROMPT = """你是一个公众号主编，负责为账号批量产出
 """
 
 
-def generate_topics(profile: dict[str, Any], category_prompts: dict[str, str], count: int = 80) -> list[dict[str, Any]]:
-    name = profile.get("name") or ""
-    audience = profile.get("audience") or ""
-    domain = profile.get("domain") or ""
-    persona = profile.get("persona") or ""
-    tone = profile.get("tone") or ""
-    title_style = (profile.get("title_config") or {}).get("style_desc") or ""
-
-    cp_lines = []
-    for cat in CATEGORY_LIST:
-        p = (category_prompts.get(cat) or "").strip()
-        if p:
-            cp_lines.append(f"### {cat}\n{p}\n")
-    category_prompts_text = "\n".join(cp_lines) if cp_lines else "（暂无沉淀，按账号风格与爆款结构常识生成）"
-
-    prompt = TOPIC_GEN_PROMPT.format(
-        name=name,
-        audience=audience,
-        domain=domain,
-        persona=persona,
-        tone=tone,
-        title_style=title_style,
-        category_prompts=category_prompts_text,
-        count=int(count),
-        categories="/".join(CATEGORY_LIST),
-    )
-
-    out = chat(prompt, temperature=0.6, max_tokens=1800)
+def _parse_topics(out: str, count: int) -> list[dict[str, Any]]:
     try:
         data = json.loads(out)
         items = data.get("items") or []
@@ -106,3 +83,65 @@ def generate_topics(profile: dict[str, Any], category_prompts: dict[str, str], c
     # fallback: treat as plain text list
     lines = [l.strip("-• ") for l in (out or "").splitlines() if l.strip()]
     return [{"title": l[:40], "category": "其他", "angle": "", "pain": ""} for l in lines[:count]]
+
+
+def generate_topics(profile: dict[str, Any], category_prompts: dict[str, str], count: int = 80,
+                    max_concurrency: int = 4) -> list[dict[str, Any]]:
+    name = profile.get("name") or ""
+    audience = profile.get("audience") or ""
+    domain = profile.get("domain") or ""
+    persona = profile.get("persona") or ""
+    tone = profile.get("tone") or ""
+    title_style = (profile.get("title_config") or {}).get("style_desc") or ""
+
+    cp_lines = []
+    for cat in CATEGORY_LIST:
+        p = (category_prompts.get(cat) or "").strip()
+        if p:
+            cp_lines.append(f"### {cat}\n{p}\n")
+    category_prompts_text = "\n".join(cp_lines) if cp_lines else "（暂无沉淀，按账号风格与爆款结构常识生成）"
+
+    count = int(count)
+    chunks = [TOPICS_PER_CALL] * (count // TOPICS_PER_CALL)
+    if count % TOPICS_PER_CALL:
+        chunks.append(count % TOPICS_PER_CALL)
+
+    prompts = []
+    for i, n in enumerate(chunks):
+        # Rotate the priority categories per chunk so parallel prompts don't overlap.
+        k = i % len(CATEGORY_LIST)
+        rotated = CATEGORY_LIST[k:] + CATEGORY_LIST[:k]
+        prompts.append({"prompt": TOPIC_GEN_PROMPT.format(
+            name=name,
+            audience=audience,
+            domain=domain,
+            persona=persona,
+            tone=tone,
+            title_style=title_style,
+            category_prompts=category_prompts_text,
+            count=n,
+            categories="/".join(rotated),
+        ), "n": n})
+
+    results = chat_many(
+        [{"prompt": p["prompt"]} for p in prompts],
+        max_concurrency=max_concurrency,
+        temperature=0.6,
+        max_tokens=1800,
+    )
+
+    errors = [r.error for r in results if not r.ok]
+    if len(errors) == len(results):
+        raise RuntimeError(errors[0] or "topic generation failed")
+
+    seen: set[str] = set()
+    merged: list[dict[str, Any]] = []
+    for p, r in zip(prompts, results):
+        if not r.ok:
+            continue
+        for it in _parse_topics(r.text, p["n"]):
+            if it["title"] in seen:
+                continue
+            seen.add(it["title"])
+            merged.append(it)
+    return merged[:count]
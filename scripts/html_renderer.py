@@ -1,7 +1,16 @@
 #!/usr/bin/env python3
 """HTML排版渲染模块 - 多主题支持"""
 import json
+import os
 import sys
+import threading
+from typing import Iterator
+
+# Separator between top-level blocks (header, sections, images, footer).
+SEP = "\n\n"
+
+# Width (px) of the image column in _image_block; scripts/image_opt.py resizes to it.
+IMAGE_DISPLAY_WIDTH = 800
 
 THEMES = {
     # === 经典卡片系列 ===
@@ -194,15 +203,20 @@ THEMES = {
 }
 
 
+def _card_parts(t: dict) -> tuple[str, str]:
+    return (f'''<section style="max-width: 800px; width: 100%; padding: 25px; background-color: {t['card_bg']}; border: 1px solid rgba(0,0,0,0.05); box-shadow: 0 10px 30px rgba(0,0,0,0.04), 0 0 15px {t['shadow']}; border-radius: 18px;">
+''', '''
+</section>''')
+
+
 def _card(content: str, t: dict) -> str:
-    return f'''<section style="max-width: 800px; width: 100%; padding: 25px; background-color: {t['card_bg']}; border: 1px solid rgba(0,0,0,0.05); box-shadow: 0 10px 30px rgba(0,0,0,0.04), 0 0 15px {t['shadow']}; border-radius: 18px;">
-{content}
-</section>'''
+    pre, post = _card_parts(t)
+    return pre + content + post
 
 
 def _image_block(url: str, caption: str = "") -> str:
     cap = f'\n<p style="color: rgba(0,0,0,0.3); font-size: 12px; margin-top: 8px;">{caption}</p>' if caption else ""
-    return f'''<section style="max-width: 800px; width: 100%; text-align: center; padding: 5px 0;">
+    return f'''<section style="max-width: {IMAGE_DISPLAY_WIDTH}px; width: 100%; text-align: center; padding: 5px 0;">
 <img src="{url}" style="max-width: 100%; border-radius: 12px; box-shadow: 0 4px 15px rgba(0,0,0,0.08);" />{cap}
 </section>'''
 
@@ -224,10 +238,121 @@ def _placeholder_img(width=800, height=400, label="", primary="#4a6fa5"):
     return f"data:image/svg+xml;base64,{encoded}"
 
 
-def render_article(title: str, subtitle: str, sections: list, images: list = None, theme: str = "snow-cold", cover_url: str | None = None, include_cover_in_body: bool = False) -> str:
+class _CompiledTheme:
+    """Theme-specific HTML fragments, built once per theme.
+
+    Every fragment is a (prefix, suffix) pair around article text, so rendering is
+    plain concatenation: no per-paragraph style f-strings or layout branches.
+    Paragraph fragments are keyed by margin-bottom ("16px", or "0" for the last one).
     """
-    渲染完整文章HTML
-    
+
+    __slots__ = ("open", "header", "header_mid", "subtitle", "header_post", "h2",
+                 "para", "strong", "item", "section", "footer", "placeholders")
+
+    def __init__(self, key: str, t: dict):
+        layout = t.get("layout", "card")
+        font = "'Noto Serif SC', 'Source Han Serif CN', Georgia, serif" if t.get("font_serif") else "-apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif"
+        rounded = t.get("rounded", "18px")
+        primary, accent, text = t["primary"], t["accent"], t["text"]
+
+        self.open = f'<div style="background-color: {t["bg"]}; padding: 40px 10px; font-family: {font}; font-size: 16px; line-height: 1.75; letter-spacing: 0.5px; display: flex; flex-direction: column; align-items: center; gap: {"24px" if layout == "minimal" else "40px"};">'
+
+        # Header = header + title + header_mid [+ subtitle[0] + subtitle + subtitle[1]] + header_post
+        self.header_mid = '</h1>\n'
+        # === GRADIENT layout: big gradient header ===
+        if layout == "gradient":
+            gradient = t.get("gradient", f"linear-gradient(135deg, {primary} 0%, {accent} 100%)")
+            self.header = f'''<section style="max-width: 800px; width: 100%; border-radius: {rounded}; overflow: hidden; box-shadow: 0 10px 40px {t['shadow']};">
+<div style="background: {gradient}; padding: 50px 40px; text-align: center;">
+<h1 style="font-size: 28px; font-weight: 800; color: #ffffff; margin: 0 0 12px 0; line-height: 1.4; text-shadow: 0 2px 10px rgba(0,0,0,0.2);">'''
+            self.subtitle = ('<p style="color: rgba(255,255,255,0.85); font-size: 15px; margin:0; font-style:italic;">', '</p>')
+            self.header_post = '\n</div></section>'
+        # === MAGAZINE layout: big title + left border ===
+        elif layout == "magazine":
+            bl = t.get("border_left", primary)
+            ts = t.get("title_size", "30px")
+            self.header = f'''<section style="max-width: 800px; width: 100%; border-left: 6px solid {bl}; padding: 30px 35px; background: {t['card_bg']}; border-radius: 0 {rounded} {rounded} 0; box-shadow: 0 8px 30px {t['shadow']};">
+<h1 style="font-size: {ts}; font-weight: 900; color: {primary}; margin: 0 0 16px 0; line-height: 1.3; letter-spacing: 1px;">'''
+            self.subtitle = (f'<p style="color: {accent}; font-size: 16px; margin: 0 0 16px 0; border-bottom: 1px solid rgba(255,255,255,0.1); padding-bottom: 16px; font-style: italic;">', '</p>')
+            self.header_post = '\n</section>'
+        # === MINIMAL layout: no card ===
+        elif layout == "minimal":
+            divider = t.get("divider", "1px solid #e0e0e0")
+            self.header = f'''<section style="max-width: 720px; width: 100%; padding: 20px 0;">
+<h1 style="font-size: 26px; font-weight: 700; color: {primary}; text-align: center; margin: 0 0 12px 0; line-height: 1.4;">'''
+            self.subtitle = (f'<p style="color: {accent}; text-align: center; font-size: 15px; margin: 0 0 20px 0; font-style: italic;">', '</p>')
+            self.header_post = f'\n<hr style="border: none; border-top: {divider}; margin: 0;">\n</section>'
+        # === XHS layout: rounded, emoji-friendly ===
+        elif layout == "xhs":
+            self.header = f'''<section style="max-width: 720px; width: 100%; background: {t['card_bg']}; border-radius: {rounded}; padding: 28px 24px; box-shadow: 0 8px 25px {t['shadow']};">
+<h1 style="font-size: 22px; font-weight: 800; color: {primary}; text-align: center; margin: 0 0 8px 0; line-height: 1.5;">'''
+            self.subtitle = (f'<p style="color: {accent}; text-align: center; font-size: 14px; margin: 0;">', '</p>')
+            self.header_post = '\n</section>'
+        # === CARD layout (default) ===
+        else:
+            card_pre, card_post = _card_parts(t)
+            self.header = card_pre + f'<h1 style="font-size: 24px; font-weight: 700; color: {primary}; text-align: center; margin-bottom: 20px; line-height: 1.4;">'
+            self.header_mid = '</h1>'
+            self.subtitle = (f'\n<blockquote style="background-color: {t["quote_bg"]}; border-left: 5px solid {primary}; padding: 15px 20px; margin: 20px 0; border-radius: 0 12px 12px 0;">\n<p style="color: {text}; margin: 0; font-style: italic;">',
+                             '</p>\n</blockquote>')
+            self.header_post = '\n<hr style="border: none; height: 1px; background-color: rgba(0,0,0,0.08); margin: 30px 0;">' + card_post
+
+        if layout == "magazine":
+            self.h2 = (f'<h2 style="font-size: 20px; font-weight: 800; color: {primary}; margin-bottom: 14px; letter-spacing: 0.5px;">', '</h2>\n')
+        elif layout == "minimal":
+            self.h2 = (f'<h2 style="font-size: 19px; font-weight: 600; color: {primary}; margin-bottom: 12px; margin-top: 8px;">', '</h2>\n')
+        elif layout == "xhs":
+            self.h2 = (f'<h2 style="font-size: 17px; font-weight: 700; color: {primary}; margin-bottom: 10px;">', '</h2>\n')
+        else:
+            self.h2 = (f'<h2 style="font-size: 20px; font-weight: 700; margin-bottom: 18px; padding-bottom: 10px; border-bottom: 1px dashed rgba(0,0,0,0.15);"><span style="color: {primary};">▶ </span><span style="color: {primary};">', '</span></h2>\n')
+
+        self.para, self.strong, self.item = {}, {}, {}
+        for mb in ("16px", "0"):
+            self.strong[mb] = (f'<p style="color: {text}; margin-bottom: {mb}; text-align: center; font-size: 18px;"><strong style="color: {accent};">', '</strong></p>\n')
+            self.item[mb] = (f'<ul style="color: {text}; margin-bottom: {mb}; padding-left: 20px;">\n<li style="margin-bottom: 8px;">', '</li>\n</ul>\n')
+            self.para[mb] = (f'<p style="color: {text}; margin-bottom: {mb};">', '</p>\n')
+
+        if layout == "minimal":
+            self.section = ('<section style="max-width: 720px; width: 100%; padding: 0 0;">', '</section>')
+        elif layout in ("magazine", "xhs"):
+            self.section = (f'''<section style="max-width: {'720px' if layout=='xhs' else '800px'}; width: 100%; {'border-left: 6px solid '+t.get("border_left",primary)+';' if layout=='magazine' else ''} padding: {'20px 24px' if layout=='xhs' else '20px 35px'}; background: {t['card_bg']}; border-radius: {'0 '+rounded+' '+rounded+' 0' if layout=='magazine' else rounded}; box-shadow: 0 4px 15px {t['shadow']};">''', '</section>')
+        else:
+            self.section = _card_parts(t)
+
+        end_color = "rgba(255,255,255,0.3)" if layout == "magazine" and "noir" in key else "rgba(0,0,0,0.2)"
+        self.footer = f'''<section style="max-width: 800px; width: 100%; text-align: center; padding: 15px;">
+<p style="color: {end_color}; font-size: 12px; margin: 0;">— END —</p>
+</section>'''
+
+        # Layout preview should show *inline* images (not cover-first)
+        self.placeholders = (
+            {"url": _placeholder_img(800, 400, "文中插图 1", primary), "caption": "与段落内容相关的辅助配图"},
+            {"url": _placeholder_img(800, 360, "文中插图 2", primary), "caption": "与段落内容相关的辅助配图"},
+        )
+
+
+# theme key -> (theme values it was built from, compiled fragments)
+_COMPILED: dict[str, tuple] = {}
+
+
+def _compiled_theme(theme: str) -> _CompiledTheme:
+    key = theme if theme in THEMES else "snow-cold"
+    t = THEMES[key]
+    # Rebuilt only if the THEMES entry is edited at runtime.
+    sig = tuple(sorted(t.items()))
+    hit = _COMPILED.get(key)
+    if hit is None or hit[0] != sig:
+        hit = (sig, _CompiledTheme(key, t))
+        _COMPILED[key] = hit
+    return hit[1]
+
+
+def iter_render_article(title: str, subtitle: str, sections: list, images: list = None, theme: str = "snow-cold", cover_url: str | None = None, include_cover_in_body: bool = False) -> Iterator[str]:
+    """
+    逐段渲染文章HTML（生成器）：页头、每个小节、每张插图、页尾各 yield 一次，
+    "".join(...) 与 render_article 的结果完全一致。适合边渲染边写文件 / 流式响应，
+    长文也不需要在内存里拼出整篇。
+
     Args:
         title: 文章标题
         subtitle: 开头引言/副标题
@@ -235,125 +360,100 @@ def render_article(title: str, subtitle: str, sections: list, images: list = Non
                   type: normal, list, quote, highlight
         images: [{"after_section": 0, "url": "...", "caption": "..."}]
         theme: 主题名
-    
-    Returns: 完整 HTML 字符串
+
+    Yields: HTML 片段（除第一段外都以 SEP 开头）
     """
-    t = THEMES.get(theme, THEMES["snow-cold"])
-    layout = t.get("layout", "card")
+    ct = _compiled_theme(theme)
     images = images or []
     image_map = {img["after_section"]: img for img in images}
 
     # Auto-insert placeholder images if none provided (for preview)
     if not images and len(sections) >= 2:
         # Insert after section 0 and after the middle section
-        mid = len(sections) // 2
-        # Layout preview should show *inline* images (not cover-first)
-        image_map[0] = {"url": _placeholder_img(800, 400, "文中插图 1", t["primary"]), "caption": "与段落内容相关的辅助配图"}
-        image_map[mid] = {"url": _placeholder_img(800, 360, "文中插图 2", t["primary"]), "caption": "与段落内容相关的辅助配图"}
-    
-    font = "'Noto Serif SC', 'Source Han Serif CN', Georgia, serif" if t.get("font_serif") else "-apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif"
-    rounded = t.get("rounded", "18px")
-
-    parts = [f'<div style="background-color: {t["bg"]}; padding: 40px 10px; font-family: {font}; font-size: 16px; line-height: 1.75; letter-spacing: 0.5px; display: flex; flex-direction: column; align-items: center; gap: {"24px" if layout == "minimal" else "40px"};">']
-    
-    # === GRADIENT layout: big gradient header ===
-    if layout == "gradient":
-        gradient = t.get("gradient", f"linear-gradient(135deg, {t['primary']} 0%, {t['accent']} 100%)")
-        parts.append(f'''<section style="max-width: 800px; width: 100%; border-radius: {rounded}; overflow: hidden; box-shadow: 0 10px 40px {t['shadow']};">
-<div style="background: {gradient}; padding: 50px 40px; text-align: center;">
-<h1 style="font-size: 28px; font-weight: 800; color: #ffffff; margin: 0 0 12px 0; line-height: 1.4; text-shadow: 0 2px 10px rgba(0,0,0,0.2);">{title}</h1>
-{f'<p style="color: rgba(255,255,255,0.85); font-size: 15px; margin:0; font-style:italic;">{subtitle}</p>' if subtitle else ''}
-</div></section>''')
-    # === MAGAZINE layout: big title + left border ===
-    elif layout == "magazine":
-        bl = t.get("border_left", t["primary"])
-        ts = t.get("title_size", "30px")
-        parts.append(f'''<section style="max-width: 800px; width: 100%; border-left: 6px solid {bl}; padding: 30px 35px; background: {t['card_bg']}; border-radius: 0 {rounded} {rounded} 0; box-shadow: 0 8px 30px {t['shadow']};">
-<h1 style="font-size: {ts}; font-weight: 900; color: {t['primary']}; margin: 0 0 16px 0; line-height: 1.3; letter-spacing: 1px;">{title}</h1>
-{f'<p style="color: {t["accent"]}; font-size: 16px; margin: 0 0 16px 0; border-bottom: 1px solid rgba(255,255,255,0.1); padding-bottom: 16px; font-style: italic;">{subtitle}</p>' if subtitle else ''}
-</section>''')
-    # === MINIMAL layout: no card ===
-    elif layout == "minimal":
-        divider = t.get("divider", "1px solid #e0e0e0")
-        parts.append(f'''<section style="max-width: 720px; width: 100%; padding: 20px 0;">
-<h1 style="font-size: 26px; font-weight: 700; color: {t['primary']}; text-align: center; margin: 0 0 12px 0; line-height: 1.4;">{title}</h1>
-{f'<p style="color: {t["accent"]}; text-align: center; font-size: 15px; margin: 0 0 20px 0; font-style: italic;">{subtitle}</p>' if subtitle else ''}
-<hr style="border: none; border-top: {divider}; margin: 0;">
-</section>''')
-    # === XHS layout: rounded, emoji-friendly ===
-    elif layout == "xhs":
-        parts.append(f'''<section style="max-width: 720px; width: 100%; background: {t['card_bg']}; border-radius: {rounded}; padding: 28px 24px; box-shadow: 0 8px 25px {t['shadow']};">
-<h1 style="font-size: 22px; font-weight: 800; color: {t['primary']}; text-align: center; margin: 0 0 8px 0; line-height: 1.5;">{title}</h1>
-{f'<p style="color: {t["accent"]}; text-align: center; font-size: 14px; margin: 0;">{subtitle}</p>' if subtitle else ''}
-</section>''')
-    # === CARD layout (default) ===
-    else:
-        header = f'<h1 style="font-size: 24px; font-weight: 700; color: {t["primary"]}; text-align: center; margin-bottom: 20px; line-height: 1.4;">{title}</h1>'
-        if subtitle:
-            header += f'\n<blockquote style="background-color: {t["quote_bg"]}; border-left: 5px solid {t["primary"]}; padding: 15px 20px; margin: 20px 0; border-radius: 0 12px 12px 0;">\n<p style="color: {t["text"]}; margin: 0; font-style: italic;">{subtitle}</p>\n</blockquote>'
-        header += f'\n<hr style="border: none; height: 1px; background-color: rgba(0,0,0,0.08); margin: 30px 0;">'
-        parts.append(_card(header, t))
+        image_map[0] = ct.placeholders[0]
+        image_map[len(sections) // 2] = ct.placeholders[1]
+
+    header = f"{ct.header}{title}{ct.header_mid}"
+    if subtitle:
+        header += f"{ct.subtitle[0]}{subtitle}{ct.subtitle[1]}"
+    yield ct.open
+    yield SEP + header + ct.header_post
 
     # Optional cover image (default off). WeChat draft uses thumb_media_id separately.
     if include_cover_in_body and cover_url:
-        parts.append(_image_block(cover_url, ""))
-    
+        yield SEP + _image_block(cover_url, "")
+
     # Insert first inline image right after header if provided (after_section == -1)
     if -1 in image_map:
         img = image_map[-1]
-        parts.append(_image_block(img["url"], img.get("caption", "")))
+        yield SEP + _image_block(img["url"], img.get("caption", ""))
 
     # Sections
+    h2_pre, h2_post = ct.h2
+    sec_pre, sec_post = ct.section
     for i, sec in enumerate(sections):
         sec_title = sec.get("title", "")
         paragraphs = sec.get("paragraphs", [])
-        
-        content = ""
+
+        content = [sec_pre]
         if sec_title:
-            if layout == "magazine":
-                content += f'<h2 style="font-size: 20px; font-weight: 800; color: {t["primary"]}; margin-bottom: 14px; letter-spacing: 0.5px;">{sec_title}</h2>\n'
-            elif layout == "minimal":
-                content += f'<h2 style="font-size: 19px; font-weight: 600; color: {t["primary"]}; margin-bottom: 12px; margin-top: 8px;">{sec_title}</h2>\n'
-            elif layout == "xhs":
-                content += f'<h2 style="font-size: 17px; font-weight: 700; color: {t["primary"]}; margin-bottom: 10px;">{sec_title}</h2>\n'
-            else:
-                content += f'<h2 style="font-size: 20px; font-weight: 700; margin-bottom: 18px; padding-bottom: 10px; border-bottom: 1px dashed rgba(0,0,0,0.15);"><span style="color: {t["primary"]};">▶ </span><span style="color: {t["primary"]};">{sec_title}</span></h2>\n'
-        
+            content.append(f"{h2_pre}{sec_title}{h2_post}")
+        last = len(paragraphs) - 1
         for j, p in enumerate(paragraphs):
-            is_last = j == len(paragraphs) - 1
-            mb = "0" if is_last else "16px"
-            
+            mb = "0" if j == last else "16px"
             if p.startswith("**") and p.endswith("**"):
-                text = p.strip("*")
-                content += f'<p style="color: {t["text"]}; margin-bottom: {mb}; text-align: center; font-size: 18px;"><strong style="color: {t["accent"]};">{text}</strong></p>\n'
+                pre, post = ct.strong[mb]
+                p = p.strip("*")
             elif p.startswith("- ") or p.startswith("• "):
-                content += f'<ul style="color: {t["text"]}; margin-bottom: {mb}; padding-left: 20px;">\n'
-                content += f'<li style="margin-bottom: 8px;">{p.lstrip("- •").strip()}</li>\n'
-                content += '</ul>\n'
+                pre, post = ct.item[mb]
+                p = p.lstrip("- •").strip()
             else:
-                content += f'<p style="color: {t["text"]}; margin-bottom: {mb};">{p}</p>\n'
-        
-        if layout == "minimal":
-            parts.append(f'<section style="max-width: 720px; width: 100%; padding: 0 0;">{content}</section>')
-        elif layout in ("magazine", "xhs"):
-            parts.append(f'''<section style="max-width: {'720px' if layout=='xhs' else '800px'}; width: 100%; {'border-left: 6px solid '+t.get("border_left",t["primary"])+';' if layout=='magazine' else ''} padding: {'20px 24px' if layout=='xhs' else '20px 35px'}; background: {t['card_bg']}; border-radius: {'0 '+rounded+' '+rounded+' 0' if layout=='magazine' else rounded}; box-shadow: 0 4px 15px {t['shadow']};">{content}</section>''')
-        else:
-            parts.append(_card(content, t))
-        
+                pre, post = ct.para[mb]
+            content.append(f"{pre}{p}{post}")
+        content.append(sec_post)
+        yield SEP + "".join(content)
+
         # Insert image after this section
         if i in image_map:
             img = image_map[i]
-            parts.append(_image_block(img["url"], img.get("caption", "")))
-    
-    # Footer
-    end_color = "rgba(255,255,255,0.3)" if layout == "magazine" and "noir" in theme else "rgba(0,0,0,0.2)"
-    parts.append(f'''<section style="max-width: 800px; width: 100%; text-align: center; padding: 15px;">
-<p style="color: {end_color}; font-size: 12px; margin: 0;">— END —</p>
-</section>''')
-    
-    parts.append('</div>')
-    
-    return "\n\n".join(parts)
+            yield SEP + _image_block(img["url"], img.get("caption", ""))
+
+    yield SEP + ct.footer
+    yield SEP + '</div>'
+
+
+def render_article(title: str, subtitle: str, sections: list, images: list = None, theme: str = "snow-cold", cover_url: str | None = None, include_cover_in_body: bool = False) -> str:
+    """
+    渲染完整文章HTML
+
+    Args:
+        title: 文章标题
+        subtitle: 开头引言/副标题
+        sections: [{"title": "段落标题", "paragraphs": ["p1", "p2"], "type": "normal"}]
+                  type: normal, list, quote, highlight
+        images: [{"after_section": 0, "url": "...", "caption": "..."}]
+        theme: 主题名
+
+    Returns: 完整 HTML 字符串
+    """
+    return "".join(iter_render_article(title, subtitle, sections, images, theme, cover_url, include_cover_in_body))
+
+
+def render_article_to_file(path: str, *args, **kwargs) -> str:
+    """Stream iter_render_article(*args, **kwargs) into path (atomic rename). Returns path."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for chunk in iter_render_article(*args, **kwargs):
+                f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return path
 
 
 def list_themes() -> dict:
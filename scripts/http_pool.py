@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Process-wide pooled HTTP client (keep-alive).
+
+Why:
+- urllib.request opens a fresh TCP/TLS connection for every call. One article run
+  makes several text calls (article / self-check / rewrite / titles), and the
+  morning autotopic run fans out across accounts, so handshakes add up.
+
+This module keeps idle `http.client` connections per (scheme, host, port) and
+reuses them. stdlib only (no requests/urllib3 dependency).
+
+Config (config.json, all optional):
+  "http_pool": {
+    "pool_size": 16,       # max idle connections kept across all hosts
+    "max_per_host": 4,     # max concurrent connections per host
+    "idle_timeout": 60     # seconds; older idle connections are dropped
+  }
+
+Usage:
+    from scripts.http_pool import get_pool
+    resp = get_pool().request("POST", url, body=b"...", headers={...}, timeout=30)
+    resp.raise_for_status()
+    data = resp.json()
+
+    # streamed to <path>.part, resumed with Range on retry, size/sha256 checked, atomic rename
+    get_pool().download(image_url, "cover.jpg", timeout=120, retries=3)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import http.client
+import json
+import os
+import ssl
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+from urllib.parse import urljoin, urlsplit
+
+
+# Errors that mean "the idle keep-alive connection was closed by the server".
+# Safe to retry once on a fresh connection.
+_STALE_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+class HTTPStatusError(RuntimeError):
+    """Raised by PooledResponse.raise_for_status() for 4xx/5xx responses."""
+
+    def __init__(self, status: int, url: str, body: bytes = b""):
+        self.status = status
+        self.url = url
+        self.body = body
+        super().__init__(f"HTTP {status} for {url}: {body[:300].decode('utf-8', errors='ignore')}")
+
+
+class DownloadError(RuntimeError):
+    """Download finished but failed validation (size / checksum), or gave up retrying."""
+
+
+_REDIRECTS = (301, 302, 303, 307, 308)
+
+
+@dataclass
+class PooledResponse:
+    status: int
+    url: str
+    headers: dict[str, str] = field(default_factory=dict)
+    data: bytes = b""
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return self.data.decode(encoding, errors="ignore")
+
+    def json(self) -> Any:
+        return json.loads(self.data)
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise HTTPStatusError(self.status, self.url, self.data)
+
+
+class HTTPPool:
+    def __init__(self, pool_size: int = 16, max_per_host: int = 4, idle_timeout: float = 60.0):
+        self.pool_size = max(0, int(pool_size))
+        self.max_per_host = max(1, int(max_per_host))
+        self.idle_timeout = float(idle_timeout)
+        self._lock = threading.Lock()
+        self._idle: dict[tuple, deque] = {}
+        self._slots: dict[tuple, threading.BoundedSemaphore] = {}
+        self._idle_total = 0
+        self._ssl_ctx = ssl.create_default_context()
+        # Simple counters (useful for debugging / tests)
+        self.stats = {"connections_opened": 0, "connections_reused": 0}
+
+    # -----------------
+    # Connection management
+    # -----------------
+
+    @staticmethod
+    def _split(url: str) -> tuple[tuple, str]:
+        u = urlsplit(url)
+        scheme = (u.scheme or "http").lower()
+        if scheme not in ("http", "https"):
+            raise ValueError(f"unsupported url scheme: {url}")
+        port = u.port or (443 if scheme == "https" else 80)
+        path = u.path or "/"
+        if u.query:
+            path += "?" + u.query
+        return (scheme, u.hostname or "", port), path
+
+    def _slot(self, key: tuple) -> threading.BoundedSemaphore:
+        with self._lock:
+            sem = self._slots.get(key)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.max_per_host)
+                self._slots[key] = sem
+            return sem
+
+    def _new_conn(self, key: tuple, timeout: float) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        self.stats["connections_opened"] += 1
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_ctx)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _take_idle(self, key: tuple) -> http.client.HTTPConnection | None:
+        now = time.monotonic()
+        with self._lock:
+            q = self._idle.get(key)
+            while q:
+                conn, last_used = q.pop()
+                self._idle_total -= 1
+                if now - last_used <= self.idle_timeout:
+                    self.stats["connections_reused"] += 1
+                    return conn
+                conn.close()
+        return None
+
+    def _put_idle(self, key: tuple, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if self._idle_total >= self.pool_size:
+                conn.close()
+                return
+            self._idle.setdefault(key, deque()).append((conn, time.monotonic()))
+            self._idle_total += 1
+
+    def close(self) -> None:
+        with self._lock:
+            for q in self._idle.values():
+                for conn, _ in q:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._idle.clear()
+            self._idle_total = 0
+
+    # -----------------
+    # Requests
+    # -----------------
+
+    @contextmanager
+    def stream(self, method: str, url: str, body: Any = None, headers: dict | None = None,
+               timeout: float = 30) -> Iterator[http.client.HTTPResponse]:
+        """Open a request and yield the raw http.client response.
+
+        The connection goes back to the pool only if the body was fully read.
+        Use this for large downloads / server-sent events; otherwise use request().
+        """
+        key, path = self._split(url)
+        sem = self._slot(key)
+        if not sem.acquire(timeout=timeout):
+            raise TimeoutError(f"http pool: no free connection slot for {key[1]} within {timeout}s")
+        conn = None
+        reusable = False
+        try:
+            # Only bytes/None bodies, or seekable file-like ones (rewound before the retry),
+            # can be replayed after a stale keep-alive connection.
+            start = body.tell() if hasattr(body, "read") and hasattr(body, "seek") else None
+            replayable = body is None or isinstance(body, (bytes, bytearray, str)) or start is not None
+            attempts = 2 if replayable else 1
+            resp = None
+            for attempt in range(attempts):
+                if attempt and start is not None:
+                    body.seek(start)
+                conn = self._take_idle(key)
+                reused = conn is not None
+                if conn is None:
+                    conn = self._new_conn(key, timeout)
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                try:
+                    conn.request(method, path, body=body, headers=headers or {})
+                    resp = conn.getresponse()
+                    break
+                except _STALE_ERRORS:
+                    conn.close()
+                    if not reused or attempt == attempts - 1:
+                        raise
+            yield resp
+            reusable = resp.isclosed() and not resp.will_close
+        finally:
+            if conn is not None:
+                if reusable:
+                    self._put_idle(key, conn)
+                else:
+                    conn.close()
+            sem.release()
+
+    def request(self, method: str, url: str, body: Any = None, headers: dict | None = None,
+                timeout: float = 30) -> PooledResponse:
+        with self.stream(method, url, body=body, headers=headers, timeout=timeout) as resp:
+            data = resp.read()
+            return PooledResponse(
+                status=resp.status,
+                url=url,
+                headers={k.lower(): v for k, v in resp.getheaders()},
+                data=data,
+            )
+
+
+    def download(self, url: str, path: str, timeout: float = 120, retries: int = 3,
+                 expected_size: int | None = None, sha256: str | None = None,
+                 chunk_size: int = 64 * 1024, max_redirects: int = 5) -> dict:
+        """Stream url into path via <path>.part and an atomic rename.
+
+        - interrupted transfers resume with a Range request (If-Range on the ETag, so a
+          changed object restarts from 0); servers that ignore Range just resend it all
+        - the final size is checked against Content-Length / Content-Range (and
+          expected_size), and the content against sha256 when given
+        - HTTP 4xx (other than 408/429) fails immediately; network errors and 5xx retry
+
+        Resumes only happen within one call: a <path>.part left by an earlier call (maybe
+        another URL / object) is discarded first, and the .part is removed on failure.
+
+        Returns {"path", "bytes", "sha256", "resumes"}.
+        """
+        part = f"{path}.part"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _unlink_quietly(part)
+        try:
+            return self._download(url, path, part, timeout, retries, expected_size, sha256,
+                                  chunk_size, max_redirects)
+        except BaseException:
+            _unlink_quietly(part)
+            raise
+
+    def _download(self, url: str, path: str, part: str, timeout: float, retries: int,
+                  expected_size: int | None, sha256: str | None, chunk_size: int,
+                  max_redirects: int) -> dict:
+        total: int | None = None
+        etag = ""
+        resumes = 0
+        last_error: BaseException | None = None
+        attempts = max(1, int(retries))
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(min(8.0, 0.5 * (2 ** (attempt - 1))))
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            headers = {}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+                if etag:
+                    headers["If-Range"] = etag
+            try:
+                target = url
+                for _ in range(max_redirects + 1):
+                    with self.stream("GET", target, headers=headers, timeout=timeout) as resp:
+                        if resp.status in _REDIRECTS and resp.getheader("Location"):
+                            resp.read()
+                            target = urljoin(target, resp.getheader("Location"))
+                            continue
+                        if resp.status == 416 and offset and total == offset:
+                            resp.read()  # .part already holds the whole object
+                            break
+                        if resp.status >= 400:
+                            err = HTTPStatusError(resp.status, target, resp.read())
+                            if resp.status == 416:
+                                os.remove(part)  # stale .part; start over next attempt
+                            if resp.status < 500 and resp.status not in (408, 416, 429):
+                                raise DownloadError(str(err)) from err
+                            raise err
+                        new_etag = resp.getheader("ETag") or ""
+                        if resp.status == 206:
+                            rng = (resp.getheader("Content-Range") or "").split()[-1]
+                            start = int(rng.split("-")[0]) if rng and rng[0].isdigit() else -1
+                            if start != offset:
+                                raise http.client.HTTPException(f"unexpected Content-Range {rng!r} for offset {offset}")
+                            size = rng.rsplit("/", 1)[-1]
+                            total = int(size) if size.isdigit() else total
+                            mode = "ab"
+                            resumes += 1
+                        else:
+                            length = resp.getheader("Content-Length")
+                            total = int(length) if length and length.isdigit() else None
+                            mode = "wb"
+                        etag = new_etag or etag
+                        with open(part, mode) as f:
+                            while True:
+                                chunk = resp.read(chunk_size)
+                                if not chunk:
+                                    break
+                                f.write(chunk)
+                        break
+                else:
+                    raise DownloadError(f"too many redirects for {url}")
+            except DownloadError:
+                raise
+            except (OSError, http.client.HTTPException, HTTPStatusError) as e:
+                last_error = e
+                continue
+
+            got = os.path.getsize(part)
+            if total is not None and got < total:
+                last_error = DownloadError(f"short read: {got}/{total} bytes")
+                continue
+            return self._finish_download(part, path, got, total, expected_size, sha256, resumes)
+        raise DownloadError(f"download failed after {attempts} attempts: {last_error}") from last_error
+
+    @staticmethod
+    def _finish_download(part: str, path: str, got: int, total: int | None, expected_size: int | None,
+                         sha256: str | None, resumes: int) -> dict:
+        def _fail(msg: str):
+            _unlink_quietly(part)
+            raise DownloadError(msg)
+
+        if total is not None and got != total:
+            _fail(f"size mismatch: got {got}, server said {total}")
+        if expected_size is not None and got != int(expected_size):
+            _fail(f"size mismatch: got {got}, expected {expected_size}")
+        h = hashlib.sha256()
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        if sha256 and digest != sha256.lower():
+            _fail(f"sha256 mismatch: got {digest}")
+        os.replace(part, path)
+        return {"path": path, "bytes": got, "sha256": digest, "resumes": resumes}
+
+
+def _unlink_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_POOL: HTTPPool | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> HTTPPool:
+    """Return the process-wide pool (created lazily from config.json)."""
+    global _POOL
+    if _POOL is not None:
+        return _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            try:
+                from scripts.config import get
+                opts = get("http_pool", None) or {}
+            except Exception:
+                opts = {}
+            _POOL = HTTPPool(
+                pool_size=opts.get("pool_size", 16),
+                max_per_host=opts.get("max_per_host", 4),
+                idle_timeout=opts.get("idle_timeout", 60),
+            )
+    return _POOL
+
+
+def reset_pool() -> None:
+    """Close idle connections and drop the shared pool (next get_pool() re-reads config)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+        _POOL = None
@@ -2,19 +2,48 @@
 """
 腾讯混元3.0图片生成
 API: aiart.tencentcloudapi.com / SubmitTextToImageProJob + QueryTextToImageProJob
+
+Jobs are polled by one shared JobManager thread per process: every outstanding
+JobId (from any caller/thread) is checked in the same loop, on an adaptive
+schedule (early checks around the observed completion-time quantiles, then
+geometric backoff), instead of a fixed 3s sleep per job.
+
+Errors raise HunyuanError (only the CLI main() exits).
+
+API calls and image downloads go through the shared keep-alive pool
+(scripts/http_pool.py); downloads stream to <path>.part, resume with Range and
+are size-checked before the atomic rename.
+
+Config (config.json):
+  "hunyuan_poll": {"min_interval": 2, "max_interval": 10, "factor": 1.5, "max_wait": 120}
+
+Usage:
+    mgr = get_job_manager()
+    jobs = mgr.submit_many([(prompt1, "1024:768"), (prompt2, "1024:1024")])
+    for job in mgr.as_completed(jobs):
+        print(job.index, job.url or job.error)
+    # or keep at most N jobs outstanding:
+    for job in mgr.submit_windowed(specs, max_active=4, timeout=180):
+        ...
 """
 
 import hashlib
 import hmac
 import json
 import os
-import subprocess
+import queue
 import sys
+import threading
 import time
-import urllib.request
-import urllib.error
+from collections import deque
 from datetime import datetime, timezone
 
+try:
+    from scripts.http_pool import get_pool
+except ImportError:  # run as a standalone script
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from scripts.http_pool import get_pool
+
 def _get_secret_id() -> str:
     return os.environ.get("HUNYUAN_SECRET_ID", "")
 
@@ -27,10 +56,22 @@ SERVICE = "aiart"
 VERSION = "2022-12-29"
 SUBMIT_ACTION = "SubmitTextToImageProJob"
 POLL_ACTION = "QueryTextToImageProJob"
-POLL_INTERVAL = 3
 MAX_WAIT = 120
 
 
+class HunyuanError(RuntimeError):
+    """Hunyuan API / job failure (callers fall back to a placeholder image)."""
+
+    def __init__(self, message: str, code: str = ""):
+        self.code = code
+        super().__init__(f"{code}: {message}" if code else message)
+
+
+def _raise_api_error(stage: str, err: dict):
+    raise HunyuanError(f"{stage} error: {err.get('Message') or json.dumps(err, ensure_ascii=False)}",
+                       code=str(err.get("Code") or ""))
+
+
 def sign_tc3(action, payload_str, timestamp):
     date = datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
     # Follow TencentCloud SDK's TC3 signing behavior: sign only content-type and host.
@@ -62,7 +103,19 @@ def sign_tc3(action, payload_str, timestamp):
     )
 
 
-def call_api(action, payload):
+def call_api(action, payload, rate_limited=True):
+    # Shared per-credential budget across web/cron processes (config "rate_limits.hunyuan").
+    # Status polls opt out: the JobManager already paces them, and charging them would
+    # starve submits while a batch is outstanding.
+    acquire = None
+    if rate_limited:
+        try:
+            from scripts.rate_limit import acquire
+        except ImportError:  # run as a standalone script
+            pass
+    if acquire is not None:
+        acquire("hunyuan", _get_secret_id())
+
     payload_str = json.dumps(payload)
     timestamp = int(time.time())
     auth = sign_tc3(action, payload_str, timestamp)
@@ -77,17 +130,11 @@ def call_api(action, payload):
         "X-TC-Region": REGION,
     }
 
-    req = urllib.request.Request(
-        f"https://{ENDPOINT}/", data=payload_str.encode("utf-8"),
-        headers=headers, method="POST",
-    )
-    try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            return json.loads(resp.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8")
-        print(f"API Error {e.code}: {body}", file=sys.stderr)
-        sys.exit(1)
+    resp = get_pool().request("POST", f"https://{ENDPOINT}/", body=payload_str.encode("utf-8"),
+                              headers=headers, timeout=30)
+    if resp.status >= 400:
+        raise HunyuanError(f"API Error {resp.status}: {resp.text()[:300]}", code=f"HTTP{resp.status}")
+    return resp.json()
 
 
 def submit_job(prompt, resolution="1024:1024"):
@@ -100,60 +147,282 @@ def submit_job(prompt, resolution="1024:1024"):
     result = call_api(SUBMIT_ACTION, payload)
     resp = result.get("Response", {})
     if "Error" in resp:
-        print(f"Submit error: {json.dumps(resp['Error'], ensure_ascii=False)}", file=sys.stderr)
-        sys.exit(1)
+        _raise_api_error("Submit", resp["Error"])
     job_id = resp.get("JobId")
     if not job_id:
-        print(f"No JobId: {json.dumps(resp)}", file=sys.stderr)
-        sys.exit(1)
+        raise HunyuanError(f"No JobId: {json.dumps(resp)[:300]}")
     return job_id
 
 
-def poll_job(job_id):
-    waited = 0
-    while waited < MAX_WAIT:
-        time.sleep(POLL_INTERVAL)
-        waited += POLL_INTERVAL
-        result = call_api(POLL_ACTION, {"JobId": job_id})
-        resp = result.get("Response", {})
-        if "Error" in resp:
-            print(f"Poll error: {json.dumps(resp['Error'], ensure_ascii=False)}", file=sys.stderr)
-            sys.exit(1)
-        status = resp.get("JobStatusCode")
-        if status == "5":  # completed
-            urls = resp.get("ResultImage", [])
-            if urls:
-                return urls[0]
-            details = resp.get("ResultDetails", [])
-            if details and details[0].get("Url"):
-                return details[0]["Url"]
-            print(f"Done but no URL: {json.dumps(resp)}", file=sys.stderr)
-            sys.exit(1)
-        elif status in ("-1", "6"):
-            print(f"Job failed: {json.dumps(resp, ensure_ascii=False)}", file=sys.stderr)
-            sys.exit(1)
-        print(f"  waiting... ({waited}s, status={status})", file=sys.stderr)
-    print("Timeout", file=sys.stderr)
-    sys.exit(1)
+def query_job(job_id) -> str | None:
+    """One status check: image URL when done, None while running; raises HunyuanError on failure."""
+    result = call_api(POLL_ACTION, {"JobId": job_id}, rate_limited=False)
+    resp = result.get("Response", {})
+    if "Error" in resp:
+        _raise_api_error("Poll", resp["Error"])
+    status = resp.get("JobStatusCode")
+    if status == "5":  # completed
+        urls = resp.get("ResultImage", [])
+        if urls:
+            return urls[0]
+        details = resp.get("ResultDetails", [])
+        if details and details[0].get("Url"):
+            return details[0]["Url"]
+        raise HunyuanError(f"Done but no URL: {json.dumps(resp)[:300]}")
+    if status in ("-1", "6"):
+        raise HunyuanError(f"Job failed: {json.dumps(resp, ensure_ascii=False)[:300]}", code=f"status{status}")
+    return None
 
 
-def download(url, path, retries=3):
-    for attempt in range(retries):
+def _quantile(sorted_vals: list, q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+class Job:
+    __slots__ = ("index", "prompt", "resolution", "job_id", "submitted_at", "checks",
+                 "next_check", "url", "error", "finished_at", "_done", "_lock", "_callbacks", "_query_errors")
+
+    def __init__(self, prompt: str, resolution: str, index: int = 0):
+        self.index = index
+        self.prompt = prompt
+        self.resolution = resolution
+        self.job_id = ""
+        self.submitted_at = time.monotonic()
+        self.checks = 0
+        self.next_check = 0.0
+        self.url: str | None = None
+        self.error: BaseException | None = None
+        self.finished_at: float | None = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: list = []
+        self._query_errors = 0
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self, timeout: float | None = None) -> str:
+        """Image URL (blocks); raises the job's HunyuanError."""
+        if not self._done.wait(timeout):
+            raise HunyuanError(f"Timeout waiting for job {self.job_id}", code="Timeout")
+        if self.error is not None:
+            raise self.error
+        return self.url
+
+    def add_done_callback(self, cb) -> None:
+        """cb(job) once the job finishes (immediately if it already has)."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(cb)
+                return
+        cb(self)
+
+    def _finish(self, url: str | None = None, error: BaseException | None = None) -> None:
+        with self._lock:
+            self.url, self.error = url, error
+            self.finished_at = time.monotonic()
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for cb in callbacks:
+            try:
+                cb(self)
+            except Exception:
+                pass
+
+
+class JobManager:
+    """Submit Hunyuan jobs up front and poll all outstanding JobIds in one background loop."""
+
+    def __init__(self, min_interval: float = 2.0, max_interval: float = 10.0, factor: float = 1.5,
+                 max_wait: float = MAX_WAIT, max_query_errors: int = 3):
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.factor = float(factor)
+        self.max_wait = float(max_wait)
+        self.max_query_errors = int(max_query_errors)
+        self._cond = threading.Condition()
+        self._pending: list[Job] = []
+        self._observed: deque = deque(maxlen=50)  # completion times (s) of recent jobs
+        self._thread: threading.Thread | None = None
+        self.stats = {"submitted": 0, "queries": 0, "completed": 0, "failed": 0}
+
+    # -----------------
+    # Scheduling
+    # -----------------
+
+    def _next_delay(self, job: Job, now: float) -> float:
+        """Check again at the next observed completion-time quantile, else back off geometrically."""
+        elapsed = now - job.submitted_at
+        with self._cond:
+            hist = sorted(self._observed)
+        if len(hist) >= 3:
+            for q in (0.25, 0.5, 0.75, 0.9):
+                left = _quantile(hist, q) - elapsed
+                if left >= self.min_interval:
+                    return min(left, self.max_interval)
+        return min(self.max_interval, self.min_interval * (self.factor ** job.checks))
+
+    def _track(self, job: Job) -> Job:
+        job.next_check = job.submitted_at + self._next_delay(job, job.submitted_at)
+        with self._cond:
+            self._pending.append(job)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="hunyuan-poll", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return job
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [j for j in self._pending if j.next_check <= now]
+                if not due:
+                    self._cond.wait(min(j.next_check for j in self._pending) - now)
+                    continue
+            for job in due:
+                self._check(job)
+
+    def _check(self, job: Job) -> None:
+        now = time.monotonic()
+        job.checks += 1
+        url, error = None, None
         try:
-            req = urllib.request.Request(url)
-            with urllib.request.urlopen(req, timeout=120) as resp:
-                with open(path, "wb") as f:
-                    f.write(resp.read())
-            return
+            with self._cond:
+                self.stats["queries"] += 1
+            url = query_job(job.job_id)
+        except HunyuanError as e:
+            error = e
         except Exception as e:
-            print(f"  Download attempt {attempt+1} failed: {e}", file=sys.stderr)
-            if attempt < retries - 1:
-                time.sleep(3)
+            # network hiccup: retry on the next tick, give up after a few in a row
+            job._query_errors += 1
+            if job._query_errors >= self.max_query_errors:
+                error = HunyuanError(f"Poll failed: {e}", code="PollError")
+        else:
+            job._query_errors = 0
+
+        now = time.monotonic()
+        if url is None and error is None and now - job.submitted_at >= self.max_wait:
+            error = HunyuanError(f"Timeout after {self.max_wait:.0f}s", code="Timeout")
+        if url is None and error is None:
+            job.next_check = now + self._next_delay(job, now)
+            return
+
+        with self._cond:
+            if job in self._pending:
+                self._pending.remove(job)
+            if url is not None:
+                self._observed.append(now - job.submitted_at)
+                self.stats["completed"] += 1
             else:
-                result = subprocess.run(["curl", "-sL", "-o", path, "--max-time", "120", url],
-                                       capture_output=True, timeout=130)
-                if result.returncode != 0:
-                    raise Exception(f"Download failed after {retries} retries")
+                self.stats["failed"] += 1
+        job._finish(url, error)
+
+    # -----------------
+    # Public API
+    # -----------------
+
+    def submit(self, prompt: str, resolution: str = "1024:1024", index: int = 0) -> Job:
+        """Submit one job (raises HunyuanError if the submit itself fails)."""
+        job = Job(prompt, resolution, index)
+        job.job_id = submit_job(prompt, resolution)
+        job.submitted_at = time.monotonic()
+        with self._cond:
+            self.stats["submitted"] += 1
+        return self._track(job)
+
+    def track(self, job_id: str) -> Job:
+        """Poll an already submitted JobId."""
+        job = Job("", "")
+        job.job_id = job_id
+        return self._track(job)
+
+    def submit_many(self, specs: list) -> list[Job]:
+        """Submit [(prompt, resolution), ...] up front. A failed submit yields an already-failed Job."""
+        jobs = []
+        for i, (prompt, resolution) in enumerate(specs):
+            try:
+                jobs.append(self.submit(prompt, resolution, index=i))
+            except Exception as e:
+                job = Job(prompt, resolution, index=i)
+                job._finish(error=e if isinstance(e, HunyuanError) else HunyuanError(f"Submit failed: {e}"))
+                jobs.append(job)
+        return jobs
+
+    def as_completed(self, jobs: list[Job], timeout: float | None = None):
+        """Yield jobs as they finish (success or error); check job.url / job.error."""
+        q: queue.Queue = queue.Queue()
+        for job in jobs:
+            job.add_done_callback(q.put)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for _ in range(len(jobs)):
+            left = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                yield q.get(timeout=left)
+            except queue.Empty:
+                raise HunyuanError(f"Timeout after {timeout}s waiting for image jobs", code="Timeout")
+
+    def submit_windowed(self, specs: list, max_active: int | None = None, timeout: float | None = None):
+        """Submit [(prompt, resolution), ...] with at most max_active jobs outstanding, topping up
+        as jobs finish; yield each finished job (job.index = position in specs).
+
+        timeout bounds each wait for the next finished job.
+        """
+        q: queue.Queue = queue.Queue()
+        limit = max(1, int(max_active)) if max_active else max(1, len(specs))
+        submitted = 0
+
+        def _submit_next():
+            nonlocal submitted
+            job = self.submit_many([specs[submitted]])[0]
+            job.index = submitted
+            submitted += 1
+            job.add_done_callback(q.put)
+
+        while submitted < min(limit, len(specs)):
+            _submit_next()
+        for _ in range(len(specs)):
+            try:
+                job = q.get(timeout=timeout)
+            except queue.Empty:
+                raise HunyuanError(f"Timeout after {timeout}s waiting for image jobs", code="Timeout")
+            if submitted < len(specs):
+                _submit_next()
+            yield job
+
+
+_MANAGER: JobManager | None = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Process-wide manager (one poll loop for every caller)."""
+    global _MANAGER
+    if _MANAGER is not None:
+        return _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            try:
+                from scripts.config import get
+                opts = dict(get("hunyuan_poll", None) or {})
+            except Exception:  # run as a standalone script
+                opts = {}
+            _MANAGER = JobManager(**{k: v for k, v in opts.items()
+                                     if k in ("min_interval", "max_interval", "factor", "max_wait")})
+    return _MANAGER
+
+
+def poll_job(job_id):
+    """Wait for one JobId via the shared poll loop; returns the image URL."""
+    mgr = get_job_manager()
+    return mgr.track(job_id).result(timeout=mgr.max_wait + 30)
+
+
+def download(url, path, retries=3):
+    """Stream the result image to path (pooled connection, Range resume, size check)."""
+    return get_pool().download(url, path, timeout=120, retries=retries)
 
 
 def main():
@@ -166,10 +435,13 @@ def main():
     resolution = sys.argv[3] if len(sys.argv) > 3 else "1024:1024"
 
     print(f"[混元3.0] Generating: {prompt[:60]}...", file=sys.stderr)
-    job_id = submit_job(prompt, resolution)
-    print(f"Job: {job_id}", file=sys.stderr)
-
-    url = poll_job(job_id)
+    try:
+        job_id = submit_job(prompt, resolution)
+        print(f"Job: {job_id}", file=sys.stderr)
+        url = poll_job(job_id)
+    except HunyuanError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
     print(f"URL: {url[:80]}...", file=sys.stderr)
 
     download(url, output)
@@ -1,65 +1,118 @@
 #!/usr/bin/env python3
 """图片生成模块 - 封装混元3.0 API"""
 import os
+import shutil
 import sys
+import threading
 from . import config
-from .hunyuan_image import submit_job, poll_job, download
+from .disk_cache import DiskCache, make_key
+from .hunyuan_image import HunyuanError, submit_job, poll_job, download, get_job_manager
+from .singleflight import Group
 
-def generate_image(prompt: str, output_path: str, resolution="1024:1024", style_prefix=None) -> dict:
-    """生成单张图片。
+# In-flight generate_image() / generate_images() jobs keyed by (full prompt, resolution, provider).
+_INFLIGHT = Group()
 
-    - style_prefix: preferred from account profile (per-account)
-    - fallback to legacy global config.image_style_prefix
+IMAGE_PROVIDER = "hunyuan-3.0"
+_IMAGE_CACHE: DiskCache | None = None
+
+
+def _image_cache() -> DiskCache | None:
+    """Shared generated-image cache (data/cache/images/), or None when disabled."""
+    global _IMAGE_CACHE
+    opts = config.load_config().get("image_cache") or {}
+    if not opts.get("enabled", True):
+        return None
+    if _IMAGE_CACHE is None:
+        _IMAGE_CACHE = DiskCache("images", max_bytes=int(opts.get("max_bytes") or 512 * 1024 * 1024))
+    return _IMAGE_CACHE
 
-    Fallback behavior:
-    - If Hunyuan credentials are missing/invalid or API fails, generate a local placeholder JPG
-      so the pipeline can continue (HTML preview still works; WeChat upload may still fail).
-    """
 
-    def _parse_res(res: str) -> tuple[int, int]:
+def _image_key(full_prompt: str, resolution: str) -> str:
+    return make_key("image", full_prompt, resolution, IMAGE_PROVIDER)
+
+
+def _link_or_copy(src: str, dest: str) -> None:
+    """Hardlink src to dest (copy across filesystems), replacing dest atomically."""
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+def _cache_lookup(key: str, output_path: str, full_prompt: str) -> dict | None:
+    ic = _image_cache()
+    src = ic.get_path(key) if ic is not None else None
+    if not src:
+        return None
+    try:
+        _link_or_copy(src, output_path)
+    except OSError:
+        return None
+    print(f"[image_gen] Cache hit: {full_prompt[:60]}...", file=sys.stderr)
+    return {"success": True, "url": "", "path": output_path, "prompt": full_prompt, "cached": True}
+
+
+def _cache_store(key: str, res: dict) -> dict:
+    """Keep real (non-placeholder) images; the cache holds its own copy."""
+    ic = _image_cache()
+    if ic is not None and res.get("path") and not res.get("fallback"):
         try:
-            w, h = (res or "").split(":", 1)
-            return int(w), int(h)
-        except Exception:
-            return 1024, 1024
-
-    def _make_placeholder(path: str, res: str, text: str) -> None:
-        from PIL import Image, ImageDraw, ImageFont
-
-        w, h = _parse_res(res)
-        img = Image.new("RGB", (w, h), (245, 245, 245))
-        draw = ImageDraw.Draw(img)
-
-        # Basic typography: use default bitmap font (portable)
-        font = ImageFont.load_default()
-        pad = 24
-        msg = (text or "").strip()[:200]
-        msg = "[placeholder image]\n" + msg
-
-        # crude wrapping
-        lines = []
-        line = ""
-        for ch in msg:
-            if ch == "\n":
-                lines.append(line)
-                line = ""
-                continue
-            if len(line) >= 48:
-                lines.append(line)
-                line = ""
-            line += ch
-        if line:
+            ic.put_file(key, res["path"])
+        except OSError:
+            pass
+    return res
+
+
+def _parse_res(res: str) -> tuple[int, int]:
+    try:
+        w, h = (res or "").split(":", 1)
+        return int(w), int(h)
+    except Exception:
+        return 1024, 1024
+
+
+def _make_placeholder(path: str, res: str, text: str) -> None:
+    from PIL import Image, ImageDraw, ImageFont
+
+    w, h = _parse_res(res)
+    img = Image.new("RGB", (w, h), (245, 245, 245))
+    draw = ImageDraw.Draw(img)
+
+    # Basic typography: use default bitmap font (portable)
+    font = ImageFont.load_default()
+    pad = 24
+    msg = (text or "").strip()[:200]
+    msg = "[placeholder image]\n" + msg
+
+    # crude wrapping
+    lines = []
+    line = ""
+    for ch in msg:
+        if ch == "\n":
+            lines.append(line)
+            line = ""
+            continue
+        if len(line) >= 48:
             lines.append(line)
+            line = ""
+        line += ch
+    if line:
+        lines.append(line)
 
-        y = pad
-        for ln in lines[:18]:
-            draw.text((pad, y), ln, fill=(60, 60, 60), font=font)
-            y += 16
+    y = pad
+    for ln in lines[:18]:
+        draw.text((pad, y), ln, fill=(60, 60, 60), font=font)
+        y += 16
 
-        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        img.save(path, format="JPEG", quality=92)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    img.save(path, format="JPEG", quality=92)
 
-    cfg = config.load_config()
+
+def _prepare(prompt: str, output_path: str, resolution: str, style_prefix, cfg) -> str:
+    """Apply the style prefix / length clamp, log the image call; returns the full prompt."""
     if style_prefix is None:
         style_prefix = cfg.get("image_style_prefix", "")
 
@@ -75,6 +128,13 @@ def generate_image(prompt: str, output_path: str, resolution="1024:1024", style_
         full_prompt = full_prompt[:90]
 
     os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    # output_path may be a hardlink into the image cache (earlier hit); writers below
+    # open it in place, so detach it first.
+    try:
+        if os.stat(output_path).st_nlink > 1:
+            os.remove(output_path)
+    except OSError:
+        pass
 
     print(f"[image_gen] Generating: {full_prompt[:60]}...", file=sys.stderr)
 
@@ -89,63 +149,193 @@ def generate_image(prompt: str, output_path: str, resolution="1024:1024", style_
         })
     except Exception:
         pass
+    return full_prompt
 
+
+def _has_credentials(cfg) -> bool:
     # 设置环境变量供 hunyuan_image 使用
     os.environ.setdefault("HUNYUAN_SECRET_ID", cfg.get("hunyuan_secret_id", ""))
     os.environ.setdefault("HUNYUAN_SECRET_KEY", cfg.get("hunyuan_secret_key", ""))
+    return bool(os.environ.get("HUNYUAN_SECRET_ID") and os.environ.get("HUNYUAN_SECRET_KEY"))
+
+
+def _placeholder_result(output_path: str, resolution: str, full_prompt: str, reason: str, error: str = "") -> dict:
+    _make_placeholder(output_path, resolution, full_prompt)
+    res = {"success": True, "url": "", "path": output_path, "prompt": full_prompt, "fallback": reason}
+    if error:
+        res["error"] = error
+    return res
+
+
+def generate_image(prompt: str, output_path: str, resolution="1024:1024", style_prefix=None, fresh: bool = False) -> dict:
+    """生成单张图片。
+
+    - style_prefix: preferred from account profile (per-account)
+    - fallback to legacy global config.image_style_prefix
+
+    Fallback behavior:
+    - If Hunyuan credentials are missing/invalid or API fails, generate a local placeholder JPG
+      so the pipeline can continue (HTML preview still works; WeChat upload may still fail).
+    - Concurrent calls with the same prompt/resolution share one Hunyuan job.
+    - Real images are cached by (full prompt, resolution, provider) and reused across
+      articles (config "image_cache"); fresh=True skips the lookup for a new variation.
+    """
+    cfg = config.load_config()
+    full_prompt = _prepare(prompt, output_path, resolution, style_prefix, cfg)
+
+    key = _image_key(full_prompt, resolution)
+    if not fresh:
+        hit = _cache_lookup(key, output_path, full_prompt)
+        if hit is not None:
+            return hit
 
     # Fast path: missing creds -> placeholder
-    if not os.environ.get("HUNYUAN_SECRET_ID") or not os.environ.get("HUNYUAN_SECRET_KEY"):
-        _make_placeholder(output_path, resolution, full_prompt)
-        return {
-            "success": True,
-            "url": "",
-            "path": output_path,
-            "prompt": full_prompt,
-            "fallback": "placeholder_missing_hunyuan_credentials",
-        }
+    if not _has_credentials(cfg):
+        return _placeholder_result(output_path, resolution, full_prompt, "placeholder_missing_hunyuan_credentials")
+
+    # Concurrent requests for the same image share one Hunyuan job; followers get a copy.
+    res, shared = _INFLIGHT.do(
+        key,
+        lambda: _cache_store(key, _generate_hunyuan(full_prompt, output_path, resolution)),
+    )
+    if shared and res.get("path") and os.path.abspath(res["path"]) != os.path.abspath(output_path):
+        try:
+            shutil.copyfile(res["path"], output_path)
+            res = {**res, "path": output_path, "coalesced": True}
+        except OSError:
+            res = _generate_hunyuan(full_prompt, output_path, resolution)
+    return res
+
 
+def _generate_hunyuan(full_prompt: str, output_path: str, resolution: str) -> dict:
     try:
         job_id = submit_job(full_prompt, resolution)
         url = poll_job(job_id)
         download(url, output_path)
         return {"success": True, "url": url, "path": output_path, "prompt": full_prompt}
-    except SystemExit:
-        # hunyuan_image uses sys.exit(1) on API errors
-        _make_placeholder(output_path, resolution, full_prompt)
-        return {
-            "success": True,
-            "url": "",
-            "path": output_path,
-            "prompt": full_prompt,
-            "fallback": "placeholder_hunyuan_error",
-        }
+    except HunyuanError as e:
+        return _placeholder_result(output_path, resolution, full_prompt, "placeholder_hunyuan_error", str(e))
+    except Exception as e:
+        return _placeholder_result(output_path, resolution, full_prompt, "placeholder_exception", str(e))
+
+
+def generate_images(specs: list[dict], on_result=None, fresh: bool = False,
+                    max_concurrency: int | None = None) -> list[dict]:
+    """批量生图：任务提前提交，再由共享轮询循环等待，谁先完成先下载。
+
+    specs: [{"prompt", "output_path", "resolution"?, "style_prefix"?}, ...]
+    max_concurrency: at most this many Hunyuan jobs outstanding at once (None: submit all).
+    on_result(index, result) is called as each image finishes (completion order).
+    Returns results in spec order; every failed image falls back to a placeholder.
+    Cached images are served without a Hunyuan job unless fresh=True; an image already
+    being generated elsewhere in this process (same prompt/resolution) is shared.
+    """
+    cfg = config.load_config()
+    n = len(specs or [])
+    results: list = [None] * n
+    prepared = []
+    for spec in specs or []:
+        res = spec.get("resolution") or "1024:1024"
+        full = _prepare(spec.get("prompt", ""), spec["output_path"], res, spec.get("style_prefix"), cfg)
+        prepared.append((full, res, spec["output_path"]))
+
+    def _done(i, r):
+        results[i] = r
+        if on_result is not None:
+            try:
+                on_result(i, r)
+            except Exception:
+                pass
+
+    todo = []
+    for i, (full, res, path) in enumerate(prepared):
+        hit = None if fresh else _cache_lookup(_image_key(full, res), path, full)
+        if hit is not None:
+            _done(i, hit)
+        else:
+            todo.append(i)
+    if not todo:
+        return results
+
+    if not _has_credentials(cfg):
+        for i in todo:
+            full, res, path = prepared[i]
+            _done(i, _placeholder_result(path, res, full, "placeholder_missing_hunyuan_credentials"))
+        return results
+
+    # Leaders run a Hunyuan job; followers wait for the same image from another caller
+    # (or an earlier spec in this batch) and get a copy.
+    leaders, followers = [], []
+    for i in todo:
+        key = _image_key(*prepared[i][:2])
+        call, leader = _INFLIGHT.claim(key)
+        (leaders if leader else followers).append((i, key, call))
+
+    try:
+        if leaders:
+            mgr = get_job_manager()
+            try:
+                for job in mgr.submit_windowed([prepared[i][:2] for i, _, _ in leaders],
+                                               max_active=max_concurrency, timeout=mgr.max_wait + 60):
+                    idx, key, call = leaders[job.index]
+                    r = _download_job(job, *prepared[idx])
+                    _INFLIGHT.settle(key, call, value=r)
+                    _done(idx, r)
+            except HunyuanError as e:  # batch deadline passed
+                for idx, key, call in leaders:
+                    if results[idx] is None:
+                        full, res, path = prepared[idx]
+                        r = _placeholder_result(path, res, full, "placeholder_hunyuan_error", str(e))
+                        _INFLIGHT.settle(key, call, value=r)
+                        _done(idx, r)
+    finally:
+        for idx, key, call in leaders:
+            if not call.done.is_set():
+                _INFLIGHT.settle(key, call, error=HunyuanError("image batch aborted"))
+
+    for idx, _, call in followers:
+        full, res, path = prepared[idx]
+        try:
+            r = call.wait()
+            if r.get("path") and os.path.abspath(r["path"]) != os.path.abspath(path):
+                shutil.copyfile(r["path"], path)
+                r = {**r, "path": path, "coalesced": True}
+        except Exception as e:
+            r = _placeholder_result(path, res, full, "placeholder_exception", str(e))
+        _done(idx, r)
+    return results
+
+
+def _download_job(job, full_prompt: str, resolution: str, output_path: str) -> dict:
+    """Fetch a finished JobManager job into output_path (placeholder on failure)."""
+    try:
+        if job.error is not None:
+            raise job.error
+        download(job.url, output_path)
+        return _cache_store(_image_key(full_prompt, resolution),
+                            {"success": True, "url": job.url, "path": output_path, "prompt": full_prompt})
+    except HunyuanError as e:
+        return _placeholder_result(output_path, resolution, full_prompt, "placeholder_hunyuan_error", str(e))
     except Exception as e:
-        _make_placeholder(output_path, resolution, full_prompt)
-        return {
-            "success": True,
-            "url": "",
-            "path": output_path,
-            "prompt": full_prompt,
-            "fallback": "placeholder_exception",
-            "error": str(e),
-        }
-
-
-def generate_cover(prompt: str, output_dir: str, style_prefix=None, resolution: str | None = None) -> dict:
+        return _placeholder_result(output_path, resolution, full_prompt, "placeholder_exception", str(e))
+
+
+def generate_cover(prompt: str, output_dir: str, style_prefix=None, resolution: str | None = None,
+                   fresh: bool = False) -> dict:
     """生成封面图（横版）"""
     cfg = config.load_config()
     path = os.path.join(output_dir, "cover.jpg")
     res = resolution or cfg.get("cover_resolution", "1024:768")
-    return generate_image(prompt, path, res, style_prefix)
+    return generate_image(prompt, path, res, style_prefix, fresh=fresh)
 
 
-def generate_inline(prompt: str, output_dir: str, index: int, style_prefix=None, resolution: str | None = None) -> dict:
+def generate_inline(prompt: str, output_dir: str, index: int, style_prefix=None, resolution: str | None = None,
+                    fresh: bool = False) -> dict:
     """生成文中插图（方形）"""
     cfg = config.load_config()
     path = os.path.join(output_dir, f"inline_{index}.jpg")
     res = resolution or cfg.get("inline_resolution", "1024:1024")
-    return generate_image(prompt, path, res, style_prefix)
+    return generate_image(prompt, path, res, style_prefix, fresh=fresh)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Image optimization before WeChat upload (Pillow).
+
+Why:
+- Hunyuan images (and PIL placeholders) were uploaded at full resolution with
+  default JPEG settings: slow uploads, occasional size-limit rejections, slow
+  reader load times. The article body never shows them wider than
+  html_renderer.IMAGE_DISPLAY_WIDTH.
+
+Each image is:
+- resized down to max_width (aspect ratio kept, never upscaled)
+- re-encoded as progressive, optimized JPEG, stepping quality down until it fits
+  max_bytes (or min_quality is reached)
+- stripped of metadata (EXIF / ICC / comments are not carried over)
+
+Encoding runs in one shared, lazily created process pool (CPU bound; "spawn"
+workers, since callers are threaded and fork is unsafe there). Results are
+cached in data/cache/images_opt/ keyed by the source sha256 + settings, so
+re-runs and re-pushes skip the encode; "keep the original" decisions are cached
+too (as an empty entry). Pillow is imported lazily inside the workers; if it
+is missing, callers get an "error" entry and upload the original.
+
+Config (config.json):
+  "image_opt": {"enabled": true, "max_width": 800, "max_bytes": 307200,
+                "quality": 85, "min_quality": 60, "workers": 2}
+
+Usage:
+    from scripts.image_opt import optimize_images
+    out = optimize_images(["cover.jpg", "inline_1.jpg"])   # [{"path": "cover.web.jpg", ...}, ...]
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from scripts.disk_cache import DiskCache, make_key
+from scripts.html_renderer import IMAGE_DISPLAY_WIDTH
+
+DEFAULTS = {
+    "enabled": True,
+    "max_width": IMAGE_DISPLAY_WIDTH,
+    "max_bytes": 300 * 1024,
+    "quality": 85,
+    "min_quality": 60,
+    "workers": 2,
+}
+
+_CACHE: DiskCache | None = None
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def _opts() -> dict:
+    try:
+        from scripts.config import get
+        return {**DEFAULTS, **(get("image_opt", None) or {})}
+    except Exception:
+        return dict(DEFAULTS)
+
+
+def _cache() -> DiskCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = DiskCache("images_opt", max_bytes=128 * 1024 * 1024)
+    return _CACHE
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    """Shared encode pool, created on first use (sized by that first caller)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+def _reset_pool(broken: ProcessPoolExecutor) -> None:
+    """Drop a broken pool (a worker died) so the next call starts a fresh one."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is broken:
+            _POOL = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def optimized_path(src: str) -> str:
+    """cover.jpg -> cover.web.jpg (originals are kept for the run journal / previews)."""
+    stem, _ = os.path.splitext(src)
+    return f"{stem}.web.jpg"
+
+
+def _encode(src: str, max_width: int, max_bytes: int, quality: int, min_quality: int) -> tuple[bytes, int, int, int]:
+    """Worker: resize + progressive JPEG under the byte budget. Returns (data, width, height, quality)."""
+    from PIL import Image
+
+    with Image.open(src) as im:
+        im.load()
+        if im.mode not in ("RGB", "L"):
+            # flatten transparency onto white
+            rgba = im.convert("RGBA")
+            bg = Image.new("RGB", rgba.size, (255, 255, 255))
+            bg.paste(rgba, mask=rgba.split()[-1])
+            im = bg
+        w, h = im.size
+        if max_width and w > max_width:
+            im = im.resize((max_width, max(1, round(h * max_width / w))), Image.LANCZOS)
+        q = int(quality)
+        while True:
+            buf = io.BytesIO()
+            # No exif= / icc_profile= -> metadata is dropped.
+            im.save(buf, format="JPEG", quality=q, progressive=True, optimize=True)
+            data = buf.getvalue()
+            if len(data) <= max_bytes or q <= min_quality:
+                return data, im.size[0], im.size[1], q
+            q = max(int(min_quality), q - 7)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def optimize_images(paths: list[str], max_workers: int | None = None, **overrides) -> list[dict]:
+    """Optimize images (in order). Each entry is either
+    {"src", "path", "bytes", "src_bytes", "width", "height", "quality", "cached"} or
+    {"src", "path": src, "error"} (caller should upload the original).
+    """
+    opts = {**_opts(), **overrides}
+    paths = list(paths or [])
+    if not opts.get("enabled", True) or not paths:
+        return [{"src": p, "path": p, "skipped": True} for p in paths]
+
+    settings = (int(opts["max_width"]), int(opts["max_bytes"]), int(opts["quality"]), int(opts["min_quality"]))
+    results: list = [None] * len(paths)
+    todo = []
+    for i, src in enumerate(paths):
+        try:
+            key = make_key("image_opt", _sha256(src), *settings)
+        except OSError as e:
+            results[i] = {"src": src, "path": src, "error": str(e)}
+            continue
+        dest = optimized_path(src)
+        hit = _cache().get(key)
+        if hit == b"":
+            src_bytes = os.path.getsize(src)
+            results[i] = {"src": src, "path": src, "bytes": src_bytes, "src_bytes": src_bytes,
+                          "kept_original": True, "cached": True}
+            continue
+        if hit is not None:
+            try:
+                _write_atomic(dest, hit)
+                results[i] = {"src": src, "path": dest, "bytes": len(hit),
+                              "src_bytes": os.path.getsize(src), "cached": True}
+                continue
+            except OSError:
+                pass
+        todo.append((i, src, dest, key))
+
+    def _done(i, src, dest, key, fut_result=None, error=None):
+        if error is not None:
+            results[i] = {"src": src, "path": src, "error": str(error)}
+            return
+        data, w, h, q = fut_result
+        src_bytes = os.path.getsize(src)
+        if len(data) >= src_bytes:
+            # Already small enough: re-encoding would only cost quality.
+            try:
+                _cache().put(key, b"")
+            except OSError:
+                pass
+            results[i] = {"src": src, "path": src, "bytes": src_bytes, "src_bytes": src_bytes,
+                          "kept_original": True, "cached": False}
+            return
+        _write_atomic(dest, data)
+        try:
+            _cache().put(key, data)
+        except OSError:
+            pass
+        results[i] = {"src": src, "path": dest, "bytes": len(data), "src_bytes": src_bytes,
+                      "width": w, "height": h, "quality": q, "cached": False}
+
+    workers = max(1, min(int(max_workers or opts.get("workers") or 1), len(todo) or 1))
+    if workers == 1 or len(todo) <= 1:
+        for i, src, dest, key in todo:
+            try:
+                _done(i, src, dest, key, _encode(src, *settings))
+            except Exception as e:
+                _done(i, src, dest, key, error=e)
+        return results
+
+    ex = _pool(workers)
+    futs = [(ex.submit(_encode, src, *settings), i, src, dest, key) for i, src, dest, key in todo]
+    for fut, i, src, dest, key in futs:
+        try:
+            _done(i, src, dest, key, fut.result())
+        except BrokenProcessPool as e:
+            _reset_pool(ex)
+            _done(i, src, dest, key, error=e)
+        except Exception as e:
+            _done(i, src, dest, key, error=e)
+    return results
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Incremental parser for the streamed article JSON.
+
+The article prompt asks for:
+
+    ```json
+    {"title": "...", "digest": "...", "subtitle": "...", "sections": [{...}, {...}]}
+    ```
+
+While the completion is still streaming, ArticleStreamParser emits events as soon
+as each piece is complete, so downstream stages (cover prompt, inline image
+prompts) can start before the body is finished:
+
+    ("title", str) / ("digest", str) / ("subtitle", str)
+    ("section", dict)      # one per element of "sections", in order
+
+Anything before the first "{" (e.g. a ```json fence) is ignored. The parser never
+raises on malformed input; the caller still parses the full text at the end.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+SCALAR_KEYS = ("title", "digest", "subtitle")
+
+
+class ArticleStreamParser:
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.done = False
+        self.sections: list[dict] = []
+        self.fields: dict[str, str] = {}
+        # scanner state
+        self._stack: list[str] = []
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        self._expect_key = False
+        self._key: str | None = None
+        self._in_sections = False
+        self._sec_start = 0
+
+    def feed(self, delta: str) -> list[tuple[str, Any]]:
+        """Consume a streamed chunk and return the events it completed."""
+        events: list[tuple[str, Any]] = []
+        if self.done or not delta:
+            return events
+        self.buf += delta
+        buf = self.buf
+        i = self.pos
+        n = len(buf)
+        while i < n and not self.done:
+            c = buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    self._on_string(i, events)
+                i += 1
+                continue
+
+            if not self._stack:
+                if c == "{":
+                    self._stack.append("{")
+                    self._expect_key = True
+                i += 1
+                continue
+
+            if c == '"':
+                self._in_str = True
+                self._str_start = i
+            elif c in "{[":
+                if c == "[" and len(self._stack) == 1 and self._key == "sections":
+                    self._in_sections = True
+                elif c == "{" and self._in_sections and len(self._stack) == 2:
+                    self._sec_start = i
+                self._stack.append(c)
+            elif c in "}]":
+                if c == "}" and self._in_sections and len(self._stack) == 3:
+                    sec = self._loads(buf[self._sec_start:i + 1])
+                    if isinstance(sec, dict):
+                        self.sections.append(sec)
+                        events.append(("section", sec))
+                elif c == "]" and self._in_sections and len(self._stack) == 2:
+                    self._in_sections = False
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+            elif len(self._stack) == 1:
+                if c == ",":
+                    self._expect_key = True
+                elif c == ":":
+                    self._expect_key = False
+            i += 1
+        self.pos = i
+        return events
+
+    def _on_string(self, end: int, events: list) -> None:
+        if len(self._stack) != 1:
+            return
+        s = self._loads(self.buf[self._str_start:end + 1])
+        if not isinstance(s, str):
+            return
+        if self._expect_key:
+            self._key = s
+        elif self._key in SCALAR_KEYS and self._key not in self.fields:
+            self.fields[self._key] = s
+            events.append((self._key, s))
+
+    @staticmethod
+    def _loads(text: str) -> Any:
+        try:
+            # strict=False: tolerate raw control chars inside strings (seen in model output)
+            return json.loads(text, strict=False)
+        except Exception:
+            return None
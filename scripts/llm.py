@@ -13,35 +13,209 @@ LLM 调用中间层（artbot 同步调用）。
 - ARTBOT_LLM_BACKEND=moonshot|openclaw   (默认 moonshot)
 - ARTBOT_OPENCLAW_AGENT_ID=<agent_id>   (openclaw 后端下必填/建议；默认 main)
 - ARTBOT_OPENCLAW_TIMEOUT=60            (秒；默认 90)
+- config.json "openclaw_session": {"enabled": true, "cmd": [...], "pool_size": 2}
+  把请求发给常驻 agent 会话的 worker 进程（scripts/openclaw_session.py，需自备 cmd，默认关闭）；
+  worker 异常时在剩余超时内回退到一次性 `openclaw agent` 调用。
+- config.json "llm_context_routing": true  按 estimate_tokens(prompt)+max_tokens 自动选择
+  moonshot-v1-8k/32k/128k 中最小可容纳的窗口；最大窗口仍放不下时裁剪“风格参考/写作风格指南”段。
+- 指标：with metrics_context() as m: ... 按任务收集每次调用（延迟/大小/重试/缓存），
+  m.summary() / get_metrics() 含各 backend/model 的 p50/p95/p99；get_global_metrics() 为进程级汇总。
+- config.json "llm_resilience": 瞬时错误（超时/连接重置/408/429/5xx）按抖动指数退避重试；
+  每个 backend 一个熔断器（连续失败后快速失败）；hedge=true 时调用超过历史 p95 会发一个对冲请求。
+- config.json "llm_routing": {"mode": "adaptive", "spillover_after": 60}
+  按各 backend 的滚动延迟/错误率为每次 chat() 选择最健康的后端（llm_backend 仍是首选默认），
+  超过 spillover_after 秒未返回则同时向另一个后端发请求，先成功者为准。默认 mode=fixed。
+- config.json "rate_limits": 跨进程限流（scripts/rate_limit.py），超出 max_wait 时抛 RateLimitExceeded。
+- config.json "llm_cache": {"enabled": true, "ttl_seconds": 86400, "max_bytes": 67108864}
+  响应缓存（data/cache/llm/），按 backend/model/temperature/max_tokens/prompt 内容寻址；
+  需要随机性的调用（如标题发散）传 chat(..., cache=False) 跳过。
+
+流式：chat_stream(...) 逐段 yield 文本（moonshot 走 SSE；openclaw/缓存命中一次性返回全文），
+配合 scripts/json_stream.py 可在正文生成过程中提前拿到 title/digest/各 section。
 
 注意：openclaw 后端是“让 agent 回答一次”，因此 model/temperature/max_tokens 参数
 无法逐一映射到所有 provider；目前会尽量保持接口兼容，但 openclaw 可能忽略这些参数。
 """
 
+import contextvars
 import json
+import math
 import os
 import subprocess
-import urllib.request
-from typing import Any
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator
 
+from scripts.http_pool import HTTPStatusError, get_pool
+from scripts.singleflight import Group
 
-# Simple in-process metrics so we can distinguish text LLM calls from image calls.
-# Image calls are tracked in pipeline_debug.json (Hunyuan 3.0).
-_LLM_CALLS = 0
-_LAST_BACKEND = None
+
+# -----------------------------
+# Metrics
+# -----------------------------
+# Every chat()/chat_stream() call is recorded into the current MetricsContext
+# (contextvars, so parallel articles in different threads do not mix) and into
+# all of its parents up to the process-wide root. Image calls are tracked
+# separately in pipeline_debug.json (Hunyuan 3.0).
+
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_vals:
+        return 0.0
+    idx = max(0, min(len(sorted_vals) - 1, int(math.ceil(q / 100.0 * len(sorted_vals))) - 1))
+    return sorted_vals[idx]
+
+
+class MetricsContext:
+    """Per-task collection of LLM call records (see metrics_context())."""
+
+    def __init__(self, parent: "MetricsContext | None" = None, max_records: int = 2000):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self.records: deque = deque(maxlen=max_records)
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.records.clear()
+            self.counters = {"calls": 0, "upstream": 0, "cache_hits": 0, "cache_misses": 0,
+                             "coalesced": 0, "errors": 0, "retries": 0}
+            self.last_backend = None
+
+    def record(self, rec: dict) -> None:
+        ctx = self
+        while ctx is not None:
+            with ctx._lock:
+                ctx.records.append(rec)
+                c = ctx.counters
+                c["calls"] += 1
+                c["upstream"] += 1 if rec.get("upstream") else 0
+                c["cache_hits"] += 1 if rec.get("cache") == "hit" else 0
+                c["cache_misses"] += 1 if rec.get("cache") == "miss" else 0
+                c["coalesced"] += 1 if rec.get("coalesced") else 0
+                c["errors"] += 1 if rec.get("error") else 0
+                c["retries"] += int(rec.get("retries") or 0)
+                ctx.last_backend = rec.get("backend")
+            ctx = ctx.parent
+
+    def histograms(self) -> dict:
+        """Latency percentiles (seconds) per "backend/model", over calls that went upstream."""
+        with self._lock:
+            recs = [r for r in self.records if r.get("upstream")]
+        groups: dict[str, list[float]] = {}
+        for r in recs:
+            groups.setdefault(f"{r.get('backend')}/{r.get('model')}", []).append(float(r.get("latency_s") or 0.0))
+        out = {}
+        for name, vals in sorted(groups.items()):
+            vals.sort()
+            out[name] = {
+                "count": len(vals),
+                "p50": round(_percentile(vals, 50), 3),
+                "p95": round(_percentile(vals, 95), 3),
+                "p99": round(_percentile(vals, 99), 3),
+                "max": round(vals[-1], 3),
+                "mean": round(sum(vals) / len(vals), 3),
+            }
+        return out
+
+    def summary(self, include_calls: bool = False) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+            backend = self.last_backend
+            calls = list(self.records) if include_calls else None
+        out = {
+            # Legacy keys (pipeline_debug / drafts store readers rely on them)
+            "llm_text_calls": c["upstream"],
+            "llm_backend": backend,
+            "llm_cache_hits": c["cache_hits"],
+            "llm_cache_misses": c["cache_misses"],
+            "llm_coalesced": c["coalesced"],
+            "llm_errors": c["errors"],
+            "llm_retries": c["retries"],
+            "llm_latency": self.histograms(),
+        }
+        if calls is not None:
+            out["llm_calls"] = calls
+        return out
+
+
+_ROOT_METRICS = MetricsContext(max_records=5000)
+_CURRENT_METRICS: contextvars.ContextVar[MetricsContext | None] = contextvars.ContextVar(
+    "artbot_llm_metrics", default=None)
+# Retry counter of the call currently running in this context (see note_retry()).
+_CALL_RETRIES: contextvars.ContextVar[list | None] = contextvars.ContextVar("artbot_llm_retries", default=None)
+
+
+def current_metrics() -> MetricsContext:
+    return _CURRENT_METRICS.get() or _ROOT_METRICS
+
+
+@contextmanager
+def metrics_context() -> Iterator[MetricsContext]:
+    """Collect metrics for one task; records also propagate to enclosing contexts.
+
+        with metrics_context() as m:
+            ...chat(...)...
+        m.summary()
+    """
+    ctx = MetricsContext(parent=current_metrics())
+    token = _CURRENT_METRICS.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _CURRENT_METRICS.reset(token)
 
 
 def reset_metrics() -> None:
-    global _LLM_CALLS, _LAST_BACKEND
-    _LLM_CALLS = 0
-    _LAST_BACKEND = None
+    """Clear the current context (the process-wide root when outside metrics_context())."""
+    current_metrics().reset()
+
+
+def get_metrics(include_calls: bool = False) -> dict:
+    """Summary of the current context: legacy counters + llm_latency histograms."""
+    return current_metrics().summary(include_calls=include_calls)
+
+
+def get_global_metrics(include_calls: bool = False) -> dict:
+    """Process-wide summary (every call since start, latest records bounded)."""
+    out = _ROOT_METRICS.summary(include_calls=include_calls)
+    out["llm_backend_health"] = _HEALTH.snapshot()
+    return out
+
+
+def note_retry() -> None:
+    """Count one retry against the LLM call running in this context (no-op outside a call)."""
+    holder = _CALL_RETRIES.get()
+    if holder is not None:
+        holder[0] += 1
 
 
-def get_metrics() -> dict:
-    return {
-        "llm_text_calls": _LLM_CALLS,
-        "llm_backend": _LAST_BACKEND,
+def _record_call(be: str, model: str, prompt: str, text: str, t0: float, *, cache: str,
+                 upstream: bool, stream: bool = False, coalesced: bool = False,
+                 retries: int = 0, error: str | None = None, first_chunk_s: float | None = None) -> None:
+    rec = {
+        "backend": be,
+        "model": model,
+        "stream": stream,
+        "latency_s": round(time.monotonic() - t0, 4),
+        "prompt_chars": len(prompt or ""),
+        "prompt_tokens_est": estimate_tokens(prompt or ""),
+        "completion_chars": len(text or ""),
+        "cache": cache,
+        "upstream": upstream,
+        "coalesced": coalesced,
+        "retries": retries,
     }
+    if first_chunk_s is not None:
+        rec["first_chunk_s"] = round(first_chunk_s, 4)
+    if error:
+        rec["error"] = error[:300]
+    current_metrics().record(rec)
 
 
 def _backend() -> str:
@@ -55,10 +229,101 @@ def _backend() -> str:
     return v
 
 
+# -----------------------------
+# Adaptive backend routing
+# -----------------------------
+# config "llm_routing": {"mode": "adaptive", ...} routes each chat() to the healthiest
+# available backend (rolling latency + error rate), with `llm_backend` as the preferred
+# default, and spills a slow call over to the next backend after `spillover_after` s.
+
+BACKENDS = ("moonshot", "openclaw")
+
+
+class BackendHealth:
+    """Rolling latency/error window per backend (fed by every upstream attempt)."""
+
+    def __init__(self, window: int = 50):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque] = {}
+
+    def observe(self, be: str, latency_s: float, ok: bool) -> None:
+        with self._lock:
+            q = self._samples.setdefault(be, deque(maxlen=self.window))
+            q.append((float(latency_s), bool(ok)))
+
+    def stats(self, be: str) -> dict:
+        with self._lock:
+            samples = list(self._samples.get(be) or [])
+        if not samples:
+            return {"samples": 0, "error_rate": 0.0, "p50": None}
+        lat = sorted(x for x, ok in samples if ok) or sorted(x for x, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "error_rate": round(errors / len(samples), 3),
+            "p50": round(_percentile(lat, 50), 3),
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            names = list(self._samples)
+        return {be: self.stats(be) for be in sorted(names)}
+
+
+_HEALTH = BackendHealth()
+
+
+def _routing_opts() -> dict:
+    try:
+        from scripts.config import get
+        return get("llm_routing", None) or {}
+    except Exception:
+        return {}
+
+
+def _backend_available(be: str) -> bool:
+    if be == "moonshot":
+        return bool(_load_moonshot_key())
+    if be == "openclaw":
+        import shutil
+        return shutil.which("openclaw") is not None
+    return False
+
+
+def _route(preferred: str) -> list[str]:
+    """Backends to use for one call, best first. Fixed mode: just the preferred one."""
+    opts = _routing_opts()
+    if (opts.get("mode") or "fixed") != "adaptive":
+        return [preferred]
+    cands = [b for b in BACKENDS if b == preferred or _backend_available(b)]
+    if preferred not in cands:
+        cands.insert(0, preferred)
+    min_samples = int(opts.get("min_samples", 5))
+    max_error_rate = float(opts.get("max_error_rate", 0.5))
+    res_opts = _resilience_opts()
+
+    def rank(b: str):
+        st = _HEALTH.stats(b)
+        tripped = _breaker(b, res_opts).state == "open"
+        unhealthy = st["samples"] >= min_samples and st["error_rate"] > max_error_rate
+        if st["samples"] >= min_samples and st["p50"] is not None:
+            cost = st["p50"] * (1 + st["error_rate"])
+        else:
+            # Not enough data: keep the configured preference.
+            cost = 0.0 if b == preferred else float("inf")
+        return (tripped, unhealthy, cost, b != preferred)
+
+    return sorted(cands, key=rank)
+
+
 # -----------------------------
 # Moonshot direct backend
 # -----------------------------
 
+MOONSHOT_CHAT_URL = "https://api.moonshot.cn/v1/chat/completions"
+
+
 def _load_moonshot_key() -> str:
     """Load API key from OpenClaw agent auth or env."""
     paths = [
@@ -89,21 +354,74 @@ def _moonshot_chat(prompt: str, model: str, temperature: float, max_tokens: int)
         "max_tokens": max_tokens,
     }).encode()
 
-    req = urllib.request.Request(
-        "https://api.moonshot.cn/v1/chat/completions",
-        data=body,
+    # Shared keep-alive pool: repeated calls reuse the TLS connection.
+    resp = get_pool().request(
+        "POST",
+        MOONSHOT_CHAT_URL,
+        body=body,
         headers={
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}",
         },
+        timeout=30,
     )
-
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        result = json.loads(resp.read())
+    resp.raise_for_status()
+    result = resp.json()
 
     return result["choices"][0]["message"]["content"].strip()
 
 
+def _moonshot_chat_stream(prompt: str, model: str, temperature: float, max_tokens: int) -> Iterator[str]:
+    """Moonshot SSE stream: yields `choices[0].delta.content` chunks."""
+    api_key = _load_moonshot_key()
+    if not api_key:
+        raise RuntimeError("No Moonshot API key found")
+
+    body = json.dumps({
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True,
+    }).encode()
+
+    with get_pool().stream(
+        "POST",
+        MOONSHOT_CHAT_URL,
+        body=body,
+        headers={
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {api_key}",
+        },
+        timeout=60,
+    ) as resp:
+        if resp.status >= 400:
+            raise HTTPStatusError(resp.status, MOONSHOT_CHAT_URL, resp.read())
+        while True:
+            line = resp.readline()
+            if not line:
+                break
+            line = line.decode("utf-8", errors="ignore").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                # drain so the connection can go back to the pool
+                resp.read()
+                break
+            try:
+                evt = json.loads(data)
+            except Exception:
+                continue
+            choices = evt.get("choices") or []
+            if not choices:
+                continue
+            delta = (choices[0].get("delta") or {}).get("content") or ""
+            if delta:
+                yield delta
+
+
 # -----------------------------
 # OpenClaw agent backend
 # -----------------------------
@@ -142,39 +460,62 @@ def _extract_openclaw_text(payload: dict[str, Any]) -> str:
     return (pls[-1].get("text") or "").strip()
 
 
-def _openclaw_chat(prompt: str, timeout_s: int | None = None) -> str:
-    agent_id = _openclaw_agent_id()
-    timeout_s = timeout_s or _openclaw_timeout()
-
-    # 强约束输出格式，尽量避免 agent 自说自话。
-    wrapped = (
-        "你是一个‘LLM 后端’，只负责按要求生成文本。\n"
-        "必须严格遵守：仅输出最终结果正文，不要解释、不要寒暄、不要自述过程、不要加前后缀。\n\n"
-        "用户需求如下（请直接完成）：\n"
-        f"{prompt.strip()}"
-    )
-
+def _openclaw_cli(agent_id: str, message: str, timeout_s: int) -> dict:
+    """Run `openclaw agent --json` once and return its parsed stdout."""
     cmd = [
         "openclaw",
         "agent",
         "--agent",
         agent_id,
         "--message",
-        wrapped,
+        message,
         "--json",
         "--timeout",
         str(timeout_s),
     ]
 
-    r = subprocess.run(cmd, capture_output=True, text=True)
+    # Hard stop a bit after the agent's own timeout (wedged CLI -> TimeoutExpired, retryable).
+    r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout_s + 30)
     if r.returncode != 0:
         raise RuntimeError(f"openclaw agent failed: rc={r.returncode} stderr={r.stderr.strip()}")
 
     try:
-        data = json.loads(r.stdout)
+        return json.loads(r.stdout)
     except Exception as e:
         raise RuntimeError(f"openclaw agent returned non-json: {e}; stdout={r.stdout[:500]}")
 
+
+def _openclaw_chat(prompt: str, timeout_s: int | None = None) -> str:
+    agent_id = _openclaw_agent_id()
+    timeout_s = timeout_s or _openclaw_timeout()
+
+    # 强约束输出格式，尽量避免 agent 自说自话。
+    wrapped = (
+        "你是一个‘LLM 后端’，只负责按要求生成文本。\n"
+        "必须严格遵守：仅输出最终结果正文，不要解释、不要寒暄、不要自述过程、不要加前后缀。\n\n"
+        "用户需求如下（请直接完成）：\n"
+        f"{prompt.strip()}"
+    )
+
+    from scripts.openclaw_session import SessionError, get_session_pool
+
+    data = None
+    sess = get_session_pool()
+    if sess is not None:
+        started = time.monotonic()
+        try:
+            data = sess.ask(agent_id, wrapped, timeout_s)
+        except SessionError as e:
+            # Worker died / broke protocol: fall back to a one-shot CLI run within what is
+            # left of the caller's timeout (not a fresh one).
+            left = int(timeout_s - (time.monotonic() - started))
+            if left < 1:
+                raise TimeoutError(f"openclaw timed out after {timeout_s}s ({e})") from e
+            note_retry()
+            timeout_s = left
+    if data is None:
+        data = _openclaw_cli(agent_id, wrapped, timeout_s)
+
     # CLI payload shape: {runId,status,summary,result:{payloads:[...]}}
     result = data.get("result") or {}
     text = _extract_openclaw_text(result)
@@ -182,21 +523,188 @@ def _openclaw_chat(prompt: str, timeout_s: int | None = None) -> str:
 
 
 # -----------------------------
-# Public API
+# Token estimate / context-window routing
 # -----------------------------
 
-def chat(prompt: str, model: str = "moonshot-v1-8k", temperature: float = 0.8,
-         max_tokens: int = 1000) -> str:
-    """Chat completion.
+# Moonshot models differ only by context window; smaller windows are faster and cheaper.
+MODEL_WINDOWS = {
+    "moonshot-v1-8k": 8 * 1024,
+    "moonshot-v1-32k": 32 * 1024,
+    "moonshot-v1-128k": 128 * 1024,
+}
+
+# Prompt sections that may be shortened/dropped when nothing fits (lowest priority first).
+# Both come from article_service.build_article_prompt (writing style references).
+LOW_PRIORITY_SECTIONS = ("## 风格参考", "## 写作风格指南")
+
+_MESSAGE_OVERHEAD_TOKENS = 16
+
+
+def _is_cjk(ch: str) -> bool:
+    o = ord(ch)
+    return (
+        0x4E00 <= o <= 0x9FFF      # CJK unified ideographs
+        or 0x3400 <= o <= 0x4DBF   # extension A
+        or 0x3000 <= o <= 0x303F   # CJK punctuation
+        or 0xFF00 <= o <= 0xFFEF   # full-width forms
+        or 0x3040 <= o <= 0x30FF   # kana
+        or 0xAC00 <= o <= 0xD7AF   # hangul
+    )
 
-    - moonshot backend: honors model/temperature/max_tokens.
-    - openclaw backend: uses configured agent; may ignore model/temperature/max_tokens.
+
+def estimate_tokens(text: str) -> int:
+    """Conservative token estimate without a tokenizer.
+
+    CJK characters count ~1 token each (Moonshot averages 1.5-2 chars/token, so this
+    over-estimates on purpose); other text ~4 chars/token; other non-ASCII ~1 each.
     """
-    global _LLM_CALLS, _LAST_BACKEND
-    be = _backend()
-    _LAST_BACKEND = be
-    _LLM_CALLS += 1
+    if not text:
+        return 0
+    cjk = other = ascii_n = 0
+    for ch in text:
+        if ch.isascii():
+            ascii_n += 1
+        elif _is_cjk(ch):
+            cjk += 1
+        else:
+            other += 1
+    return cjk + other + (ascii_n + 3) // 4
+
+
+def _context_routing_enabled() -> bool:
+    try:
+        from scripts.config import get
+        return bool(get("llm_context_routing", True))
+    except Exception:
+        return True
+
+
+def pick_model(prompt: str, max_tokens: int, model: str = "moonshot-v1-8k") -> str:
+    """Smallest Moonshot window that fits prompt + max_tokens (largest if none fits).
+
+    Models outside MODEL_WINDOWS are returned unchanged.
+    """
+    if model not in MODEL_WINDOWS:
+        return model
+    need = estimate_tokens(prompt) + _MESSAGE_OVERHEAD_TOKENS + int(max_tokens or 0)
+    for name, window in sorted(MODEL_WINDOWS.items(), key=lambda kv: kv[1]):
+        if need <= window:
+            return name
+    return max(MODEL_WINDOWS, key=MODEL_WINDOWS.get)
+
+
+def trim_prompt(prompt: str, budget_tokens: int) -> str:
+    """Shorten LOW_PRIORITY_SECTIONS (tail first, then drop) until prompt fits budget_tokens."""
+    if estimate_tokens(prompt) <= budget_tokens:
+        return prompt
+    for heading in LOW_PRIORITY_SECTIONS:
+        start = prompt.find(heading)
+        if start < 0:
+            continue
+        end = prompt.find("\n## ", start + len(heading))
+        end = len(prompt) if end < 0 else end
+        head, body, tail = prompt[:start], prompt[start:end], prompt[end:]
+        over = estimate_tokens(prompt) - budget_tokens
+        # Cut roughly `over` tokens from the end of the section (>= 1 char per token).
+        while over > 0 and len(body) > len(heading):
+            body = body[:max(len(heading), len(body) - max(over, 64))]
+            over = estimate_tokens(head + body + tail) - budget_tokens
+        if len(body) <= len(heading):
+            body = ""
+        prompt = (head.rstrip("\n") + "\n" + body + tail) if body else (head.rstrip("\n") + tail)
+        if estimate_tokens(prompt) <= budget_tokens:
+            break
+    return prompt
+
+
+def _fit_context(be: str, model: str, prompt: str, max_tokens: int) -> tuple[str, str]:
+    """Route to the smallest fitting Moonshot window; trim low-priority sections on overflow."""
+    if be == "openclaw" or model not in MODEL_WINDOWS or not _context_routing_enabled():
+        return model, prompt
+    routed = pick_model(prompt, max_tokens, model)
+    window = MODEL_WINDOWS[routed]
+    budget = window - int(max_tokens or 0) - _MESSAGE_OVERHEAD_TOKENS
+    if estimate_tokens(prompt) > budget:
+        before = len(prompt)
+        prompt = trim_prompt(prompt, budget)
+        try:
+            from scripts.metrics import log_event
+            log_event("llm_prompt_trimmed", {"model": routed, "chars_before": before, "chars_after": len(prompt)})
+        except Exception:
+            pass
+    return routed, prompt
+
+
+# -----------------------------
+# Response cache
+# -----------------------------
 
+_RESPONSE_CACHE = None
+
+
+def _response_cache():
+    """Return the shared DiskCache for text responses, or None when disabled."""
+    global _RESPONSE_CACHE
+    try:
+        from scripts.config import get
+        opts = get("llm_cache", None) or {}
+    except Exception:
+        opts = {}
+    if not opts.get("enabled"):
+        return None
+    if _RESPONSE_CACHE is None:
+        from scripts.disk_cache import DiskCache
+        _RESPONSE_CACHE = DiskCache(
+            "llm",
+            max_bytes=int(opts.get("max_bytes") or 64 * 1024 * 1024),
+            default_ttl=float(opts.get("ttl_seconds") or 86400),
+        )
+    return _RESPONSE_CACHE
+
+
+def _cache_key(backend: str, model: str, temperature: float, max_tokens: int, prompt: str) -> str:
+    from scripts.disk_cache import make_key
+    # openclaw answers depend on the agent, not on `model`.
+    if backend == "openclaw":
+        backend = f"openclaw:{_openclaw_agent_id()}"
+    return make_key("chat", backend, model, float(temperature), int(max_tokens), prompt)
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+
+# In-flight chat() calls keyed like the response cache.
+_INFLIGHT = Group()
+
+def _cache_lookup(be: str, model: str, temperature: float, max_tokens: int, prompt: str,
+                  cache: bool) -> tuple[Any, str | None, str | None]:
+    """Return (cache, key, hit_text). cache/key are None when caching is off for this call."""
+    rc = _response_cache() if cache else None
+    if rc is None:
+        return None, None, None
+    key = _cache_key(be, model, temperature, max_tokens, prompt or "")
+    hit = rc.get(key)
+    if hit is not None:
+        try:
+            from scripts.metrics import log_event
+            log_event("llm_text_cache_hit", {"backend": be, "model": model, "prompt_chars": len(prompt or "")})
+        except Exception:
+            pass
+        return rc, key, hit.decode("utf-8")
+    return rc, key, None
+
+
+def _cache_store(rc: Any, key: str | None, text: str) -> None:
+    if rc is not None and key and text:
+        try:
+            rc.put(key, text.encode("utf-8"))
+        except Exception:
+            pass
+
+
+def _count_upstream_call(be: str, model: str, temperature: float, max_tokens: int, prompt: str,
+                         stream: bool = False) -> None:
     # Structured metrics (best-effort)
     try:
         from scripts.metrics import log_event
@@ -206,12 +714,282 @@ def chat(prompt: str, model: str = "moonshot-v1-8k", temperature: float = 0.8,
             "temperature": temperature,
             "max_tokens": max_tokens,
             "prompt_chars": len(prompt or ""),
+            "stream": stream,
         })
     except Exception:
         pass
 
+
+def _rate_limit(be: str, prompt: str, max_tokens: int) -> None:
+    """Take from the shared per-provider budget (scripts/rate_limit.py) before calling upstream."""
+    from scripts.rate_limit import acquire
     if be == "openclaw":
-        return _openclaw_chat(prompt)
+        acquire("openclaw", _openclaw_agent_id())
+    else:
+        # Budget the prompt plus the completion we may get back.
+        acquire("moonshot", _load_moonshot_key(), tokens=estimate_tokens(prompt) + int(max_tokens or 0))
+
+
+def _resilience_opts() -> dict:
+    try:
+        from scripts.config import get
+        return get("llm_resilience", None) or {}
+    except Exception:
+        return {}
 
+
+def _breaker(be: str, opts: dict):
+    from scripts.resilience import get_breaker
+    return get_breaker(f"llm:{be}", opts.get("breaker_threshold", 5), opts.get("breaker_reset", 30))
+
+
+def _hedge_after(be: str, model: str, opts: dict) -> float | None:
+    """p95 latency of this backend/model once enough samples exist (hedging is opt-in)."""
+    if not opts.get("hedge"):
+        return None
+    h = _ROOT_METRICS.histograms().get(f"{be}/{model}") or {}
+    if h.get("count", 0) < int(opts.get("hedge_min_samples", 20)):
+        return None
+    return h.get("p95") or None
+
+
+def _call_backend(be: str, prompt: str, model: str, temperature: float, max_tokens: int) -> str:
+    """One upstream attempt (rate-limited and logged)."""
+    _rate_limit(be, prompt, max_tokens)
+    _count_upstream_call(be, model, temperature, max_tokens, prompt)
+    if be == "openclaw":
+        return _openclaw_chat(prompt)
     # default: moonshot direct
     return _moonshot_chat(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+
+
+def _resilient_call(be: str, model: str, fn):
+    """Retry with jittered backoff behind the backend's circuit breaker; optionally hedge at p95."""
+    from scripts.resilience import hedged_call, is_retryable, retry_call
+
+    opts = _resilience_opts()
+    breaker = _breaker(be, opts)
+    hedge_after = _hedge_after(be, model, opts)
+
+    def _attempt():
+        breaker.allow()
+        try:
+            value, _ = hedged_call(fn, hedge_after)
+        except Exception as e:
+            # Non-transient errors (4xx, bad config) mean the backend itself is reachable.
+            breaker.record_failure() if is_retryable(e) else breaker.record_success()
+            raise
+        breaker.record_success()
+        return value
+
+    return retry_call(
+        _attempt,
+        attempts=1 + int(opts.get("retries", 2)),
+        base_delay=float(opts.get("base_delay", 0.5)),
+        max_delay=float(opts.get("max_delay", 8)),
+        on_retry=lambda e, n: note_retry(),
+    )
+
+
+def chat(prompt: str, model: str = "moonshot-v1-8k", temperature: float = 0.8,
+         max_tokens: int = 1000, cache: bool = True) -> str:
+    """Chat completion.
+
+    - moonshot backend: honors temperature/max_tokens; `model` is routed to the smallest
+      moonshot-v1-* window that fits prompt + max_tokens (config llm_context_routing).
+    - openclaw backend: uses configured agent; may ignore model/temperature/max_tokens.
+    - cache=False bypasses the response cache (for intentionally random generations).
+    - concurrent identical calls are coalesced into one upstream request (scripts/singleflight.py).
+    """
+    route = _route(_backend())
+    be = route[0]
+    raw_prompt, raw_model = prompt or "", model
+    model, prompt = _fit_context(be, raw_model, raw_prompt, max_tokens)
+    t0 = time.monotonic()
+
+    rc, key, hit = _cache_lookup(be, model, temperature, max_tokens, prompt, cache)
+    if hit is not None:
+        _record_call(be, model, prompt, hit, t0, cache="hit", upstream=False)
+        return hit
+
+    retries = [0]
+
+    def _serve(b: str) -> tuple[str, str]:
+        m, p = (model, prompt) if b == be else _fit_context(b, raw_model, raw_prompt, max_tokens)
+        started = time.monotonic()
+        try:
+            text = _resilient_call(b, m, lambda: _call_backend(b, p, m, temperature, max_tokens))
+        except Exception:
+            _HEALTH.observe(b, time.monotonic() - started, False)
+            raise
+        _HEALTH.observe(b, time.monotonic() - started, True)
+        return text, b
+
+    def _upstream() -> tuple[str, str]:
+        token = _CALL_RETRIES.set(retries)
+        try:
+            if len(route) == 1:
+                text, served = _serve(be)
+            else:
+                text, served = _serve_with_spillover(route, _serve)
+        finally:
+            _CALL_RETRIES.reset(token)
+
+        _cache_store(rc, key, text)
+        return text, served
+
+    cache_state = "miss" if rc is not None else "off"
+    # Identical requests already in flight (double-clicks, repeated renders) share one call.
+    try:
+        (text, served), shared = _INFLIGHT.do(_cache_key(be, model, temperature, max_tokens, prompt or ""), _upstream)
+    except Exception as e:
+        _record_call(be, model, prompt, "", t0, cache=cache_state, upstream=True,
+                     retries=retries[0], error=str(e))
+        raise
+    _record_call(served, model if served == be else raw_model, prompt, text, t0, cache=cache_state,
+                 upstream=not shared, coalesced=shared, retries=retries[0])
+    return text
+
+
+def _serve_with_spillover(route: list[str], serve) -> tuple[str, str]:
+    """Primary backend, spilling over to the next one when it is slow or fails."""
+    from scripts.resilience import hedged_call
+
+    primary, secondary = route[0], route[1]
+    spill_after = float(_routing_opts().get("spillover_after", 60) or 0)
+    try:
+        (text, served), _ = hedged_call(lambda: serve(primary), spill_after or None,
+                                        secondary=lambda: serve(secondary))
+        return text, served
+    except Exception as e:
+        if getattr(e, "hedged", False):
+            raise  # the secondary already ran (slow primary) and failed too
+        # Primary failed outright (after its retries / open breaker): fail over once.
+        note_retry()
+        return serve(secondary)
+
+
+def chat_stream(prompt: str, model: str = "moonshot-v1-8k", temperature: float = 0.8,
+                max_tokens: int = 1000, cache: bool = True) -> Iterator[str]:
+    """Streaming chat completion: yields text deltas as they arrive.
+
+    - moonshot backend: server-sent events (`"stream": true`).
+    - openclaw backend: the CLI has no streaming mode; yields the full answer once.
+    - cache hits are yielded as a single chunk.
+    """
+    # Streams cannot spill over midway; adaptive routing only picks the starting backend.
+    be = _route(_backend())[0]
+    model, prompt = _fit_context(be, model, prompt or "", max_tokens)
+    t0 = time.monotonic()
+
+    rc, key, hit = _cache_lookup(be, model, temperature, max_tokens, prompt, cache)
+    if hit is not None:
+        _record_call(be, model, prompt, hit, t0, cache="hit", upstream=False, stream=True)
+        yield hit
+        return
+
+    cache_state = "miss" if rc is not None else "off"
+    parts: list[str] = []
+    first_chunk_s = None
+    retries = [0]
+    token = _CALL_RETRIES.set(retries)
+    try:
+        from scripts.resilience import backoff_delay, is_retryable
+
+        opts = _resilience_opts()
+        breaker = _breaker(be, opts)
+        attempts = 1 + int(opts.get("retries", 2))
+        for attempt in range(attempts):
+            breaker.allow()
+            try:
+                _rate_limit(be, prompt, max_tokens)
+                _count_upstream_call(be, model, temperature, max_tokens, prompt, stream=True)
+
+                if be == "openclaw":
+                    deltas = iter([_openclaw_chat(prompt)])
+                else:
+                    deltas = _moonshot_chat_stream(prompt, model=model, temperature=temperature, max_tokens=max_tokens)
+                for delta in deltas:
+                    if first_chunk_s is None:
+                        first_chunk_s = time.monotonic() - t0
+                    parts.append(delta)
+                    yield delta
+                breaker.record_success()
+                break
+            except Exception as e:
+                breaker.record_failure() if is_retryable(e) else breaker.record_success()
+                # Once text has been yielded the caller has it; only retry before the first chunk.
+                if parts or attempt == attempts - 1 or not is_retryable(e):
+                    raise
+                note_retry()
+                time.sleep(backoff_delay(attempt, float(opts.get("base_delay", 0.5)), float(opts.get("max_delay", 8))))
+    except Exception as e:
+        _record_call(be, model, prompt, "".join(parts), t0, cache=cache_state, upstream=True, stream=True,
+                     retries=retries[0], error=str(e), first_chunk_s=first_chunk_s)
+        raise
+    finally:
+        try:
+            _CALL_RETRIES.reset(token)
+        except ValueError:
+            # generator finalized from another context
+            pass
+    text = "".join(parts).strip()
+    _record_call(be, model, prompt, text, t0, cache=cache_state, upstream=True, stream=True,
+                 retries=retries[0], first_chunk_s=first_chunk_s)
+    _cache_store(rc, key, text)
+
+
+@dataclass
+class ChatResult:
+    ok: bool
+    text: str = ""
+    error: str | None = None
+    elapsed_s: float = 0.0
+
+
+def chat_many(prompts: list, max_concurrency: int = 4, timeout: float | None = None,
+              **chat_kwargs) -> list[ChatResult]:
+    """Run independent chat() calls concurrently (bounded thread pool).
+
+    - prompts: list of prompt strings, or dicts {"prompt", "model", "temperature",
+      "max_tokens", "cache"} to override chat_kwargs per item.
+    - Results keep input order; a failing item becomes ChatResult(ok=False, error=...)
+      and never affects the others.
+    - timeout: one shared wall-clock budget (seconds) for the whole batch. Items not
+      finished in time are reported as errors; their threads finish in the background.
+    """
+    items = []
+    for p in prompts or []:
+        if isinstance(p, dict):
+            kw = {**chat_kwargs, **{k: v for k, v in p.items() if k != "prompt"}}
+            items.append((p.get("prompt") or "", kw))
+        else:
+            items.append((p or "", dict(chat_kwargs)))
+    if not items:
+        return []
+
+    def _run(prompt: str, kw: dict) -> ChatResult:
+        t0 = time.monotonic()
+        try:
+            text = chat(prompt, **kw)
+            return ChatResult(ok=True, text=text, elapsed_s=time.monotonic() - t0)
+        except Exception as e:
+            return ChatResult(ok=False, error=str(e), elapsed_s=time.monotonic() - t0)
+
+    workers = max(1, min(int(max_concurrency or 1), len(items)))
+    ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat_many")
+    try:
+        # Each worker runs in a copy of the caller's context so its calls land in the
+        # caller's metrics_context().
+        futures = [ex.submit(contextvars.copy_context().run, _run, p, kw) for p, kw in items]
+        wait(futures, timeout=timeout)
+        results = []
+        for f in futures:
+            if f.done():
+                results.append(f.result())
+            else:
+                f.cancel()
+                results.append(ChatResult(ok=False, error=f"timeout: batch budget {timeout}s exceeded"))
+        return results
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
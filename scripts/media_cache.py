@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""WeChat media cache: (appid, image sha256) -> upload result.
+
+Why:
+- /api/drafts/<name>/push_mp re-uploaded cover.jpg and every inline_N.jpg even
+  when execute_pipeline had already uploaded the same bytes; the media_id /
+  wechat_url only lived in pipeline_debug.json.
+
+wechat_uploader.upload_image consults this cache before any network call, so
+re-pushing a draft (or re-running an article with unchanged images) costs zero
+image uploads. Entries live in data/cache/wechat_media/ (scripts/disk_cache.py)
+and expire when the WeChat media would:
+- permanent material (material/add_material, what we upload): never expires on
+  WeChat's side, but can be deleted in the MP backend -> kept for max_age_days
+- temporary media (media/upload): 3 days on WeChat's side -> 3 days minus 1h
+
+A media_id WeChat rejects as invalid (40007) is dropped via forget_media().
+
+Config (config.json):
+  "wechat_media_cache": {"enabled": true, "max_age_days": 90}
+
+Usage:
+    from scripts import media_cache
+    hit = media_cache.lookup(appid, sha)             # {"media_id", "wechat_url", ...} or None
+    media_cache.store(appid, sha, {"media_id": ..., "wechat_url": ...})
+"""
+
+from __future__ import annotations
+
+import json
+import time
+
+from scripts.disk_cache import DiskCache, make_key
+
+# Seconds until WeChat drops the media (None: only max_age_days applies).
+KIND_TTL = {
+    "permanent": None,
+    "temporary": 3 * 86400 - 3600,
+}
+
+_CACHE: DiskCache | None = None
+
+
+def _opts() -> dict:
+    try:
+        from scripts.config import get
+        return {"enabled": True, "max_age_days": 90, **(get("wechat_media_cache", None) or {})}
+    except Exception:
+        return {"enabled": True, "max_age_days": 90}
+
+
+def _cache() -> DiskCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = DiskCache("wechat_media", max_bytes=8 * 1024 * 1024)
+    return _CACHE
+
+
+def _key(appid: str, sha: str) -> str:
+    return make_key("wechat_media", appid, sha)
+
+
+def _id_key(appid: str, media_id: str) -> str:
+    return make_key("wechat_media_id", appid, media_id)
+
+
+def lookup(appid: str, sha: str) -> dict | None:
+    """Cached upload result for these exact bytes under this appid, else None."""
+    if not (appid and sha) or not _opts().get("enabled", True):
+        return None
+    raw = _cache().get(_key(appid, sha))
+    if raw is None:
+        return None
+    try:
+        entry = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return None
+    return entry if entry.get("media_id") else None
+
+
+def store(appid: str, sha: str, result: dict, kind: str = "permanent") -> None:
+    """Remember a successful upload (best-effort: IO errors are ignored)."""
+    opts = _opts()
+    if not (appid and sha and result.get("media_id")) or not opts.get("enabled", True):
+        return
+    ttl = float(opts.get("max_age_days") or 90) * 86400
+    if KIND_TTL.get(kind) is not None:
+        ttl = min(ttl, KIND_TTL[kind])
+    entry = {
+        "media_id": result["media_id"],
+        "wechat_url": result.get("wechat_url", ""),
+        "kind": kind,
+        "uploaded_at": time.time(),
+    }
+    try:
+        _cache().put(_key(appid, sha), json.dumps(entry, ensure_ascii=False).encode("utf-8"), ttl=ttl)
+        # reverse index so a rejected media_id can be dropped
+        _cache().put(_id_key(appid, entry["media_id"]), sha.encode("ascii"), ttl=ttl)
+    except OSError:
+        pass
+
+
+def forget_media(appid: str, media_id: str) -> None:
+    """Drop the entry that produced media_id (WeChat no longer knows it)."""
+    if not (appid and media_id):
+        return
+    id_key = _id_key(appid, media_id)
+    sha = _cache().get(id_key)
+    if sha:
+        _cache().delete(_key(appid, sha.decode("ascii", "ignore")))
+    _cache().delete(id_key)
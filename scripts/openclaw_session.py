@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Long-lived OpenClaw agent workers (JSON lines over stdin/stdout).
+
+Why:
+- scripts/llm.py runs `openclaw agent ... --json` once per prompt, paying
+  process spawn + CLI bootstrap + agent warm-up on every title/article call.
+
+This only helps with a worker that keeps an agent session resident itself; the
+openclaw CLI in this tree has no such mode, so there is no default worker and
+the pool stays off unless "cmd" points at one. A wrapper that still runs
+`openclaw agent` per prompt would only add a hop.
+
+The pool keeps a few of those worker processes alive and sends prompts to
+them. Each worker speaks one JSON object per line:
+
+    -> {"id": 1, "op": "ping"}
+    <- {"id": 1, "op": "pong"}
+    -> {"id": 2, "op": "ask", "agent": "writing", "message": "...", "timeout": 90}
+    <- {"id": 2, "ok": true, "result": {...}}     # same shape as `openclaw agent --json`
+    <- {"id": 2, "ok": false, "error": "..."}
+
+Workers are health-checked (ping) after being idle, killed on timeout / protocol
+errors and respawned lazily on the next request.
+
+Config (config.json, opt-in):
+  "openclaw_session": {
+    "enabled": false,
+    "cmd": null,             # list[str]: resident worker speaking the protocol (required)
+    "pool_size": 2,
+    "ping_interval": 30,     # seconds idle before a worker is pinged again
+    "ping_timeout": 5
+  }
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+
+
+class SessionError(RuntimeError):
+    """Worker died, timed out or broke the protocol (caller may fall back)."""
+
+
+class _Worker:
+    def __init__(self, cmd: list[str], cwd: str | None = None):
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+            cwd=cwd,
+        )
+        self.last_used = time.monotonic()
+        self._seq = 0
+        self._lines: queue.Queue = queue.Queue()
+        t = threading.Thread(target=self._read_loop, daemon=True)
+        t.start()
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    def _read_loop(self) -> None:
+        try:
+            for line in self.proc.stdout:
+                self._lines.put(line)
+        except Exception:
+            pass
+        self._lines.put(None)  # EOF
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def call(self, payload: dict, timeout: float) -> dict:
+        self._seq += 1
+        req_id = self._seq
+        try:
+            self.proc.stdin.write(json.dumps({**payload, "id": req_id}, ensure_ascii=False) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            raise SessionError(f"openclaw worker stdin closed: {e}")
+
+        deadline = time.monotonic() + timeout
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise SessionError(f"openclaw worker timed out after {timeout}s")
+            try:
+                line = self._lines.get(timeout=left)
+            except queue.Empty:
+                continue
+            if line is None:
+                try:
+                    self.proc.wait(timeout=1)
+                except Exception:
+                    pass
+                raise SessionError(f"openclaw worker exited (rc={self.proc.poll()})")
+            try:
+                msg = json.loads(line)
+            except Exception:
+                # Ignore stray output (banners, logs) from the worker.
+                continue
+            if isinstance(msg, dict) and msg.get("id") == req_id:
+                self.last_used = time.monotonic()
+                return msg
+
+    def close(self) -> None:
+        try:
+            if self.proc.stdin:
+                self.proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.proc.terminate()
+            self.proc.wait(timeout=2)
+        except Exception:
+            try:
+                self.proc.kill()
+            except Exception:
+                pass
+
+
+class SessionPool:
+    def __init__(self, cmd: list[str], pool_size: int = 2, ping_interval: float = 30.0,
+                 ping_timeout: float = 5.0, cwd: str | None = None):
+        self.cmd = list(cmd)
+        self.pool_size = max(1, int(pool_size))
+        self.ping_interval = float(ping_interval)
+        self.ping_timeout = float(ping_timeout)
+        self.cwd = cwd
+        self._lock = threading.Lock()
+        self._idle: list[_Worker] = []
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        # Simple counters (useful for debugging / tests)
+        self.stats = {"spawned": 0, "discarded": 0, "requests": 0}
+
+    def _spawn(self) -> _Worker:
+        w = _Worker(self.cmd, cwd=self.cwd)
+        with self._lock:
+            self.stats["spawned"] += 1
+        return w
+
+    def _discard(self, w: _Worker) -> None:
+        w.close()
+        with self._lock:
+            self.stats["discarded"] += 1
+
+    def _healthy(self, w: _Worker) -> bool:
+        if not w.alive():
+            return False
+        if time.monotonic() - w.last_used < self.ping_interval:
+            return True
+        try:
+            return w.call({"op": "ping"}, self.ping_timeout).get("op") == "pong"
+        except SessionError:
+            return False
+
+    def _acquire(self) -> _Worker:
+        while True:
+            with self._lock:
+                w = self._idle.pop() if self._idle else None
+            if w is None:
+                return self._spawn()
+            if self._healthy(w):
+                return w
+            self._discard(w)
+
+    def ask(self, agent_id: str, message: str, timeout: float) -> dict:
+        """Send one prompt; return the CLI-shaped result dict ({runId,status,result:{payloads}}).
+
+        `timeout` covers waiting for a free worker too.
+        """
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise SessionError(f"no free openclaw worker within {timeout}s")
+        try:
+            with self._lock:
+                self.stats["requests"] += 1
+            w = self._acquire()
+            left = max(1, int(deadline - time.monotonic()))
+            try:
+                # Small grace over the agent timeout so the worker can report it itself.
+                msg = w.call({"op": "ask", "agent": agent_id, "message": message, "timeout": left},
+                             left + 10)
+            except SessionError:
+                self._discard(w)
+                raise
+            with self._lock:
+                self._idle.append(w)
+        finally:
+            self._slots.release()
+        if not msg.get("ok"):
+            raise RuntimeError(f"openclaw agent failed: {msg.get('error') or 'unknown error'}")
+        return msg.get("result") or {}
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for w in idle:
+            w.close()
+
+
+_POOL: SessionPool | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_session_pool() -> SessionPool | None:
+    """Return the shared worker pool, or None when openclaw_session is disabled (or has no cmd)."""
+    global _POOL
+    if _POOL is not None:
+        return _POOL
+    try:
+        from scripts.config import get
+        opts = get("openclaw_session", None) or {}
+    except Exception:
+        opts = {}
+    if not (opts.get("enabled") and opts.get("cmd")):
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            _POOL = SessionPool(
+                opts["cmd"],
+                pool_size=opts.get("pool_size", 2),
+                ping_interval=opts.get("ping_interval", 30),
+                ping_timeout=opts.get("ping_timeout", 5),
+                cwd=root,
+            )
+    return _POOL
+
+
+def reset_session_pool() -> None:
+    """Stop all workers (next get_session_pool() re-reads config)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+        _POOL = None
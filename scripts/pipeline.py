@@ -6,12 +6,124 @@
 """
 import json
 import os
+import shutil
 import sys
+import time
 from datetime import datetime
 from . import config
-from .image_gen import generate_cover, generate_inline
-from .wechat_uploader import upload_image, create_draft
-from .html_renderer import render_article, list_themes
+from .image_gen import generate_images, _make_placeholder
+from .wechat_uploader import upload_images, create_draft, draft_article
+from .image_opt import optimize_images
+from .html_renderer import render_article_to_file, list_themes
+from .run_journal import RunJournal, file_sha256, hash_inputs
+
+
+def auto_inline_prompt(base_topic: str, extra: str = "", image_style_prefix: str = "") -> str:
+    """Build an auto-created inline image prompt (used when the caller gives none)."""
+    # Prefer premium cinematic illustration over flat cartoon.
+    base_prompt = f"{base_topic}，轻写实插画，电影剧照感，真实材质与光影，主体明确，留白干净"
+
+    # Avoid duplicating style prefix: style_prefix will be applied in image_gen.
+    full = base_prompt
+    extra = (extra or "").strip()
+    if extra and (extra not in full) and (extra != image_style_prefix):
+        full = (full + "。" + extra).strip()
+
+    # Hard clamp to reduce TextLengthExceed risks.
+    if len(full) > 120:
+        full = full[:120]
+    return full
+
+
+def _take_prefetched(prefetched: dict | None, kind: str, prompt: str, dest_path: str) -> dict | None:
+    """Use an image generated ahead of time (e.g. while the article was still streaming).
+
+    prefetched maps (kind, prompt) -> Future[generate_image result]. Only an exact prompt
+    match is used; the staged file is moved to dest_path.
+    """
+    if not prefetched:
+        return None
+    fut = prefetched.pop((kind, prompt), None)
+    if fut is None:
+        return None
+    try:
+        img = fut.result()
+        src = img.get("path") or ""
+        if not src or not os.path.exists(src):
+            return None
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        shutil.move(src, dest_path)
+        return {**img, "path": dest_path, "prefetched": True}
+    except Exception:
+        return None
+
+
+def _generate_images_concurrently(specs: list[dict], journal: RunJournal, prefetched: dict | None = None,
+                                  fresh: bool = False, max_workers: int = 4) -> list[dict]:
+    """Generate cover + inline images [{"stage", "kind", "prompt", "output_path", "resolution",
+    "style_prefix"}] and return the results in spec order.
+
+    Stages recorded in the journal with the same inputs are reused; images prefetched while
+    the article was streaming are taken as-is; everything else goes to Hunyuan as one batch
+    (image_gen.generate_images: shared poll loop, single-flight), with at most max_workers
+    images in flight, prefetch jobs still running included.
+    Every image that fails gets a placeholder, so one failed image never blocks the others.
+    """
+    results: list = [None] * len(specs)
+    started = time.monotonic()
+
+    def _inputs(spec):
+        return {"prompt": spec["prompt"], "style_prefix": spec.get("style_prefix"), "resolution": spec["resolution"]}
+
+    def _finish(i, img):
+        spec = specs[i]
+        results[i] = img
+        if img.get("path") and not img.get("fallback"):
+            journal.record(spec["stage"], _inputs(spec), img, [img["path"]])
+        else:
+            journal.forget(spec["stage"])  # placeholders are retried next run
+        journal.timing(spec["stage"], time.monotonic() - started)
+
+    waiting = []
+    for i, spec in enumerate(specs):
+        t0 = time.monotonic()
+        cached = None if fresh else journal.lookup(spec["stage"], _inputs(spec))
+        if cached is not None:
+            results[i] = cached
+            journal.timing(spec["stage"], time.monotonic() - t0, skipped=True)
+        else:
+            waiting.append(i)
+
+    # Prefetched futures are already running: submit the rest first, then collect them.
+    todo = [i for i in waiting if not (prefetched and (specs[i]["kind"], specs[i]["prompt"]) in prefetched)]
+    late = [i for i in waiting if i not in todo]
+
+    def _batch(indexes):
+        if not indexes:
+            return
+        busy = sum(1 for fut in (prefetched or {}).values() if not fut.done())
+        try:
+            generate_images([specs[i] for i in indexes], on_result=lambda j, img: _finish(indexes[j], img),
+                            fresh=fresh, max_concurrency=max(1, int(max_workers or 1) - busy))
+        except Exception as e:
+            for i in indexes:
+                if results[i] is None:
+                    spec = specs[i]
+                    _make_placeholder(spec["output_path"], spec["resolution"], spec["prompt"])
+                    _finish(i, {"success": True, "url": "", "path": spec["output_path"], "prompt": spec["prompt"],
+                                "fallback": "placeholder_exception", "error": str(e)})
+
+    _batch(todo)
+    missed = []
+    for i in late:
+        spec = specs[i]
+        img = _take_prefetched(prefetched, spec["kind"], spec["prompt"], spec["output_path"])
+        if img is None:
+            missed.append(i)
+        else:
+            _finish(i, img)
+    _batch(missed)
+    return results
 
 
 def execute_pipeline(
@@ -32,6 +144,8 @@ def execute_pipeline(
     wechat_appid: str | None = None,
     wechat_secret: str | None = None,
     debug_extras: dict | None = None,
+    prefetched_images: dict | None = None,
+    fresh_images: bool = False,
 ) -> dict:
     """
     执行文章发布流水线（生图→上传→排版→推送）
@@ -49,6 +163,9 @@ def execute_pipeline(
         theme: 主题名，None 则用配置默认
         push_draft: 是否推送到微信草稿箱
         style_prefix: 图片风格前缀覆盖
+        prefetched_images: {(kind, prompt): Future} 提前生成的图片（kind=cover|inline），
+                           提示词完全一致时直接复用
+        fresh_images: 不复用图片缓存 / run journal 中的旧图，重新生成（换一版）
     
     Returns: {title, media_id, draft_url, images, html_path, ...}
     """
@@ -92,17 +209,7 @@ def execute_pipeline(
                 # Keep prompts short: Hunyuan rejects overly-long text.
                 # Avoid pasting paragraph text; use title-like semantic keywords instead.
                 base_topic = sec_title or title
-            # Prefer premium cinematic illustration over flat cartoon.
-            base_prompt = f"{base_topic}，轻写实插画，电影剧照感，真实材质与光影，主体明确，留白干净"
-
-            # Avoid duplicating style prefix: style_prefix will be applied in image_gen.
-            full = base_prompt
-            if extra and (extra not in full) and (extra != cfg.get("image_style_prefix", "")):
-                full = (full + "。" + extra).strip()
-
-            # Hard clamp to reduce TextLengthExceed risks.
-            if len(full) > 120:
-                full = full[:120]
+            full = auto_inline_prompt(base_topic, extra, cfg.get("image_style_prefix", ""))
             inline_prompts.append({
                 "after_section": min(si, max(0, len(sections)-1)) if sections else 0,
                 "prompt": full,
@@ -135,16 +242,27 @@ def execute_pipeline(
     except Exception:
         pass
     
-    # 1. 生成封面图
-    print("[pipeline] Step 1: Generating cover image...", file=sys.stderr)
-    cover = generate_cover(cover_prompt, output_dir, style_prefix, resolution=cover_resolution)
+    # Stage journal: a re-run skips stages whose inputs are unchanged (see run_journal.py)
+    journal = RunJournal(output_dir, resume=bool(cfg.get("pipeline_resume", True)))
+
+    # 1+2. 封面图 + 插图一次性批量提交（每张图各自降级为占位图）
+    print(f"[pipeline] Step 1-2: Generating cover + {len(inline_prompts)} inline images...", file=sys.stderr)
+    cover_res = cover_resolution or cfg.get("cover_resolution", "1024:768")
+    inline_res = inline_resolution or cfg.get("inline_resolution", "1024:1024")
+
+    image_specs = [{"stage": "cover", "kind": "cover", "prompt": cover_prompt, "style_prefix": style_prefix,
+                    "resolution": cover_res, "output_path": os.path.join(output_dir, "cover.jpg")}]
+    for i, ip in enumerate(inline_prompts, 1):
+        image_specs.append({"stage": f"inline_{i}", "kind": "inline", "prompt": ip["prompt"],
+                            "style_prefix": style_prefix, "resolution": inline_res,
+                            "output_path": os.path.join(output_dir, f"inline_{i}.jpg")})
+    images = _generate_images_concurrently(image_specs, journal, prefetched_images, fresh=fresh_images,
+                                           max_workers=cfg.get("image_concurrency", 4))
+
+    cover = images[0]
     result["images"].append({"type": "cover", **cover})
     debug["cover"] = {**cover}
-    
-    # 2. 生成插图
-    for i, ip in enumerate(inline_prompts):
-        print(f"[pipeline] Step 2.{i+1}: Generating inline image {i+1}...", file=sys.stderr)
-        img = generate_inline(ip["prompt"], output_dir, i+1, style_prefix, resolution=inline_resolution)
+    for ip, img in zip(inline_prompts, images[1:]):
         result["images"].append({"type": "inline", "after_section": ip["after_section"], **img})
         debug.setdefault("inline_images", []).append({"after_section": ip["after_section"], **img})
     
@@ -159,27 +277,51 @@ def execute_pipeline(
             rel = os.path.basename(path)
         return f"/art/api/preview/{rel}"
 
+    inline_paths = [os.path.join(output_dir, f"inline_{i+1}.jpg") for i in range(len(inline_prompts))]
+
+    # Resize / recompress for the article column before upload (originals stay on disk).
+    t0 = time.monotonic()
+    optimized = optimize_images([cover["path"]] + inline_paths)
+    journal.timing("optimize", time.monotonic() - t0)
+    debug["image_opt"] = optimized
+    upload_paths = [o["path"] for o in optimized]
+    upload_stages = ["upload_cover"] + [f"upload_inline_{i+1}" for i in range(len(inline_paths))]
+    appid_key = wechat_appid or cfg.get("wechat_appid", "")
+    upload_inputs = [{"sha256": file_sha256(p), "appid": appid_key} for p in upload_paths]
+
+    # Uploads already done for identical image content are reused from the journal.
+    t0 = time.monotonic()
+    uploads = [journal.lookup(st, inp) for st, inp in zip(upload_stages, upload_inputs)]
+    todo = [i for i, up in enumerate(uploads) if up is None]
+    if todo:
+        fresh = upload_images([upload_paths[i] for i in todo], wechat_appid=wechat_appid, wechat_secret=wechat_secret,
+                              max_workers=cfg.get("upload_concurrency", 4))
+        for i, up in zip(todo, fresh):
+            uploads[i] = up
+            if "error" not in up:
+                journal.record(upload_stages[i], upload_inputs[i], up)
+    journal.timing("upload", time.monotonic() - t0, skipped=not todo)
+
     cover_upload = {"media_id": "", "wechat_url": ""}
-    try:
-        cover_upload = upload_image(cover["path"], wechat_appid=wechat_appid, wechat_secret=wechat_secret)
-        result["cover_media_id"] = cover_upload.get("media_id", "")
-    except Exception as e:
+    if "error" in uploads[0]:
         result["cover_media_id"] = ""
-        result["cover_upload_error"] = str(e)
+        result["cover_upload_error"] = uploads[0]["error"]
+    else:
+        cover_upload = {k: v for k, v in uploads[0].items() if k != "path"}
+        result["cover_media_id"] = cover_upload.get("media_id", "")
 
     image_inserts = []
-    for i, ip in enumerate(inline_prompts):
-        img_path = os.path.join(output_dir, f"inline_{i+1}.jpg")
-        url = ""
-        try:
-            upload_result = upload_image(img_path, wechat_appid=wechat_appid, wechat_secret=wechat_secret)
-            url = upload_result.get("wechat_url", "")
-            debug.setdefault("inline_uploads", []).append({"index": i+1, **upload_result})
-        except Exception as e:
+    for i, (ip, up) in enumerate(zip(inline_prompts, uploads[1:])):
+        img_path = inline_paths[i]
+        if "error" in up:
             # fallback to local preview url
             url = _local_preview_url(img_path)
-            result.setdefault("inline_upload_errors", []).append({"index": i+1, "error": str(e)})
-            debug.setdefault("inline_upload_errors", []).append({"index": i+1, "error": str(e)})
+            result.setdefault("inline_upload_errors", []).append({"index": i+1, "error": up["error"]})
+            debug.setdefault("inline_upload_errors", []).append({"index": i+1, "error": up["error"]})
+        else:
+            upload_result = {k: v for k, v in up.items() if k != "path"}
+            url = upload_result.get("wechat_url", "")
+            debug.setdefault("inline_uploads", []).append({"index": i+1, **upload_result})
         image_inserts.append({
             "after_section": ip["after_section"],
             "url": url,
@@ -192,12 +334,29 @@ def execute_pipeline(
     if not cover_url:
         cover_url = _local_preview_url(cover.get("path", ""))
 
-    html = render_article(title, subtitle, sections, image_inserts, theme, cover_url=cover_url, include_cover_in_body=False)
-    
     html_path = os.path.join(output_dir, "article.html")
-    with open(html_path, "w") as f:
-        f.write(html)
+
+    def _render():
+        # Written section by section while rendering (no whole-document string).
+        render_article_to_file(html_path, title, subtitle, sections, image_inserts, theme,
+                               cover_url=cover_url, include_cover_in_body=False)
+        return {"html_path": html_path}
+
+    html_inputs = {"title": title, "subtitle": subtitle, "sections": sections, "images": image_inserts,
+                   "theme": theme, "cover_url": cover_url}
+    journal.run("html", html_inputs, _render, files=lambda out: [out["html_path"]])
+    with open(html_path, encoding="utf-8") as f:
+        html = f.read()
     result["html_path"] = html_path
+
+    # draft/add payload for this article only (push_latest_draft / later batched pushes)
+    if result.get("cover_media_id"):
+        try:
+            with open(os.path.join(output_dir, "draft.json"), "w", encoding="utf-8") as f:
+                json.dump({"articles": [draft_article(title, html, result["cover_media_id"], digest)]},
+                          f, ensure_ascii=False)
+        except Exception:
+            pass
     
     # 5. 推送草稿（需要 cover_media_id）
     if push_draft:
@@ -206,7 +365,13 @@ def execute_pipeline(
             debug["draft"] = result["draft"]
         else:
             print("[pipeline] Step 5: Creating WeChat draft...", file=sys.stderr)
-            draft = create_draft(title, html, result["cover_media_id"], digest, wechat_appid=wechat_appid, wechat_secret=wechat_secret)
+            draft_inputs = {"title": title, "html": hash_inputs(html), "cover_media_id": result["cover_media_id"],
+                            "digest": digest, "appid": appid_key}
+            draft = journal.run(
+                "draft", draft_inputs,
+                lambda: create_draft(title, html, result["cover_media_id"], digest, wechat_appid=wechat_appid, wechat_secret=wechat_secret),
+                ok=lambda d: bool(d.get("success")),
+            )
             result["draft"] = draft
             debug["draft"] = draft
             try:
@@ -225,6 +390,10 @@ def execute_pipeline(
     except Exception:
         pass
 
+    result["stage_timings"] = journal.timings()
+    debug["stage_timings"] = result["stage_timings"]
+    journal.save()
+
     # Update debug file at the end
     try:
         debug["done_at"] = datetime.now().isoformat()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Cross-process token-bucket rate limiter (SQLite state in data/rate_limit.sqlite3).
+
+Why:
+- web (Flask threaded), run_autotopic and gzh_four_stage cron runs all call
+  Moonshot / Hunyuan at the same time. Without a shared budget we get 429s and
+  fall into slow failure paths.
+
+Each (provider, credential) gets up to two buckets:
+- rps: requests per second (burst = max(1, rps))
+- tpm: tokens per minute (text providers; caller passes an estimate)
+
+State lives in one SQLite file; every acquire runs in a `BEGIN IMMEDIATE`
+transaction, so separate processes share one budget. Credentials are stored
+only as a short sha256 prefix.
+
+Config (config.json):
+  "rate_limits": {
+    "max_wait": 30,                          # seconds a caller may block; beyond -> RateLimitExceeded
+    "moonshot": {"rps": 3, "tpm": 120000},
+    "hunyuan": {"rps": 2}
+  }
+Providers without an entry are not limited.
+
+Usage:
+    from scripts.rate_limit import acquire, RateLimitExceeded
+    acquire("moonshot", api_key, tokens=1200)          # blocks up to max_wait
+    acquire("hunyuan", secret_id, block=False)         # raises immediately if over budget
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised instead of sending a request that would exceed the shared budget."""
+
+    def __init__(self, provider: str, retry_after: float):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"rate limit: {provider} would exceed budget, retry after {retry_after:.2f}s")
+
+
+def _default_path() -> str:
+    try:
+        from scripts.gzh_store import ensure_dirs
+        base = ensure_dirs()["data"]
+    except Exception:
+        base = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+    return os.path.join(base, "rate_limit.sqlite3")
+
+
+def _cred_id(credential: str) -> str:
+    if not credential:
+        return "-"
+    return hashlib.sha256(credential.encode("utf-8")).hexdigest()[:12]
+
+
+class RateLimiter:
+    def __init__(self, limits: dict, path: str | None = None, max_wait: float = 30.0):
+        self.limits = {k: v for k, v in (limits or {}).items() if isinstance(v, dict)}
+        self.path = path or _default_path()
+        self.max_wait = float(max_wait)
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.db = db
+        return db
+
+    def _buckets(self, provider: str, credential: str, tokens: int) -> list[tuple[str, float, float, float]]:
+        """Return [(name, capacity, refill_per_sec, need)] for this call."""
+        lim = self.limits.get(provider) or {}
+        prefix = f"{provider}:{_cred_id(credential)}"
+        out = []
+        rps = float(lim.get("rps") or 0)
+        if rps > 0:
+            out.append((f"{prefix}:rps", max(1.0, rps), rps, 1.0))
+        tpm = float(lim.get("tpm") or 0)
+        if tpm > 0 and tokens > 0:
+            # A single call larger than the whole budget can only wait for a full bucket.
+            out.append((f"{prefix}:tpm", tpm, tpm / 60.0, min(float(tokens), tpm)))
+        return out
+
+    def try_acquire(self, provider: str, credential: str = "", tokens: int = 0) -> float:
+        """Take from the buckets if possible. Returns 0.0 on success, else seconds to wait."""
+        buckets = self._buckets(provider, credential, tokens)
+        if not buckets:
+            return 0.0
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            state = []
+            wait_s = 0.0
+            for name, cap, rate, need in buckets:
+                row = db.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                level = cap if row is None else min(cap, row[0] + max(0.0, now - row[1]) * rate)
+                state.append((name, level - need))
+                if level < need:
+                    wait_s = max(wait_s, (need - level) / rate)
+            if wait_s <= 0:
+                db.executemany(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                    [(name, level, now) for name, level in state],
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return wait_s
+
+    def acquire(self, provider: str, credential: str = "", tokens: int = 0,
+                block: bool = True, max_wait: float | None = None) -> float:
+        """Wait for budget (up to max_wait) and return seconds waited.
+
+        Raises RateLimitExceeded right away when block=False or when the predicted wait
+        exceeds what is left of max_wait.
+        """
+        max_wait = self.max_wait if max_wait is None else float(max_wait)
+        waited = 0.0
+        while True:
+            wait_s = self.try_acquire(provider, credential, tokens)
+            if wait_s <= 0:
+                return waited
+            if not block or waited + wait_s > max_wait:
+                raise RateLimitExceeded(provider, wait_s)
+            time.sleep(wait_s)
+            waited += wait_s
+
+
+_LIMITER: RateLimiter | None = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """Return the process-wide limiter (created lazily from config.json)."""
+    global _LIMITER
+    if _LIMITER is not None:
+        return _LIMITER
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            try:
+                from scripts.config import get
+                opts = dict(get("rate_limits", None) or {})
+            except Exception:
+                opts = {}
+            max_wait = opts.pop("max_wait", 30)
+            _LIMITER = RateLimiter(opts, max_wait=max_wait)
+    return _LIMITER
+
+
+def acquire(provider: str, credential: str = "", tokens: int = 0, block: bool = True) -> float:
+    """Best-effort shared limiter: only RateLimitExceeded propagates, state errors allow the call."""
+    try:
+        return get_limiter().acquire(provider, credential, tokens, block=block)
+    except RateLimitExceeded:
+        raise
+    except Exception:
+        return 0.0
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Retry / circuit breaker / hedging helpers for upstream calls.
+
+- retry_call: jittered exponential backoff ("full jitter") on transient errors
+  (timeouts, connection resets, HTTP 408/429/5xx).
+- CircuitBreaker: after N consecutive transient failures the backend is
+  considered down and calls fail fast with CircuitOpenError until reset_timeout
+  has passed; then one probe call is let through (half-open).
+- hedged_call: if the primary call is still running after `hedge_after`
+  seconds, start a duplicate (or a different fallback call) and return
+  whichever succeeds first. The loser keeps running in the background (on its
+  own thread); its result is discarded.
+
+Used by scripts/llm.py (config "llm_resilience").
+"""
+
+from __future__ import annotations
+
+import contextvars
+import http.client
+import random
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable
+
+from scripts.http_pool import HTTPStatusError
+
+RETRYABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"circuit open for {name}: failing fast, retry after {retry_after:.1f}s")
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, HTTPStatusError):
+        return exc.status in RETRYABLE_STATUS
+    return isinstance(exc, (
+        TimeoutError,
+        socket.timeout,
+        ConnectionError,
+        http.client.HTTPException,
+        subprocess.TimeoutExpired,
+    ))
+
+
+def backoff_delay(attempt: int, base_delay: float = 0.5, max_delay: float = 8.0) -> float:
+    """Full-jitter delay before retry number `attempt` (0-based)."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_call(fn: Callable[[], Any], attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+               retry_on: Callable[[BaseException], bool] = is_retryable,
+               on_retry: Callable[[BaseException, int], None] | None = None) -> Any:
+    """Call fn() up to `attempts` times, sleeping with jittered backoff between tries."""
+    attempts = max(1, int(attempts))
+    for i in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if i == attempts - 1 or not retry_on(e):
+                raise
+            if on_retry is not None:
+                on_retry(e, i + 1)
+            time.sleep(backoff_delay(i, base_delay, max_delay))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._probe_at = 0.0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError if calls should fail fast right now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            left = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if left > 0:
+                raise CircuitOpenError(self.name, left)
+            # half-open: let exactly one probe through (a probe that never reported
+            # back, e.g. an abandoned stream, expires after reset_timeout)
+            now = time.monotonic()
+            if self._probing and now - self._probe_at < self.reset_timeout:
+                raise CircuitOpenError(self.name, self.reset_timeout - (now - self._probe_at))
+            self._probing = True
+            self._probe_at = now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+_BREAKERS: dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """Process-wide breaker per name (thresholds apply on first creation)."""
+    with _BREAKERS_LOCK:
+        br = _BREAKERS.get(name)
+        if br is None:
+            br = CircuitBreaker(name, failure_threshold, reset_timeout)
+            _BREAKERS[name] = br
+        return br
+
+
+def _spawn(fn: Callable[[], Any]) -> Future:
+    """Run fn (in a copy of the caller's context) on its own daemon thread.
+
+    Not a bounded pool on purpose: hedged calls nest (spillover -> per-backend
+    hedging), and a shared pool would let outer calls hold every worker while
+    their inner attempts wait in its queue. Threads are cheap next to an LLM call.
+    """
+    fut: Future = Future()
+    ctx = contextvars.copy_context()
+
+    def _run():
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            fut.set_result(ctx.run(fn))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=_run, name="hedge", daemon=True).start()
+    return fut
+
+
+def hedged_call(primary: Callable[[], Any], hedge_after: float | None,
+                secondary: Callable[[], Any] | None = None) -> tuple[Any, bool]:
+    """Run primary(); if it is not done after hedge_after seconds, also run secondary
+    (default: primary again). Returns (value, hedged_won).
+
+    The first successful result wins. If one attempt fails, the other is awaited;
+    if both fail, the primary's error is raised with `hedged = True` set on it
+    (so callers know the secondary already ran).
+    """
+    if not hedge_after or hedge_after <= 0:
+        return primary(), False
+    secondary = secondary or primary
+    f1 = _spawn(primary)
+    done, _ = wait([f1], timeout=hedge_after)
+    if done:
+        return f1.result(), False
+
+    f2 = _spawn(secondary)
+    pending = {f1, f2}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                return f.result(), f is f2
+    # both failed
+    err = f1.exception()
+    try:
+        err.hedged = True
+    except AttributeError:
+        pass
+    raise err
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Stage-level run journal for execute_pipeline (<output_dir>/run_journal.json).
+
+Why:
+- If a run died at render / draft push, a retry regenerated every Hunyuan image
+  and re-uploaded everything, i.e. minutes of work to redo a seconds-long step.
+
+Every completed stage (cover, inline_N, upload_cover, upload_inline_N, html,
+draft) is recorded with:
+- inputs_hash: sha256 of the stage inputs (prompts, resolution, source image
+  hashes, rendered html hash, ...)
+- outputs: the stage result dict
+- files: {path: sha256} for files the stage produced
+
+On a re-run, a stage whose inputs_hash matches and whose files are still on disk
+with the same content is skipped and its recorded outputs are reused. Stages
+that only produced a fallback (placeholder image, failed upload / draft) are not
+recorded, so they are retried.
+
+Each stage's duration (and whether it was skipped) is kept in `timings` for the
+latest run and logged to stderr.
+
+Config (config.json):
+  "pipeline_resume": true     # false: always redo every stage (journal is still written)
+
+Usage:
+    journal = RunJournal(output_dir)
+    cover = journal.run("cover", {"prompt": p, "res": r}, lambda: generate_cover(...),
+                        files=lambda out: [out["path"]],
+                        ok=lambda out: not out.get("fallback"))
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable
+
+JOURNAL_NAME = "run_journal.json"
+
+
+def hash_inputs(inputs: Any) -> str:
+    raw = json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """sha256 of a file's content ("" if it cannot be read)."""
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except OSError:
+        return ""
+    return h.hexdigest()
+
+
+class RunJournal:
+    def __init__(self, output_dir: str, resume: bool = True):
+        self.path = os.path.join(output_dir, JOURNAL_NAME)
+        self.resume = resume
+        self._lock = threading.Lock()
+        self.data = {"stages": {}, "timings": {}}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            if isinstance(loaded, dict) and isinstance(loaded.get("stages"), dict):
+                self.data["stages"] = loaded["stages"]
+        except Exception:
+            pass
+        self.data["run_started_at"] = datetime.now().isoformat()
+
+    def lookup(self, stage: str, inputs: Any) -> dict | None:
+        """Recorded outputs if the stage completed with the same inputs and its files are intact."""
+        if not self.resume:
+            return None
+        with self._lock:
+            entry = self.data["stages"].get(stage)
+        if not entry or entry.get("inputs_hash") != hash_inputs(inputs):
+            return None
+        for path, sha in (entry.get("files") or {}).items():
+            if not os.path.exists(path) or file_sha256(path) != sha:
+                return None
+        return entry.get("outputs")
+
+    def record(self, stage: str, inputs: Any, outputs: dict, files: list[str] | None = None) -> None:
+        entry = {
+            "inputs_hash": hash_inputs(inputs),
+            "outputs": outputs,
+            "files": {p: file_sha256(p) for p in (files or []) if p},
+            "completed_at": datetime.now().isoformat(),
+        }
+        with self._lock:
+            self.data["stages"][stage] = entry
+        self.save()
+
+    def forget(self, stage: str) -> None:
+        with self._lock:
+            self.data["stages"].pop(stage, None)
+
+    def timing(self, stage: str, seconds: float, skipped: bool = False) -> None:
+        with self._lock:
+            self.data["timings"][stage] = {"seconds": round(seconds, 3), "skipped": skipped}
+        note = " (skipped, journal)" if skipped else ""
+        print(f"[pipeline] stage {stage}: {seconds:.2f}s{note}", file=sys.stderr)
+
+    def timings(self) -> dict:
+        with self._lock:
+            return {k: dict(v) for k, v in self.data["timings"].items()}
+
+    def run(self, stage: str, inputs: Any, fn: Callable[[], dict],
+            files: Callable[[dict], list[str]] | None = None,
+            ok: Callable[[dict], bool] | None = None, force: bool = False) -> dict:
+        """Return recorded outputs for an unchanged completed stage, else run fn() and record it.
+
+        files(out): files the stage produced (their hashes validate the next resume).
+        ok(out): False keeps the result out of the journal (fallbacks get retried).
+        force: always run fn() (the new result still replaces the recorded one).
+        """
+        t0 = time.monotonic()
+        cached = None if force else self.lookup(stage, inputs)
+        if cached is not None:
+            self.timing(stage, time.monotonic() - t0, skipped=True)
+            return cached
+        out = fn()
+        if ok is None or ok(out):
+            self.record(stage, inputs, out, files(out) if files else None)
+        else:
+            self.forget(stage)
+        self.timing(stage, time.monotonic() - t0)
+        return out
+
+    def save(self) -> None:
+        """Atomic write (best-effort: a journal failure never fails the pipeline)."""
+        try:
+            with self._lock:
+                self.data["updated_at"] = datetime.now().isoformat()
+                text = json.dumps(self.data, ensure_ascii=False, indent=2)
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Single-flight: coalesce concurrent identical calls into one upstream call.
+
+While a call for `key` is in flight, other threads asking for the same key wait
+for it and receive the same result (or the same exception) instead of hitting
+the provider again. Nothing is remembered after the call finishes; that is the
+job of the response caches.
+
+Usage:
+    from scripts.singleflight import Group
+    _FLIGHT = Group()
+    value, shared = _FLIGHT.do(key, lambda: expensive(prompt))
+
+    # batch callers: claim every key first, do the work, then settle
+    call, leader = _FLIGHT.claim(key)
+    if leader:
+        _FLIGHT.settle(key, call, value=expensive(prompt))
+    value = call.wait()
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+    def wait(self) -> Any:
+        """The leader's value (blocks); raises the leader's exception."""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class Group:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+
+    def claim(self, key: str) -> tuple[_Call, bool]:
+        """Non-blocking half of do(): returns (call, leader).
+
+        The leader must settle() the call (even on failure); followers call.wait().
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            return call, True
+
+    def settle(self, key: str, call: _Call, value: Any = None, error: BaseException | None = None) -> None:
+        """Publish the leader's result to its followers and end the flight."""
+        call.value, call.error = value, error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """Run fn() once per concurrent key. Returns (value, shared).
+
+        shared is True for followers that reused another thread's in-flight call.
+        """
+        call, leader = self.claim(key)
+        if not leader:
+            return call.wait(), True
+        try:
+            value = fn()
+        except BaseException as e:
+            self.settle(key, call, error=e)
+            raise
+        self.settle(key, call, value=value)
+        return value, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
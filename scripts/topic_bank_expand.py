@@ -62,7 +62,7 @@ def main():
     platform = '公众号' if acc.get('platform') == 'wechat_mp' else '小红书'
     prompt = f"""你是一位{platform}内容创作者，请一次性生成 {args.count} 个高质量中文标题，用于本账号的长期选题库。\n\n账号定位：\n- 领域：{ws.get('domain','')}\n- 人设：{ws.get('persona','')}\n- 读者：{ws.get('audience','')}\n- 语气：{ws.get('tone','')}\n\n素材（只能当灵感，标题必须具体、有画面）：\n- 痛点：{(atoms.get('problems') or [])[:18]}\n- 场景：{(atoms.get('scenes') or [])[:18]}\n- 冲突：{(atoms.get('conflicts') or [])[:18]}\n- 动作：{(atoms.get('actions') or [])[:18]}\n\n格式要求：\n1) 每行一个标题，不要编号，不要解释\n2) 10-22字为主，口语化，有冲突\n3) 禁止空泛句（快节奏时代/不难发现/越来越…）\n\n请输出 {args.count} 个标题："""
 
-    out = chat(prompt, temperature=0.9, max_tokens=1200)
+    out = chat(prompt, temperature=0.9, max_tokens=1200, cache=False)
     lines = []
     for l in out.splitlines():
         l = (l or '').strip().strip('-•')
@@ -82,6 +82,8 @@ def main():
     os.makedirs(os.path.dirname(bank_path), exist_ok=True)
     with open(bank_path, 'w', encoding='utf-8') as f:
         json.dump(bank, f, ensure_ascii=False, indent=2)
+    from scripts.config_assets import invalidate
+    invalidate(bank_path)
 
     print(json.dumps({
         'ok': True,
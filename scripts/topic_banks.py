@@ -10,7 +10,6 @@ so the writing won't become generic.
 
 from __future__ import annotations
 
-import json
 import os
 
 ARTBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -18,17 +17,9 @@ TOPIC_BANKS_DIR = os.path.join(ARTBOT_DIR, "config", "topic_banks")
 
 
 def load_topic_bank(account_id: str) -> dict:
-    account_id = (account_id or "").strip()
-    if not account_id:
-        return {"account_id": "", "banks": []}
-    path = os.path.join(TOPIC_BANKS_DIR, f"{account_id}.json")
-    if not os.path.exists(path):
-        return {"account_id": account_id, "banks": []}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f) or {"account_id": account_id, "banks": []}
-    except Exception:
-        return {"account_id": account_id, "banks": []}
+    """Load an account's bank (cached by scripts/config_assets, reloaded on file change)."""
+    from scripts.config_assets import get_topic_bank
+    return get_topic_bank(account_id)
 
 
 def flatten_atoms(bank: dict) -> dict:
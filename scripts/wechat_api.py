@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""In-process WeChat Official Account API client (material upload + drafts).
+
+Why:
+- every upload_image / create_draft spawned `bash run.sh` -> md2wechat (Go),
+  which fetched a fresh access_token each time; we then scraped its stdout.
+
+This client talks to the API directly over the shared keep-alive pool
+(scripts/http_pool.py):
+- access_token per appid, cached in memory and in data/wechat_tokens/<appid hash>.json,
+  valid until expires_in minus a safety margin. Refreshes take an exclusive lock
+  file, so web / cron / worker processes fetch one token between them instead of
+  invalidating each other's (a new /cgi-bin/token call revokes the previous one).
+- add_material streams the image from disk as multipart/form-data (no full read);
+  the body is seekable, so the pool rewinds and replays it when a kept-alive
+  socket turns out to be stale.
+- a token rejected by WeChat (40001 / 40014 / 42001) is refreshed once and the
+  call retried.
+
+Config (config.json):
+  "wechat_api": {
+    "backend": "native",                       # "md2wechat": keep the old subprocess path
+    "base_url": "https://api.weixin.qq.com",   # point at a local stand-in for tests
+    "timeout": 30
+  }
+
+Usage:
+    from scripts.wechat_api import get_client
+    c = get_client(appid, secret)
+    up = c.add_material("cover.jpg")          # {"media_id": ..., "url": ...}
+    media_id = c.add_draft([{"title": ..., "thumb_media_id": ..., "content": ...}])
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: in-process lock only
+    fcntl = None
+
+from scripts.http_pool import get_pool
+
+DEFAULT_BASE_URL = "https://api.weixin.qq.com"
+# Refresh this many seconds before WeChat's expires_in (7200s) runs out.
+TOKEN_MARGIN = 300
+# errcodes meaning "this access_token is no longer valid"
+TOKEN_ERRORS = (40001, 40014, 42001)
+
+DRAFT_URL = "https://mp.weixin.qq.com/cgi-bin/appmsg?t=media/appmsg_edit_v2&action=edit&createType=0&token="
+
+
+class WeChatAPIError(RuntimeError):
+    def __init__(self, errcode: int, errmsg: str, path: str = ""):
+        self.errcode = errcode
+        self.errmsg = errmsg
+        super().__init__(f"wechat api error {errcode}: {errmsg}" + (f" ({path})" if path else ""))
+
+
+def _opts() -> dict:
+    try:
+        from scripts.config import get
+        return dict(get("wechat_api", None) or {})
+    except Exception:
+        return {}
+
+
+def _token_dir() -> str:
+    try:
+        from scripts.gzh_store import ensure_dirs
+        base = ensure_dirs()["data"]
+    except Exception:
+        base = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+    return os.path.join(base, "wechat_tokens")
+
+
+# appid -> (token, expires_at epoch)
+_TOKENS: dict[str, tuple[str, float]] = {}
+_TOKENS_LOCK = threading.Lock()
+# appid -> lock held while refreshing that appid's token (other accounts keep going)
+_REFRESH_LOCKS: dict[str, threading.Lock] = {}
+
+
+def _refresh_lock(key: str) -> threading.Lock:
+    with _TOKENS_LOCK:
+        lock = _REFRESH_LOCKS.get(key)
+        if lock is None:
+            lock = _REFRESH_LOCKS[key] = threading.Lock()
+        return lock
+
+
+class _MultipartFile:
+    """head + file content + tail as one seekable, read()-able request body."""
+
+    def __init__(self, head: bytes, path: str, tail: bytes):
+        self._head, self._tail = head, tail
+        self._f = open(path, "rb")
+        self._size = os.fstat(self._f.fileno()).st_size
+        self.length = len(head) + self._size + len(tail)
+        self._pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self.length - self._pos
+        file_start, file_end = len(self._head), len(self._head) + self._size
+        out = []
+        while n > 0 and self._pos < self.length:
+            if self._pos < file_start:
+                chunk = self._head[self._pos:self._pos + n]
+            elif self._pos < file_end:
+                self._f.seek(self._pos - file_start)
+                chunk = self._f.read(min(n, file_end - self._pos))
+                if not chunk:
+                    raise OSError("file shrank during upload")
+            else:
+                chunk = self._tail[self._pos - file_end:self._pos - file_end + n]
+            self._pos += len(chunk)
+            n -= len(chunk)
+            out.append(chunk)
+        return b"".join(out)
+
+    def seek(self, pos: int, whence: int = 0) -> int:
+        self._pos = pos if whence == 0 else (self._pos + pos if whence == 1 else self.length + pos)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WeChatClient:
+    def __init__(self, appid: str, secret: str, base_url: str | None = None,
+                 token_dir: str | None = None, timeout: float = 30):
+        if not appid or not secret:
+            raise ValueError("wechat appid/secret not configured")
+        self.appid = appid
+        self.secret = secret
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.token_dir = token_dir or _token_dir()
+        self.timeout = float(timeout)
+        # Simple counters (useful for debugging / tests)
+        self.stats = {"token_fetches": 0}
+
+    # -----------------
+    # access_token
+    # -----------------
+
+    def _token_path(self) -> str:
+        # Key by appid + base_url so a test stand-in never shares tokens with production.
+        h = hashlib.sha256(f"{self.base_url}|{self.appid}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.token_dir, f"{h}.json")
+
+    def _mem_key(self) -> str:
+        return f"{self.base_url}|{self.appid}"
+
+    def _read_token_file(self) -> tuple[str, float] | None:
+        try:
+            with open(self._token_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data["access_token"], float(data["expires_at"])
+        except Exception:
+            return None
+
+    def _write_token_file(self, token: str, expires_at: float) -> None:
+        path = self._token_path()
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"access_token": token, "expires_at": expires_at}, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _valid(entry: tuple[str, float] | None, now: float) -> bool:
+        return bool(entry and entry[0] and entry[1] - TOKEN_MARGIN > now)
+
+    def access_token(self, force_refresh: bool = False, stale: str = "") -> str:
+        """Cached token; force_refresh (or a `stale` token WeChat just rejected) fetches a new one.
+
+        Another process may already have replaced a stale token, in which case that
+        one is used instead of fetching again.
+        """
+        now = time.time()
+        key = self._mem_key()
+        with _TOKENS_LOCK:
+            entry = _TOKENS.get(key)
+        if not force_refresh and self._valid(entry, now) and entry[0] != stale:
+            return entry[0]
+
+        os.makedirs(self.token_dir, exist_ok=True)
+        lock_path = self._token_path() + ".lock"
+        with _refresh_lock(key), open(lock_path, "a") as lock_f:
+            if fcntl is not None:
+                fcntl.flock(lock_f, fcntl.LOCK_EX)
+            try:
+                entry = self._read_token_file()
+                if force_refresh or not self._valid(entry, time.time()) or entry[0] == stale:
+                    entry = self._fetch_token()
+                    self._write_token_file(*entry)
+                with _TOKENS_LOCK:
+                    _TOKENS[key] = entry
+                return entry[0]
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_f, fcntl.LOCK_UN)
+
+    def _fetch_token(self) -> tuple[str, float]:
+        self.stats["token_fetches"] += 1
+        query = urlencode({"grant_type": "client_credential", "appid": self.appid, "secret": self.secret})
+        resp = get_pool().request("GET", f"{self.base_url}/cgi-bin/token?{query}", timeout=self.timeout)
+        resp.raise_for_status()
+        data = resp.json()
+        token = data.get("access_token")
+        if not token:
+            raise WeChatAPIError(int(data.get("errcode") or -1), data.get("errmsg") or "no access_token",
+                                 "/cgi-bin/token")
+        return token, time.time() + float(data.get("expires_in") or 7200)
+
+    # -----------------
+    # Calls
+    # -----------------
+
+    def _call(self, method: str, path: str, params: dict | None = None, make_body=None,
+              headers: dict | None = None) -> dict:
+        """Authenticated call; make_body() builds the body for each attempt."""
+        stale = ""
+        for attempt in range(2):
+            token = self.access_token(stale=stale)
+            query = urlencode({**(params or {}), "access_token": token})
+            body = make_body() if make_body else None
+            resp = get_pool().request(method, f"{self.base_url}{path}?{query}", body=body,
+                                      headers=headers, timeout=self.timeout)
+            resp.raise_for_status()
+            data = resp.json()
+            errcode = int(data.get("errcode") or 0)
+            if errcode in TOKEN_ERRORS and attempt == 0:
+                stale = token
+                continue
+            if errcode:
+                raise WeChatAPIError(errcode, data.get("errmsg") or "", path)
+            return data
+        raise AssertionError("unreachable")
+
+    def post_json(self, path: str, payload: dict) -> dict:
+        # WeChat expects raw UTF-8 (\\uXXXX escapes show up literally in drafts).
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return self._call("POST", path, make_body=lambda: body,
+                          headers={"Content-Type": "application/json; charset=utf-8"})
+
+    def add_material(self, path: str, media_type: str = "image") -> dict:
+        """Permanent material upload (multipart "media", streamed from disk). Returns {"media_id", "url"}."""
+        boundary = uuid.uuid4().hex
+        ctype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        filename = os.path.basename(path).replace('"', "")
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="media"; filename="{filename}"\r\n'
+            f"Content-Type: {ctype}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+        with _MultipartFile(head, path, tail) as body:
+            data = self._call(
+                "POST", "/cgi-bin/material/add_material", params={"type": media_type},
+                make_body=lambda: (body.seek(0), body)[1],
+                headers={"Content-Type": f"multipart/form-data; boundary={boundary}",
+                         "Content-Length": str(body.length)},
+            )
+        return {"media_id": data.get("media_id", ""), "url": data.get("url", "")}
+
+    def add_draft(self, articles: list[dict]) -> str:
+        """Create one draft holding the given articles; returns its media_id."""
+        return self.post_json("/cgi-bin/draft/add", {"articles": articles}).get("media_id", "")
+
+
+def get_client(appid: str, secret: str) -> WeChatClient:
+    opts = _opts()
+    return WeChatClient(appid, secret, base_url=opts.get("base_url"), timeout=opts.get("timeout", 30))
+
+
+def native_enabled() -> bool:
+    return (_opts().get("backend") or "native") == "native"
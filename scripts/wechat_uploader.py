@@ -81,35 +81,122 @@ def _run_md2wechat(*args, wechat_appid: str | None = None, wechat_secret: str |
     return {"raw_output": stdout}
 
 
+def _native_client(wechat_appid: str | None, wechat_secret: str | None):
+    """WeChatClient for the native backend (config wechat_api.backend), else None (md2wechat)."""
+    from .wechat_api import get_client, native_enabled
+
+    if not native_enabled():
+        return None
+    cfg = config.load_config()
+    return get_client(wechat_appid or cfg.get("wechat_appid") or "",
+                      wechat_secret or cfg.get("wechat_secret") or "")
+
+
 def upload_image(image_path: str, wechat_appid: str | None = None, wechat_secret: str | None = None) -> dict:
-    """上传图片到微信素材库，返回 {media_id, wechat_url}"""
-    result = _run_md2wechat("upload_image", image_path, wechat_appid=wechat_appid, wechat_secret=wechat_secret)
-    data = result.get("data", result)
+    """上传图片到微信素材库，返回 {media_id, wechat_url}
+
+    Identical bytes already uploaded under the same appid are answered from
+    scripts/media_cache.py without any network call ("cached": True).
+    """
+    from . import media_cache
+    from .run_journal import file_sha256
+
+    appid = wechat_appid or config.load_config().get("wechat_appid") or ""
+    sha = file_sha256(image_path)
+    hit = media_cache.lookup(appid, sha)
+    if hit is not None:
+        return {"media_id": hit["media_id"], "wechat_url": hit.get("wechat_url", ""), "cached": True}
+
+    client = _native_client(wechat_appid, wechat_secret)
+    if client is not None:
+        up = client.add_material(image_path)
+        out = {"media_id": up["media_id"], "wechat_url": up["url"]}
+    else:
+        result = _run_md2wechat("upload_image", image_path, wechat_appid=wechat_appid, wechat_secret=wechat_secret)
+        data = result.get("data", result)
+        out = {
+            "media_id": data.get("media_id", ""),
+            "wechat_url": data.get("wechat_url", ""),
+        }
+    media_cache.store(appid, sha, out)
+    return out
+
+
+def upload_images(image_paths: list, wechat_appid: str | None = None, wechat_secret: str | None = None,
+                  max_workers: int | None = None) -> list[dict]:
+    """并发上传多张图片（native 后端共用一个 access_token；md2wechat 后端每张一次进程调用）。
+
+    Returns one dict per path, in input order:
+    - success: {"path", "media_id", "wechat_url"}
+    - failure: {"path", "error"}  (one bad image does not fail the batch)
+
+    max_workers defaults to config "upload_concurrency".
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    paths = list(image_paths or [])
+    if not paths:
+        return []
+    if max_workers is None:
+        max_workers = config.load_config().get("upload_concurrency", 4)
+    workers = max(1, min(int(max_workers or 1), len(paths)))
+
+    def _one(path):
+        try:
+            return {"path": path, **upload_image(path, wechat_appid=wechat_appid, wechat_secret=wechat_secret)}
+        except Exception as e:
+            return {"path": path, "error": str(e)}
+
+    if workers == 1:
+        return [_one(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wx-upload") as ex:
+        return list(ex.map(_one, paths))
+
+
+# WeChat accepts at most 8 news items per draft.
+MAX_DRAFT_ARTICLES = 8
+
+
+def draft_article(title: str, content_html: str, cover_media_id: str, digest: str) -> dict:
+    """One news item of a draft/add request."""
     return {
-        "media_id": data.get("media_id", ""),
-        "wechat_url": data.get("wechat_url", ""),
+        "title": title,
+        "thumb_media_id": cover_media_id,
+        "digest": digest,
+        "content": content_html,
     }
 
 
-def create_draft(title: str, content_html: str, cover_media_id: str, digest: str, wechat_appid: str | None = None, wechat_secret: str | None = None) -> dict:
-    """创建微信草稿"""
-    cfg = config.load_config()
-    output_dir = cfg["output_dir"]
+def _create_draft_batch(articles: list, client, wechat_appid: str | None, wechat_secret: str | None) -> dict:
+    if client is not None:
+        from . import media_cache
+        from .wechat_api import DRAFT_URL, WeChatAPIError
+
+        try:
+            media_id = client.add_draft(articles)
+        except WeChatAPIError as e:
+            if e.errcode == 40007:  # invalid media_id: a cached cover upload is gone
+                for a in articles:
+                    media_cache.forget_media(client.appid, a.get("thumb_media_id", ""))
+            raise
+        return {"media_id": media_id, "draft_url": DRAFT_URL, "success": bool(media_id)}
+
+    # md2wechat reads the request from a file: use a private temp file per call
+    # (a shared output/draft.json got clobbered by concurrent pushes).
+    import tempfile
+
+    output_dir = config.load_config()["output_dir"]
     os.makedirs(output_dir, exist_ok=True)
-    
-    draft_path = os.path.join(output_dir, "draft.json")
-    draft = {
-        "articles": [{
-            "title": title,
-            "thumb_media_id": cover_media_id,
-            "digest": digest,
-            "content": content_html,
-        }]
-    }
-    with open(draft_path, "w") as f:
-        json.dump(draft, f, ensure_ascii=False)
-    
-    result = _run_md2wechat("create_draft", draft_path, wechat_appid=wechat_appid, wechat_secret=wechat_secret)
+    fd, draft_path = tempfile.mkstemp(prefix=".draft-", suffix=".json", dir=output_dir)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"articles": articles}, f, ensure_ascii=False)
+        result = _run_md2wechat("create_draft", draft_path, wechat_appid=wechat_appid, wechat_secret=wechat_secret)
+    finally:
+        try:
+            os.remove(draft_path)
+        except OSError:
+            pass
     data = result.get("data", result)
     return {
         "media_id": data.get("media_id", ""),
@@ -118,6 +205,33 @@ def create_draft(title: str, content_html: str, cover_media_id: str, digest: str
     }
 
 
+def create_drafts(articles: list, wechat_appid: str | None = None, wechat_secret: str | None = None) -> list[dict]:
+    """把多篇文章合并成多图文草稿（每 MAX_DRAFT_ARTICLES 篇一个草稿）。
+
+    articles: [draft_article(...), ...]
+    Returns one dict per article, in input order:
+    {"media_id", "draft_url", "success", "index"} (index = position inside its draft),
+    or {"success": False, "error"} for every article of a batch that failed.
+    """
+    client = _native_client(wechat_appid, wechat_secret)
+    out: list[dict] = []
+    for start in range(0, len(articles), MAX_DRAFT_ARTICLES):
+        batch = list(articles[start:start + MAX_DRAFT_ARTICLES])
+        try:
+            res = _create_draft_batch(batch, client, wechat_appid, wechat_secret)
+        except Exception as e:
+            res = {"success": False, "error": str(e)}
+        out.extend({**res, "index": i} for i in range(len(batch)))
+    return out
+
+
+def create_draft(title: str, content_html: str, cover_media_id: str, digest: str, wechat_appid: str | None = None, wechat_secret: str | None = None) -> dict:
+    """创建微信草稿（单篇）"""
+    client = _native_client(wechat_appid, wechat_secret)
+    return _create_draft_batch([draft_article(title, content_html, cover_media_id, digest)],
+                               client, wechat_appid, wechat_secret)
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         print("Usage: python -m scripts.wechat_uploader upload <image_path>")
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """ArtBot 测试套件
 
-覆盖：article_service, autotopic, self_topics, html_renderer, config, llm
+覆盖：article_service, autotopic, self_topics, html_renderer, config, llm, json_stream
 """
 import json
 import os
@@ -40,6 +40,49 @@ class TestConfig(unittest.TestCase):
         with patch.dict(os.environ, {"DEFAULT_THEME": "test-theme"}):
             self.assertEqual(load_config()["default_theme"], "test-theme")
 
+    def test_snapshot_cached_readonly_and_invalidated(self):
+        from scripts import config
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "config.json")
+            with open(path, "w") as f:
+                json.dump({"default_theme": "a", "gzh": {"dedup": {"window": 3}}}, f)
+            with patch("scripts.config.CONFIG_FILE", path):
+                config.invalidate_cache()
+                cfg = config.load_config()
+                self.assertIs(config.load_config(), cfg)  # no re-parse
+                with self.assertRaises(TypeError):
+                    cfg["default_theme"] = "b"
+                with self.assertRaises(TypeError):
+                    cfg["gzh"]["dedup"]["window"] = 9
+
+                editable = config.load_config(mutable=True)
+                editable["default_theme"] = "b"
+                config.save_config(editable)
+                self.assertEqual(config.load_config()["default_theme"], "b")
+            config.invalidate_cache()
+
+    def test_config_assets_indexed_and_reloaded(self):
+        from scripts import config_assets
+        from tools.store.json_store import save_json
+        with tempfile.TemporaryDirectory() as tmpdir:
+            acc_file = os.path.join(tmpdir, "accounts.json")
+            save_json(acc_file, {"accounts": [{"id": "a1", "name": "A"}, {"id": "a2", "name": "B"}]})
+            with patch("scripts.config_assets.ACCOUNTS_FILE", acc_file), \
+                 patch("scripts.config_assets.TOPIC_BANKS_DIR", tmpdir):
+                self.assertEqual(config_assets.get_account("a2")["name"], "B")
+                self.assertIs(config_assets.get_accounts(), config_assets.get_accounts())  # parsed once
+                config_assets.get_account("a2")["name"] = "mutated"  # private copy
+                self.assertEqual(config_assets.get_account("a2")["name"], "B")
+                self.assertIsNone(config_assets.get_account("nope"))
+
+                save_json(acc_file, {"accounts": [{"id": "a3", "name": "C, renamed"}]})
+                config_assets.invalidate(acc_file)
+                self.assertIsNone(config_assets.get_account("a1"))
+                self.assertEqual(config_assets.get_account("a3")["name"], "C, renamed")
+
+                self.assertEqual(config_assets.get_topic_bank("a3"), {"account_id": "a3", "banks": []})
+            config_assets.invalidate()
+
 
 # ─── HTML Renderer ────────────────────────────────────────
 
@@ -67,6 +110,74 @@ class TestHTMLRenderer(unittest.TestCase):
             [{"after_section": 0, "url": "http://img/1.jpg", "caption": ""}], "snow-cold")
         self.assertIn("img", html)
 
+    # sha256 (first 16 hex) of render_article output per theme: [full article, bare article].
+    # Rendering must stay byte-identical across renderer refactors.
+    GOLDEN = {
+            "snow-cold": ["1c181c746e685f17", "f9b6b54c6cf2a83d"],
+            "autumn-warm": ["20c542a48c17f81c", "b13f127c016ec6a9"],
+            "spring-fresh": ["15d2f4055f74bf4d", "a839fe21fd8e187f"],
+            "deep-ocean": ["3dc7a1577aaf7da8", "92056110823e022a"],
+            "sunset-glow": ["cc701be643cdb39a", "e8868ea342b46cf0"],
+            "magazine-noir": ["a054915ba1d2704b", "278a003493facc40"],
+            "magazine-rose": ["ed015bbc84f887e4", "24e39171084f7c17"],
+            "minimal-ink": ["ddd2401abead195b", "d78d3c2ba3bb540f"],
+            "minimal-cyan": ["fcee3081d56d1fd6", "9e517a014672780f"],
+            "gradient-purple": ["6fcffc65b9243f89", "9d3dd6c89dbefa64"],
+            "gradient-ocean": ["2047cf5812ca37d2", "9792fb98ec0b1e6b"],
+            "gradient-sunset": ["ef9179daad266dbe", "5ce0e3f5b7535ed6"],
+            "xhs-sweet": ["ca2c2c2094f4261a", "7f9ff157ff838740"],
+            "xhs-forest": ["5a16d6466a2ba6fd", "10e07e9f22a3f9a5"],
+            "xhs-cream": ["e9b9e65e174b5628", "59a760cf7da2b031"],
+            "no-such-noir": ["1c181c746e685f17", "f9b6b54c6cf2a83d"],
+    }
+    SECTIONS = [
+        {"title": "第一节", "paragraphs": ["普通段落 <b>x</b>", "**加粗金句**", "- 列表项一", "• 列表项二", "最后一段"]},
+        {"title": "", "paragraphs": ["无标题小节"]},
+        {"title": "第三节", "paragraphs": []},
+        {"title": "第四节", "paragraphs": ["结尾"]},
+    ]
+    IMAGES = [
+        {"after_section": -1, "url": "http://img/0.jpg", "caption": ""},
+        {"after_section": 1, "url": "http://img/1.jpg", "caption": "图注"},
+        {"after_section": 3, "url": "http://img/3.jpg"},
+    ]
+
+    def test_golden_output_per_theme(self):
+        import hashlib
+        self.assertEqual(set(self.GOLDEN) - {"no-such-noir"}, set(THEMES))
+        for key, expected in self.GOLDEN.items():
+            full = render_article("标题", "引言", self.SECTIONS, self.IMAGES, key,
+                                  cover_url="http://img/c.jpg", include_cover_in_body=True)
+            bare = render_article("标题", "", self.SECTIONS, None, key)
+            got = [hashlib.sha256(h.encode("utf-8")).hexdigest()[:16] for h in (full, bare)]
+            self.assertEqual(got, expected, key)
+
+    def test_iter_render_streams_same_document(self):
+        from scripts.html_renderer import iter_render_article, render_article_to_file
+        args = ("标题", "引言", self.SECTIONS, self.IMAGES, "magazine-noir")
+        chunks = list(iter_render_article(*args))
+        # open + header + 3 images + 4 sections + footer + close
+        self.assertEqual(len(chunks), 11)
+        self.assertEqual("".join(chunks), render_article(*args))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = render_article_to_file(os.path.join(tmpdir, "article.html"), *args)
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), render_article(*args))
+            self.assertEqual(os.listdir(tmpdir), ["article.html"])
+
+    def test_render_to_file_removes_tmp_on_error(self):
+        from scripts.html_renderer import render_article_to_file
+
+        def broken_render(*args, **kwargs):
+            yield "<html>"
+            raise ValueError("bad section")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with patch("scripts.html_renderer.iter_render_article", broken_render), \
+                 self.assertRaises(ValueError):
+                render_article_to_file(os.path.join(tmpdir, "article.html"))
+            self.assertEqual(os.listdir(tmpdir), [])
+
     def test_cover_rendered_when_provided(self):
         html = render_article("T", "", [{"title": "S", "paragraphs": ["P"]}],
             [], "snow-cold", cover_url="http://example.com/cover.jpg")
@@ -122,6 +233,80 @@ class TestArticleService(unittest.TestCase):
         # At least some should differ
         self.assertGreater(len(set(prompts.values())), 1)
 
+    def test_prefetch_released_when_save_fails(self):
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from scripts import article_service
+        with tempfile.TemporaryDirectory() as tmpdir:
+            staging = os.path.join(tmpdir, ".staging", "t1")
+            os.makedirs(staging)
+            gate = threading.Event()
+            pool = ThreadPoolExecutor(max_workers=1)
+            running = pool.submit(gate.wait)
+            queued = pool.submit(lambda: None)
+            raw = json.dumps({"title": "T", "sections": []})
+            task = {"task_id": "t1", "account_id": "test", "keyword": "kw", "article_prompt": "p"}
+            with patch("scripts.article_service._stream_article_with_prefetch",
+                       return_value=(raw, {}, pool, staging)), \
+                 patch("scripts.article_service.save_article", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    article_service.execute_generation_task(task)
+            self.assertTrue(queued.cancelled())  # not started -> cancelled, not awaited
+            self.assertTrue(os.path.exists(staging))  # removed once the running job finishes
+            gate.set()
+            running.result(timeout=5)
+            for _ in range(100):
+                if not os.path.exists(staging):
+                    break
+                time.sleep(0.02)
+            self.assertFalse(os.path.exists(staging))
+
+    def test_push_drafts_batched_one_draft_per_account(self):
+        from scripts.article_service import push_drafts_batched
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tasks = []
+            for i, acc in enumerate(["a", "a", "b", "a"]):
+                d = os.path.join(tmpdir, f"d{i}")
+                os.makedirs(d)
+                with open(os.path.join(d, "article.html"), "w", encoding="utf-8") as f:
+                    f.write(f"<p>{i}</p>")
+                tasks.append({"task_id": str(i), "status": "done", "account_id": acc, "dirname": f"d{i}",
+                              "title": f"t{i}", "digest": "", "html_path": os.path.join(d, "article.html"),
+                              "cover_media_id": "" if i == 3 else f"m{i}"})
+            tasks.append({"task_id": "x", "status": "error", "account_id": "a"})
+
+            def fake_drafts(articles, wechat_appid=None, wechat_secret=None):
+                return [{"media_id": f"draft-{wechat_appid}", "success": True, "index": n} for n in range(len(articles))]
+
+            acc = lambda aid: {"credentials": {"appid": f"wx_{aid}", "secret": "s"}}
+            with patch("scripts.article_service.OUTPUT_DIR", tmpdir), \
+                 patch("scripts.article_service.load_account", side_effect=acc), \
+                 patch("scripts.wechat_uploader.create_drafts", side_effect=fake_drafts) as cd:
+                push_drafts_batched(tasks)
+            self.assertEqual(cd.call_count, 2)
+            self.assertEqual([a["content"] for a in cd.call_args_list[0].args[0]], ["<p>0</p>", "<p>1</p>"])
+            self.assertEqual(tasks[1]["draft"], {"media_id": "draft-wx_a", "success": True, "index": 1})
+            self.assertEqual(tasks[2]["draft"]["media_id"], "draft-wx_b")
+            self.assertFalse(tasks[3]["draft"]["success"])
+            self.assertNotIn("draft", tasks[4])
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, "d0", "wechat_draft.json")))
+
+    def test_push_drafts_batched_failure_gives_each_task_its_own_result(self):
+        from scripts.article_service import push_drafts_batched
+        with tempfile.TemporaryDirectory() as tmpdir:
+            html = os.path.join(tmpdir, "article.html")
+            with open(html, "w", encoding="utf-8") as f:
+                f.write("<p>x</p>")
+            tasks = [{"task_id": str(i), "status": "done", "account_id": "a", "dirname": f"d{i}", "title": f"t{i}",
+                      "digest": "", "html_path": html, "cover_media_id": "m"} for i in range(2)]
+            with patch("scripts.article_service.OUTPUT_DIR", tmpdir), \
+                 patch("scripts.article_service.load_account", return_value={"credentials": {}}), \
+                 patch("scripts.wechat_uploader.create_drafts", side_effect=RuntimeError("45009")):
+                push_drafts_batched(tasks)
+            self.assertEqual(tasks[0]["draft"], {"success": False, "error": "45009"})
+            self.assertIsNot(tasks[0]["draft"], tasks[1]["draft"])
+
 
 # ─── Autotopic ────────────────────────────────────────────
 
@@ -174,18 +359,1029 @@ class TestSelfTopics(unittest.TestCase):
 # ─── LLM ──────────────────────────────────────────────────
 
 class TestLLM(unittest.TestCase):
-    @patch("scripts.llm.urllib.request.urlopen")
-    def test_chat_mock(self, mock_urlopen):
+    def setUp(self):
+        # Keep the shared cross-process rate limiter out of unit tests.
+        p = patch("scripts.llm._rate_limit")
+        p.start()
+        self.addCleanup(p.stop)
+
+    @patch("scripts.llm._load_moonshot_key", return_value="sk-test")
+    @patch("scripts.llm._backend", return_value="moonshot")
+    @patch("scripts.llm.get_pool")
+    def test_chat_mock(self, mock_get_pool, _be, _key):
         from scripts.llm import chat
-        mock_resp = MagicMock()
-        mock_resp.read.return_value = json.dumps(
-            {"choices": [{"message": {"content": "回复"}}]}
-        ).encode()
-        mock_resp.__enter__ = lambda s: s
-        mock_resp.__exit__ = MagicMock(return_value=False)
-        mock_urlopen.return_value = mock_resp
+        from scripts.http_pool import PooledResponse
+        mock_get_pool.return_value.request.return_value = PooledResponse(
+            status=200, url="", data=json.dumps(
+                {"choices": [{"message": {"content": "回复"}}]}
+            ).encode(),
+        )
         self.assertEqual(chat("hi"), "回复")
 
+    @patch("scripts.llm._backend", return_value="moonshot")
+    @patch("scripts.llm._moonshot_chat", return_value="缓存回复")
+    def test_chat_response_cache(self, mock_chat, _be):
+        from scripts import llm
+        from scripts.disk_cache import DiskCache
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with patch("scripts.llm._response_cache", return_value=DiskCache("llm", root=tmpdir)):
+                llm.reset_metrics()
+                self.assertEqual(llm.chat("同一个问题"), "缓存回复")
+                self.assertEqual(llm.chat("同一个问题"), "缓存回复")
+                llm.chat("同一个问题", cache=False)
+                m = llm.get_metrics()
+        self.assertEqual(mock_chat.call_count, 2)
+        self.assertEqual(m["llm_cache_hits"], 1)
+        self.assertEqual(m["llm_cache_misses"], 1)
+
+    def test_chat_many_keeps_order_and_isolates_errors(self):
+        import time as _time
+        from scripts import llm
+
+        def fake_chat(prompt, **kw):
+            if prompt == "boom":
+                raise RuntimeError("upstream 500")
+            _time.sleep(0.05 if prompt == "slow" else 0)
+            return prompt.upper()
+
+        with patch("scripts.llm.chat", side_effect=fake_chat):
+            res = llm.chat_many(["slow", "boom", "fast"], max_concurrency=3)
+        self.assertEqual([r.ok for r in res], [True, False, True])
+        self.assertEqual(res[0].text, "SLOW")
+        self.assertEqual(res[2].text, "FAST")
+        self.assertIn("upstream 500", res[1].error)
+
+    def test_chat_many_shared_timeout(self):
+        import time as _time
+        from scripts import llm
+
+        def fake_chat(prompt, **kw):
+            _time.sleep(0.5 if prompt == "hang" else 0)
+            return "ok"
+
+        with patch("scripts.llm.chat", side_effect=fake_chat):
+            res = llm.chat_many(["a", "hang"], max_concurrency=2, timeout=0.1)
+        self.assertTrue(res[0].ok)
+        self.assertFalse(res[1].ok)
+        self.assertIn("timeout", res[1].error)
+
+    def test_context_window_routing_and_trim(self):
+        from scripts.llm import estimate_tokens, pick_model, trim_prompt
+        self.assertEqual(estimate_tokens("你好世界"), 4)
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+        self.assertEqual(pick_model("短提示", 1000, "moonshot-v1-32k"), "moonshot-v1-8k")
+        self.assertEqual(pick_model("字" * 20000, 3000, "moonshot-v1-8k"), "moonshot-v1-32k")
+        self.assertEqual(pick_model("x", 10, "kimi-latest"), "kimi-latest")
+
+        prompt = "## 任务\n写一篇文章\n\n## 风格参考\n" + "参考" * 500 + "\n## 写作要求\n结尾提问"
+        out = trim_prompt(prompt, 200)
+        self.assertLessEqual(estimate_tokens(out), 200)
+        self.assertIn("## 任务", out)
+        self.assertIn("## 写作要求\n结尾提问", out)
+
+    @patch("scripts.llm._backend", return_value="moonshot")
+    @patch("scripts.llm._moonshot_chat", return_value="ok")
+    def test_metrics_context_isolated_and_nested(self, _chat, _be):
+        from scripts import llm
+        with llm.metrics_context() as outer:
+            llm.chat("外层", cache=False)
+            with llm.metrics_context() as inner:
+                res = llm.chat_many(["a", "b", "c"], max_concurrency=3, cache=False)
+        self.assertTrue(all(r.ok for r in res))
+        self.assertEqual(inner.summary()["llm_text_calls"], 3)
+        s = outer.summary(include_calls=True)
+        self.assertEqual(s["llm_text_calls"], 4)
+        self.assertEqual(len(s["llm_calls"]), 4)
+        hist = s["llm_latency"]["moonshot/moonshot-v1-8k"]
+        self.assertEqual(hist["count"], 4)
+        self.assertLessEqual(hist["p50"], hist["p99"])
+
+    @patch("scripts.resilience.time.sleep")
+    @patch("scripts.llm._backend", return_value="moonshot")
+    def test_chat_retries_transient_errors(self, _be, _sleep):
+        from scripts import llm
+        from scripts.http_pool import HTTPStatusError
+        with patch("scripts.llm._moonshot_chat", side_effect=[HTTPStatusError(502, "u"), "恢复"]):
+            with llm.metrics_context() as m:
+                self.assertEqual(llm.chat("重试一下", cache=False), "恢复")
+        self.assertEqual(m.summary()["llm_retries"], 1)
+
+    @patch("scripts.llm._backend_available", return_value=True)
+    @patch("scripts.llm._backend", return_value="openclaw")
+    def test_adaptive_routing_spills_over_and_learns(self, _be, _avail):
+        import time as _time
+        from scripts import llm
+        opts = {"mode": "adaptive", "spillover_after": 0.05, "min_samples": 2}
+
+        def wedged(prompt, **kw):
+            _time.sleep(0.3)
+            return "openclaw 慢回复"
+
+        with patch("scripts.llm._routing_opts", return_value=opts), \
+                patch("scripts.llm._HEALTH", llm.BackendHealth()), \
+                patch("scripts.llm._openclaw_chat", side_effect=wedged), \
+                patch("scripts.llm._moonshot_chat", return_value="moonshot 回复"):
+            self.assertEqual(llm._route("openclaw"), ["openclaw", "moonshot"])
+            self.assertEqual(llm.chat("问题一", cache=False), "moonshot 回复")
+            self.assertEqual(llm.chat("问题二", cache=False), "moonshot 回复")
+            _time.sleep(0.35)  # let the abandoned openclaw calls report their latency
+            self.assertEqual(llm._route("openclaw")[0], "moonshot")
+
+    @patch("scripts.llm._hedge_after", return_value=0.01)
+    @patch("scripts.llm._backend_available", return_value=True)
+    @patch("scripts.llm._backend", return_value="openclaw")
+    def test_many_concurrent_adaptive_hedged_chats(self, _be, _avail, _hedge):
+        # Spillover wraps per-backend hedging; both must run concurrently without starving.
+        import threading
+        import time as _time
+        from scripts import llm
+        opts = {"mode": "adaptive", "spillover_after": 0.02, "min_samples": 100}
+
+        def slow(prompt, **kw):
+            _time.sleep(0.1)
+            return "回复"
+
+        out = []
+        with patch("scripts.llm._routing_opts", return_value=opts), \
+                patch("scripts.llm._HEALTH", llm.BackendHealth()), \
+                patch("scripts.llm._openclaw_chat", side_effect=slow), \
+                patch("scripts.llm._moonshot_chat", side_effect=slow):
+            threads = [threading.Thread(target=lambda i=i: out.append(llm.chat(f"问题{i}", cache=False)), daemon=True)
+                       for i in range(24)]
+            t0 = _time.monotonic()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(timeout=max(0.0, t0 + 5 - _time.monotonic()))
+        self.assertEqual(out, ["回复"] * 24)
+        self.assertLess(_time.monotonic() - t0, 2)
+
+    @patch("scripts.llm._backend_available", return_value=True)
+    @patch("scripts.llm._backend", return_value="openclaw")
+    def test_spillover_does_not_call_secondary_twice(self, _be, _avail):
+        import time as _time
+        from scripts import llm
+        opts = {"mode": "adaptive", "spillover_after": 0.02, "min_samples": 100}
+        calls = []
+
+        def slow_fail(prompt, **kw):
+            calls.append("openclaw")
+            _time.sleep(0.1)
+            raise RuntimeError("openclaw down")
+
+        def fail(prompt, **kw):
+            calls.append("moonshot")
+            raise RuntimeError("moonshot down")
+
+        with patch("scripts.llm._routing_opts", return_value=opts), \
+                patch("scripts.llm._resilience_opts", return_value={"retries": 0}), \
+                patch("scripts.llm._HEALTH", llm.BackendHealth()), \
+                patch("scripts.llm._openclaw_chat", side_effect=slow_fail), \
+                patch("scripts.llm._moonshot_chat", side_effect=fail):
+            with self.assertRaises(RuntimeError):
+                llm.chat("都挂了", cache=False)
+        self.assertEqual(sorted(calls), ["moonshot", "openclaw"])
+
+    @patch("scripts.llm._backend", return_value="moonshot")
+    def test_concurrent_identical_chats_coalesce(self, _be):
+        import threading
+        import time as _time
+        from scripts import llm
+        calls = []
+
+        def slow_chat(prompt, **kw):
+            calls.append(prompt)
+            _time.sleep(0.2)
+            return "同一回复"
+
+        out = []
+        with patch("scripts.llm._moonshot_chat", side_effect=slow_chat):
+            threads = [threading.Thread(target=lambda: out.append(llm.chat("双击", cache=False))) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(out, ["同一回复"] * 3)
+        self.assertEqual(len(calls), 1)
+
+    @patch("scripts.llm._load_moonshot_key", return_value="sk-test")
+    @patch("scripts.llm._backend", return_value="moonshot")
+    @patch("scripts.llm.get_pool")
+    def test_chat_stream_sse(self, mock_get_pool, _be, _key):
+        import io
+        from contextlib import contextmanager
+        from scripts import llm
+        lines = [
+            'data: {"choices": [{"delta": {"content": "你"}}]}',
+            '',
+            'data: {"choices": [{"delta": {"content": "好"}}]}',
+            '',
+            'data: [DONE]',
+            '',
+        ]
+        resp = io.BytesIO("\n".join(lines).encode("utf-8"))
+        resp.status = 200
+
+        @contextmanager
+        def fake_stream(*a, **kw):
+            yield resp
+
+        mock_get_pool.return_value.stream.side_effect = fake_stream
+        self.assertEqual(list(llm.chat_stream("hi", cache=False)), ["你", "好"])
+
+
+class TestJSONStream(unittest.TestCase):
+    def test_events_arrive_incrementally(self):
+        from scripts.json_stream import ArticleStreamParser
+        doc = json.dumps({
+            "title": "标题 \"引号\"",
+            "digest": "摘要",
+            "sections": [{"title": "一", "paragraphs": ["a{b}"]}, {"title": "二", "paragraphs": []}],
+        }, ensure_ascii=False)
+        text = "```json\n" + doc + "\n```"
+        p = ArticleStreamParser()
+        events = []
+        for i in range(0, len(text), 7):
+            events.extend(p.feed(text[i:i + 7]))
+        kinds = [k for k, _ in events]
+        self.assertEqual(kinds, ["title", "digest", "section", "section"])
+        self.assertEqual(events[0][1], '标题 "引号"')
+        self.assertEqual(events[2][1]["paragraphs"], ["a{b}"])
+        self.assertTrue(p.done)
+
+
+# ─── OpenClaw session ─────────────────────────────────────
+
+FAKE_OPENCLAW_WORKER = r"""
+import json, os, sys
+for line in sys.stdin:
+    req = json.loads(line)
+    if req.get("op") == "ping":
+        out = {"id": req["id"], "op": "pong"}
+    elif req.get("message") == "crash":
+        sys.exit(3)
+    else:
+        text = "%s:%s" % (os.getpid(), req["message"])
+        out = {"id": req["id"], "ok": True, "result": {"result": {"payloads": [{"text": text}]}}}
+    sys.stdout.write(json.dumps(out) + "\n")
+    sys.stdout.flush()
+"""
+
+
+class TestOpenClawSession(unittest.TestCase):
+    def setUp(self):
+        from scripts.openclaw_session import SessionPool
+        self.tmpdir = tempfile.TemporaryDirectory()
+        script = os.path.join(self.tmpdir.name, "fake_worker.py")
+        with open(script, "w") as f:
+            f.write(FAKE_OPENCLAW_WORKER)
+        self.pool = SessionPool([sys.executable, script], pool_size=1, ping_interval=0)
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmpdir.cleanup()
+
+    def _text(self, data):
+        return data["result"]["payloads"][0]["text"]
+
+    def test_worker_is_reused(self):
+        a = self._text(self.pool.ask("main", "one", timeout=10))
+        b = self._text(self.pool.ask("main", "two", timeout=10))
+        self.assertEqual(a.split(":")[0], b.split(":")[0])
+        self.assertEqual(self.pool.stats["spawned"], 1)
+
+    def test_respawn_after_crash(self):
+        from scripts.openclaw_session import SessionError
+        first = self._text(self.pool.ask("main", "one", timeout=10))
+        with self.assertRaises(SessionError):
+            self.pool.ask("main", "crash", timeout=10)
+        second = self._text(self.pool.ask("main", "two", timeout=10))
+        self.assertNotEqual(first.split(":")[0], second.split(":")[0])
+        self.assertEqual(self.pool.stats["spawned"], 2)
+
+    @patch("scripts.llm._openclaw_agent_id", return_value="main")
+    def test_cli_fallback_gets_remaining_timeout(self, _agent):
+        from scripts import llm
+        from scripts.openclaw_session import SessionError
+        cli = {"result": {"payloads": [{"text": "cli"}]}}
+        with patch("scripts.openclaw_session.get_session_pool", return_value=self.pool), \
+                patch.object(self.pool, "ask", side_effect=SessionError("worker exited")), \
+                patch("scripts.llm._openclaw_cli", return_value=cli) as run_cli:
+            with patch("scripts.llm.time.monotonic", side_effect=[100.0, 160.0]):
+                self.assertEqual(llm._openclaw_chat("hi", timeout_s=90), "cli")
+            self.assertEqual(run_cli.call_args[0][2], 30)
+            # Budget already spent by the worker: no second full-length CLI run.
+            with patch("scripts.llm.time.monotonic", side_effect=[100.0, 190.0]):
+                with self.assertRaises(TimeoutError):
+                    llm._openclaw_chat("hi", timeout_s=90)
+            self.assertEqual(run_cli.call_count, 1)
+
+    def test_pool_needs_resident_worker_cmd(self):
+        from scripts import openclaw_session
+        openclaw_session.reset_session_pool()
+        with patch("scripts.config.get", return_value={"enabled": True}):
+            self.assertIsNone(openclaw_session.get_session_pool())
+
+
+# ─── Resilience ───────────────────────────────────────────
+
+class TestResilience(unittest.TestCase):
+    @patch("scripts.resilience.time.sleep")
+    def test_retry_only_transient_errors(self, _sleep):
+        from scripts.http_pool import HTTPStatusError
+        from scripts.resilience import retry_call
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise HTTPStatusError(503, "u")
+            return "ok"
+
+        self.assertEqual(retry_call(flaky, attempts=3), "ok")
+        self.assertEqual(_sleep.call_count, 2)
+
+        def bad_request():
+            raise HTTPStatusError(400, "u")
+
+        with self.assertRaises(HTTPStatusError):
+            retry_call(bad_request, attempts=3)
+        self.assertEqual(_sleep.call_count, 2)
+
+    def test_circuit_breaker_fails_fast_then_probes(self):
+        from scripts.resilience import CircuitBreaker, CircuitOpenError
+        br = CircuitBreaker("t", failure_threshold=2, reset_timeout=0.05)
+        br.record_failure()
+        br.allow()
+        br.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            br.allow()
+        import time as _time
+        _time.sleep(0.06)
+        br.allow()  # half-open probe
+        with self.assertRaises(CircuitOpenError):
+            br.allow()  # only one probe at a time
+        br.record_success()
+        self.assertEqual(br.state, "closed")
+
+    def test_hedged_call_returns_faster_duplicate(self):
+        import time as _time
+        from scripts.resilience import hedged_call
+        value, hedged = hedged_call(lambda: (_time.sleep(0.5), "slow")[1], 0.05, secondary=lambda: "fast")
+        self.assertEqual((value, hedged), ("fast", True))
+        self.assertEqual(hedged_call(lambda: "quick", 1.0), ("quick", False))
+
+
+# ─── Rate limit ───────────────────────────────────────────
+
+class TestRateLimit(unittest.TestCase):
+    def test_shared_budget_across_instances(self):
+        from scripts.rate_limit import RateLimiter, RateLimitExceeded
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "rl.sqlite3")
+            limits = {"moonshot": {"rps": 2, "tpm": 600}}
+            a = RateLimiter(limits, path=path)
+            b = RateLimiter(limits, path=path)  # e.g. another process
+            a.acquire("moonshot", "sk-1", tokens=100)
+            b.acquire("moonshot", "sk-1", tokens=100)
+            with self.assertRaises(RateLimitExceeded) as cm:
+                a.acquire("moonshot", "sk-1", tokens=100, block=False)
+            self.assertGreater(cm.exception.retry_after, 0)
+            # Separate credential -> separate bucket; unknown provider -> unlimited
+            b.acquire("moonshot", "sk-2", tokens=100, block=False)
+            self.assertEqual(b.acquire("other", block=False), 0.0)
+
+    def test_token_budget_fast_fail(self):
+        from scripts.rate_limit import RateLimiter, RateLimitExceeded
+        with tempfile.TemporaryDirectory() as tmpdir:
+            rl = RateLimiter({"moonshot": {"tpm": 60}}, path=os.path.join(tmpdir, "rl.sqlite3"), max_wait=0.5)
+            rl.acquire("moonshot", "k", tokens=60)
+            # Needs ~30s of refill, more than max_wait: fail fast instead of sleeping.
+            with self.assertRaises(RateLimitExceeded):
+                rl.acquire("moonshot", "k", tokens=30)
+
+
+# ─── HTTP Pool ────────────────────────────────────────────
+
+class TestHTTPPool(unittest.TestCase):
+    def setUp(self):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(n)
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                # /img: first plain GET drops the connection halfway; Range requests resume
+                data = bytes(range(256)) * 400
+                rng = self.headers.get("Range")
+                ranges.append(rng)
+                if rng:
+                    start = int(rng.split("=")[1].rstrip("-"))
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+                    body = data[start:]
+                else:
+                    self.send_response(200)
+                    body = data[:len(data) // 2]
+                    self.close_connection = True
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Length", str(len(data) - (start if rng else 0)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *a):
+                pass
+
+        ranges = self.ranges = []
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/echo"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive_reuse(self):
+        from scripts.http_pool import HTTPPool
+        pool = HTTPPool(pool_size=4, max_per_host=2)
+        for i in range(3):
+            r = pool.request("POST", self.url, body=f"x{i}".encode(), timeout=5)
+            self.assertEqual(r.data, f"x{i}".encode())
+        self.assertEqual(pool.stats["connections_opened"], 1)
+        self.assertEqual(pool.stats["connections_reused"], 2)
+        pool.close()
+
+    def test_download_resumes_with_range_and_validates(self):
+        import hashlib
+        from scripts.http_pool import DownloadError, HTTPPool
+        pool = HTTPPool()
+        img_url = self.url.replace("/echo", "/img")
+        data = bytes(range(256)) * 400
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dest = os.path.join(tmpdir, "cover.jpg")
+            r = pool.download(img_url, dest, timeout=5, retries=3, sha256=hashlib.sha256(data).hexdigest())
+            with open(dest, "rb") as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(r["resumes"], 1)
+            self.assertEqual(self.ranges, [None, f"bytes={len(data) // 2}-"])
+            self.assertFalse(os.path.exists(dest + ".part"))
+
+            with self.assertRaises(DownloadError):
+                pool.download(img_url, os.path.join(tmpdir, "bad.jpg"), timeout=5, sha256="0" * 64)
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, "bad.jpg")))
+        pool.close()
+
+    def test_download_ignores_stale_part_from_another_url(self):
+        from scripts.http_pool import DownloadError, HTTPPool
+        pool = HTTPPool()
+        data = bytes(range(256)) * 400
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dest = os.path.join(tmpdir, "cover.jpg")
+            with open(dest + ".part", "wb") as f:
+                f.write(b"old-object-bytes" * 100)  # left by a failed download of another URL
+            pool.download(self.url.replace("/echo", "/img"), dest, timeout=5, retries=3)
+            with open(dest, "rb") as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(self.ranges[0], None)  # started from 0, not resumed
+
+            with self.assertRaises(DownloadError):
+                pool.download("http://127.0.0.1:1/x.jpg", os.path.join(tmpdir, "gone.jpg"), timeout=1, retries=1)
+            self.assertEqual(os.listdir(tmpdir), ["cover.jpg"])
+        pool.close()
+
+
+# ─── Hunyuan jobs ─────────────────────────────────────────
+
+class TestHunyuanJobs(unittest.TestCase):
+    def test_batch_polled_in_one_loop_results_as_completed(self):
+        import time
+        from scripts import hunyuan_image as hy
+        durations = {"slow": 0.3, "fast": 0.05}
+        submitted = {}
+
+        def fake_submit(prompt, resolution="1024:1024"):
+            if prompt == "bad":
+                raise hy.HunyuanError("TextLengthExceed", code="InvalidParameter")
+            submitted[prompt] = time.monotonic()
+            return prompt
+
+        def fake_query(job_id):
+            if time.monotonic() - submitted[job_id] >= durations[job_id]:
+                return f"https://img/{job_id}.jpg"
+            return None
+
+        mgr = hy.JobManager(min_interval=0.02, max_interval=0.1, max_wait=5)
+        with patch("scripts.hunyuan_image.submit_job", side_effect=fake_submit), \
+             patch("scripts.hunyuan_image.query_job", side_effect=fake_query):
+            jobs = mgr.submit_many([("slow", "1024:768"), ("fast", "1024:1024"), ("bad", "1024:1024")])
+            order = [(j.prompt, j.url or j.error.code) for j in mgr.as_completed(jobs, timeout=5)]
+        self.assertEqual(order, [("bad", "InvalidParameter"), ("fast", "https://img/fast.jpg"),
+                                 ("slow", "https://img/slow.jpg")])
+        self.assertEqual(mgr.stats["completed"], 2)
+        # backoff keeps query count well below fixed-interval polling at min_interval
+        self.assertLess(mgr.stats["queries"], 0.3 / 0.02)
+
+    def test_generate_images_caps_outstanding_jobs(self):
+        import threading
+        import time
+        from scripts import hunyuan_image as hy
+        from scripts import image_gen
+        from scripts.disk_cache import DiskCache
+        submitted = {}
+        active = {"now": 0, "max": 0}
+        lock = threading.Lock()
+
+        def fake_submit(prompt, resolution="1024:1024"):
+            with lock:
+                active["now"] += 1
+                active["max"] = max(active["max"], active["now"])
+            submitted[prompt] = time.monotonic()
+            return prompt
+
+        def fake_query(job_id):
+            if time.monotonic() - submitted[job_id] < 0.05:
+                return None
+            with lock:
+                active["now"] -= 1
+            return f"https://img/{job_id}"
+
+        def fake_download(url, path, retries=3):
+            with open(path, "wb") as f:
+                f.write(url.encode())
+
+        mgr = hy.JobManager(min_interval=0.01, max_interval=0.02, max_wait=5)
+        with tempfile.TemporaryDirectory() as tmpdir, \
+             patch.dict(os.environ, {"HUNYUAN_SECRET_ID": "id", "HUNYUAN_SECRET_KEY": "key"}), \
+             patch("scripts.image_gen._IMAGE_CACHE", DiskCache("images", root=os.path.join(tmpdir, "c"))), \
+             patch("scripts.image_gen.get_job_manager", return_value=mgr), \
+             patch("scripts.image_gen.download", side_effect=fake_download), \
+             patch("scripts.hunyuan_image.submit_job", side_effect=fake_submit), \
+             patch("scripts.hunyuan_image.query_job", side_effect=fake_query):
+            specs = [{"prompt": f"p{n}", "output_path": os.path.join(tmpdir, f"{n}.jpg"), "style_prefix": ""}
+                     for n in range(5)]
+            out = image_gen.generate_images(specs, max_concurrency=2)
+        self.assertEqual(len(submitted), 5)
+        self.assertEqual(active["max"], 2)
+        self.assertEqual([o["url"] for o in out], [f"https://img/p{n}" for n in range(5)])
+
+    def test_next_delay_follows_observed_quantiles(self):
+        from scripts.hunyuan_image import Job, JobManager
+        mgr = JobManager(min_interval=2, max_interval=10, factor=1.5)
+        job = Job("p", "1024:1024")
+        self.assertEqual(mgr._next_delay(job, job.submitted_at), 2)  # no history: quick first check
+        mgr._observed.extend([20, 22, 25, 30])
+        self.assertEqual(mgr._next_delay(job, job.submitted_at), 10)  # capped at max_interval
+        self.assertAlmostEqual(mgr._next_delay(job, job.submitted_at + 18), 4)  # up to p25 (22s)
+
+    def test_generate_images_submits_duplicate_prompt_once(self):
+        from scripts import hunyuan_image as hy
+        from scripts import image_gen
+        from scripts.disk_cache import DiskCache
+        submitted = []
+
+        def fake_submit(prompt, resolution="1024:1024"):
+            submitted.append(prompt)
+            return prompt
+
+        def fake_download(url, path, retries=3):
+            with open(path, "wb") as f:
+                f.write(url.encode())
+
+        mgr = hy.JobManager(min_interval=0.02, max_interval=0.05, max_wait=5)
+        with tempfile.TemporaryDirectory() as tmpdir, \
+             patch.dict(os.environ, {"HUNYUAN_SECRET_ID": "id", "HUNYUAN_SECRET_KEY": "key"}), \
+             patch("scripts.image_gen._IMAGE_CACHE", DiskCache("images", root=os.path.join(tmpdir, "c"))), \
+             patch("scripts.image_gen.get_job_manager", return_value=mgr), \
+             patch("scripts.image_gen.download", side_effect=fake_download), \
+             patch("scripts.hunyuan_image.submit_job", side_effect=fake_submit), \
+             patch("scripts.hunyuan_image.query_job", side_effect=lambda job_id: f"https://img/{job_id}"):
+            specs = [{"prompt": p, "output_path": os.path.join(tmpdir, f"{n}.jpg"), "style_prefix": ""}
+                     for n, p in enumerate(["猫", "狗", "猫"])]
+            out = image_gen.generate_images(specs)
+            self.assertEqual(sorted(submitted), ["狗", "猫"])
+            self.assertTrue(out[2]["coalesced"])
+            with open(out[2]["path"], "rb") as f:
+                self.assertEqual(f.read(), "https://img/猫".encode())
+
+    def test_status_polls_skip_rate_limiter(self):
+        from scripts import hunyuan_image as hy
+        with patch("scripts.rate_limit.acquire") as acquire, \
+             patch("scripts.hunyuan_image.get_pool") as get_pool:
+            get_pool.return_value.request.return_value.status = 200
+            get_pool.return_value.request.return_value.json.return_value = {"Response": {"JobStatusCode": "2"}}
+            self.assertIsNone(hy.query_job("job-1"))
+            acquire.assert_not_called()
+            get_pool.return_value.request.return_value.json.return_value = {"Response": {"JobId": "job-2"}}
+            self.assertEqual(hy.submit_job("p"), "job-2")
+            acquire.assert_called_once()
+
+
+# ─── Disk cache ───────────────────────────────────────────
+
+class TestDiskCache(unittest.TestCase):
+    def test_overwrite_not_double_counted(self):
+        from scripts.disk_cache import DiskCache
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = DiskCache("t", max_bytes=1000, root=tmpdir)
+            cache.put("ab" * 32, b"x" * 100)
+            for _ in range(3):
+                cache.put("ab" * 32, b"y" * 300)
+            self.assertEqual(cache._approx_bytes, 300)
+            self.assertEqual(cache.get("ab" * 32), b"y" * 300)
+
+
+# ─── Image cache ──────────────────────────────────────────
+
+class TestImageCache(unittest.TestCase):
+    def test_image_cache_reused_across_articles(self):
+        from scripts import image_gen
+        from scripts.disk_cache import DiskCache
+        calls = []
+
+        def fake_generate(full_prompt, output_path, resolution):
+            calls.append(output_path)
+            with open(output_path, "wb") as f:
+                f.write(b"jpeg-" + full_prompt.encode())
+            return {"success": True, "url": "https://cos/x.jpg", "path": output_path, "prompt": full_prompt}
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+             patch.dict(os.environ, {"HUNYUAN_SECRET_ID": "id", "HUNYUAN_SECRET_KEY": "key"}), \
+             patch("scripts.image_gen._IMAGE_CACHE", DiskCache("images", root=tmpdir)), \
+             patch("scripts.image_gen._generate_hunyuan", side_effect=fake_generate):
+            a = image_gen.generate_image("猫", os.path.join(tmpdir, "a", "cover.jpg"), "1024:768", style_prefix="")
+            b = image_gen.generate_image("猫", os.path.join(tmpdir, "b", "cover.jpg"), "1024:768", style_prefix="")
+            self.assertEqual(len(calls), 1)
+            self.assertTrue(b.get("cached"))
+            with open(b["path"], "rb") as f:
+                self.assertEqual(f.read(), "jpeg-猫".encode())
+            image_gen.generate_image("猫", os.path.join(tmpdir, "b", "cover.jpg"), "1024:1024", style_prefix="")
+            image_gen.generate_image("猫", b["path"], "1024:768", style_prefix="", fresh=True)
+            self.assertEqual(len(calls), 3)  # other resolution + explicit fresh variation
+            with open(a["path"], "rb") as f:
+                self.assertEqual(f.read(), "jpeg-猫".encode())  # fresh write did not clobber the shared file
+
+
+# ─── Pipeline ─────────────────────────────────────────────
+
+class TestPipeline(unittest.TestCase):
+    def test_images_batched_with_journal_and_prefetch(self):
+        from concurrent.futures import Future
+        from scripts import pipeline
+        from scripts.run_journal import RunJournal
+        batches, caps = [], []
+
+        def fake_batch(specs, on_result=None, fresh=False, max_concurrency=None):
+            batches.append([s["stage"] for s in specs])
+            caps.append(max_concurrency)
+            out = []
+            for j, spec in enumerate(specs):
+                with open(spec["output_path"], "wb") as f:
+                    f.write(spec["prompt"].encode())
+                img = {"success": True, "url": "", "path": spec["output_path"], "prompt": spec["prompt"]}
+                if spec["prompt"] == "bad":
+                    img["fallback"] = "placeholder_hunyuan_error"
+                on_result(j, img)
+                out.append(img)
+            return out
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            def spec(stage, kind, prompt):
+                return {"stage": stage, "kind": kind, "prompt": prompt, "style_prefix": "", "resolution": "1024:1024",
+                        "output_path": os.path.join(tmpdir, f"{stage}.jpg")}
+
+            specs = [spec("cover", "cover", "c"), spec("inline_1", "inline", "a"),
+                     spec("inline_2", "inline", "bad"), spec("inline_3", "inline", "pre")]
+            staged = os.path.join(tmpdir, "staged.jpg")
+            with open(staged, "wb") as f:
+                f.write(b"pre")
+            fut = Future()
+            fut.set_result({"success": True, "url": "", "path": staged, "prompt": "pre"})
+
+            with patch("scripts.pipeline.generate_images", side_effect=fake_batch):
+                out = pipeline._generate_images_concurrently(specs, RunJournal(tmpdir), {("inline", "pre"): fut},
+                                                             max_workers=2)
+                self.assertEqual(batches, [["cover", "inline_1", "inline_2"]])  # one batch, prefetch excluded
+                self.assertEqual(caps, [2])
+                self.assertEqual([o["path"] for o in out], [s["output_path"] for s in specs])
+                self.assertTrue(out[3]["prefetched"])
+
+                journal = RunJournal(tmpdir)
+                pipeline._generate_images_concurrently(specs, journal)
+            self.assertEqual(batches[1], ["inline_2"])  # only the placeholder is retried
+            self.assertTrue(journal.timings()["cover"]["skipped"])
+
+    def test_upload_images_keeps_order_and_per_image_errors(self):
+        import time
+        from scripts.wechat_uploader import upload_images
+
+        def fake_upload(path, wechat_appid=None, wechat_secret=None):
+            time.sleep(0.05 if path == "a.jpg" else 0)
+            if path == "b.jpg":
+                raise RuntimeError("md2wechat failed")
+            return {"media_id": f"m-{path}", "wechat_url": f"https://mmbiz/{path}"}
+
+        with patch("scripts.wechat_uploader.upload_image", side_effect=fake_upload):
+            out = upload_images(["a.jpg", "b.jpg", "c.jpg"], max_workers=3)
+        self.assertEqual([o["path"] for o in out], ["a.jpg", "b.jpg", "c.jpg"])
+        self.assertEqual(out[0]["media_id"], "m-a.jpg")
+        self.assertEqual(out[1]["error"], "md2wechat failed")
+        self.assertEqual(out[2]["wechat_url"], "https://mmbiz/c.jpg")
+
+    def test_rerun_resumes_from_journal(self):
+        from scripts import pipeline
+
+        def fake_images(specs, on_result=None, fresh=False, max_concurrency=None):
+            for j, spec in enumerate(specs):
+                with open(spec["output_path"], "wb") as f:
+                    f.write(spec["prompt"].encode())
+                on_result(j, {"success": True, "url": "", "path": spec["output_path"], "prompt": spec["prompt"]})
+
+        def fake_upload(paths, **kwargs):
+            return [{"path": p, "media_id": f"m{n}", "wechat_url": f"https://mmbiz/{n}"} for n, p in enumerate(paths)]
+
+        draft_results = [RuntimeError("wechat 45009"), {"success": True, "media_id": "d1"}]
+
+        def fake_draft(*args, **kwargs):
+            r = draft_results.pop(0)
+            if isinstance(r, Exception):
+                raise r
+            return r
+
+        sections = [{"title": "一", "paragraphs": ["p"]}]
+        with tempfile.TemporaryDirectory() as tmpdir, \
+             patch("scripts.pipeline.generate_images", side_effect=fake_images) as gen, \
+             patch("scripts.pipeline.upload_images", side_effect=fake_upload) as up, \
+             patch("scripts.pipeline.create_draft", side_effect=fake_draft) as cd:
+            kwargs = dict(inline_prompts=[{"after_section": 0, "prompt": "inline"}], output_dir_override=tmpdir)
+            with self.assertRaises(RuntimeError):
+                pipeline.execute_pipeline("T", "D", "S", sections, "cover", **kwargs)
+            res = pipeline.execute_pipeline("T", "D", "S", sections, "cover", **kwargs)
+
+            self.assertEqual((gen.call_count, up.call_count, cd.call_count), (1, 1, 2))
+            self.assertTrue(res["draft"]["success"])
+            self.assertTrue(res["stage_timings"]["cover"]["skipped"])
+            self.assertTrue(res["stage_timings"]["upload"]["skipped"])
+            self.assertFalse(res["stage_timings"]["draft"]["skipped"])
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, "run_journal.json")))
+
+
+# ─── Image optimization ───────────────────────────────────
+
+try:
+    import PIL  # noqa: F401
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+
+class TestImageOpt(unittest.TestCase):
+    def test_cached_by_source_hash_and_errors_fall_back(self):
+        from scripts import image_opt
+        from scripts.disk_cache import DiskCache
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "cover.jpg")
+            with open(src, "wb") as f:
+                f.write(b"x" * 5000)
+            broken = os.path.join(tmpdir, "inline_1.jpg")
+            with open(broken, "wb") as f:
+                f.write(b"broken")
+
+            def fake_encode(path, *settings):
+                if path == broken:
+                    raise OSError("cannot identify image file")
+                return b"small", 800, 600, 85
+
+            with patch("scripts.image_opt._CACHE", DiskCache("images_opt", root=tmpdir)), \
+                 patch("scripts.image_opt._encode", side_effect=fake_encode) as enc:
+                first = image_opt.optimize_images([src, broken], max_workers=1)
+                again = image_opt.optimize_images([src], max_workers=1)
+            self.assertEqual(first[0]["path"], os.path.join(tmpdir, "cover.web.jpg"))
+            self.assertEqual(first[1]["path"], broken)  # upload the original
+            self.assertIn("cannot identify", first[1]["error"])
+            self.assertTrue(again[0]["cached"])
+            self.assertEqual(enc.call_count, 2)
+
+    def test_kept_original_is_cached(self):
+        from scripts import image_opt
+        from scripts.disk_cache import DiskCache
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "cover.jpg")
+            with open(src, "wb") as f:
+                f.write(b"x" * 100)
+
+            with patch("scripts.image_opt._CACHE", DiskCache("images_opt", root=tmpdir)), \
+                 patch("scripts.image_opt._encode", return_value=(b"y" * 200, 80, 60, 85)) as enc:
+                first = image_opt.optimize_images([src], max_workers=1)
+                again = image_opt.optimize_images([src], max_workers=1)
+            self.assertTrue(first[0]["kept_original"])
+            self.assertEqual(again[0]["path"], src)
+            self.assertTrue(again[0]["kept_original"] and again[0]["cached"])
+            self.assertEqual(enc.call_count, 1)
+
+    def test_process_pool_is_shared_and_spawned(self):
+        from scripts import image_opt
+        with patch("scripts.image_opt._POOL", None), \
+             patch("scripts.image_opt.ProcessPoolExecutor") as ppe:
+            first = image_opt._pool(2)
+            second = image_opt._pool(2)
+        self.assertIs(first, second)
+        self.assertEqual(ppe.call_count, 1)
+        self.assertEqual(ppe.call_args.kwargs["mp_context"].get_start_method(), "spawn")
+
+    @unittest.skipUnless(HAS_PIL, "Pillow not installed")
+    def test_resized_progressive_under_budget(self):
+        from PIL import Image
+        from scripts import image_opt
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "cover.png")
+            Image.effect_noise((1600, 1200), 80).convert("RGB").save(src)
+            data, w, h, q = image_opt._encode(src, 800, 250 * 1024, 85, 20)
+            self.assertEqual((w, h), (800, 600))
+            self.assertLessEqual(len(data), 250 * 1024)
+            import io
+            with Image.open(io.BytesIO(data)) as im:
+                self.assertTrue(im.info.get("progressive") or im.info.get("progression"))
+                self.assertNotIn("exif", im.info)
+
+
+# ─── WeChat API ───────────────────────────────────────────
+
+class TestWeChatAPI(unittest.TestCase):
+    def setUp(self):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlsplit
+
+        calls = self.calls = []
+        state = self.state = {"n": 0, "expire_next": False, "drop_keepalive": False}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, obj):
+                body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                u = urlsplit(self.path)
+                calls.append((u.path, None, None))
+                state["n"] += 1
+                self._reply({"access_token": f"tok{state['n']}", "expires_in": 7200})
+                # close without "Connection: close": the client keeps a stale socket
+                self.close_connection = state["drop_keepalive"]
+
+            def do_POST(self):
+                u = urlsplit(self.path)
+                token = parse_qs(u.query)["access_token"][0]
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                calls.append((u.path, token, body))
+                if state["expire_next"]:
+                    state["expire_next"] = False
+                    return self._reply({"errcode": 42001, "errmsg": "access_token expired"})
+                if u.path == "/cgi-bin/material/add_material":
+                    return self._reply({"media_id": f"m{len(body)}", "url": "http://mmbiz/x.jpg"})
+                if u.path == "/cgi-bin/draft/add":
+                    return self._reply({"media_id": "draft1"})
+                self._reply({"errcode": 40007, "errmsg": "invalid media_id"})
+
+            def log_message(self, *a):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def _client(self):
+        from scripts.wechat_api import WeChatClient
+        return WeChatClient("wx123", "secret", base_url=self.base_url, token_dir=self.tmp.name)
+
+    def test_token_shared_upload_and_draft(self):
+        from scripts import wechat_api
+        img = os.path.join(self.tmp.name, "cover.jpg")
+        with open(img, "wb") as f:
+            f.write(b"\xff\xd8" + b"x" * 200000)
+        with patch.dict(wechat_api._TOKENS, clear=True):
+            up = self._client().add_material(img)
+            wechat_api._TOKENS.clear()  # another process: token comes from the shared file
+            media_id = self._client().add_draft([{"title": "标题", "content": "<p>正文</p>"}])
+        self.assertEqual(media_id, "draft1")
+        self.assertEqual(up["url"], "http://mmbiz/x.jpg")
+        paths = [c[0] for c in self.calls]
+        self.assertEqual(paths.count("/cgi-bin/token"), 1)
+        body = self.calls[1][2]
+        self.assertIn(b'name="media"; filename="cover.jpg"', body)
+        self.assertIn(b"\xff\xd8" + b"x" * 200000, body)
+        self.assertIn("标题".encode("utf-8"), self.calls[2][2])
+
+    def test_upload_survives_stale_keepalive_socket(self):
+        from scripts import wechat_api
+        from scripts.http_pool import HTTPPool
+        img = os.path.join(self.tmp.name, "cover.jpg")
+        with open(img, "wb") as f:
+            f.write(b"\xff\xd8" + b"x" * 1000)
+        self.state["drop_keepalive"] = True
+        pool = HTTPPool()
+        with patch.dict(wechat_api._TOKENS, clear=True), \
+             patch("scripts.wechat_api.get_pool", return_value=pool):
+            up = self._client().add_material(img)
+        pool.close()
+        self.assertTrue(up["media_id"])
+        self.assertEqual([c[0] for c in self.calls], ["/cgi-bin/token", "/cgi-bin/material/add_material"])
+
+    def test_token_refresh_does_not_block_other_appids(self):
+        import threading
+        from scripts import wechat_api
+        slow_started, release = threading.Event(), threading.Event()
+        real_fetch = wechat_api.WeChatClient._fetch_token
+
+        def fetch(client):
+            if client.appid == "wx_slow":
+                slow_started.set()
+                release.wait(5)
+            return real_fetch(client)
+
+        from scripts.wechat_api import WeChatClient
+        with patch.dict(wechat_api._TOKENS, clear=True), \
+             patch.object(WeChatClient, "_fetch_token", fetch):
+            slow = WeChatClient("wx_slow", "s", base_url=self.base_url, token_dir=self.tmp.name)
+            t = threading.Thread(target=slow.access_token)
+            t.start()
+            self.assertTrue(slow_started.wait(5))
+            self.assertTrue(self._client().access_token())
+            self.assertTrue(t.is_alive())  # wx_slow is still fetching: we did not wait behind it
+            release.set()
+            t.join(5)
+
+    def test_rejected_token_refreshed_once_and_errors_raise(self):
+        from scripts import wechat_api
+        with patch.dict(wechat_api._TOKENS, clear=True):
+            client = self._client()
+            client.access_token()
+            self.state["expire_next"] = True
+            self.assertEqual(client.add_draft([{"title": "t"}]), "draft1")
+            self.assertEqual([c[1] for c in self.calls if c[1]], ["tok1", "tok2"])
+            with self.assertRaises(wechat_api.WeChatAPIError) as cm:
+                client.post_json("/cgi-bin/freepublish/batchget", {})
+            self.assertEqual(cm.exception.errcode, 40007)
+
+    def test_create_drafts_batches_articles_per_draft(self):
+        from scripts import wechat_api
+        from scripts.wechat_uploader import MAX_DRAFT_ARTICLES, create_drafts, draft_article
+        articles = [draft_article(f"t{i}", "<p>x</p>", "m", "") for i in range(MAX_DRAFT_ARTICLES + 2)]
+        with patch.dict(wechat_api._TOKENS, clear=True), \
+             patch("scripts.wechat_uploader._native_client", return_value=self._client()):
+            out = create_drafts(articles)
+        drafts = [json.loads(c[2]) for c in self.calls if c[0] == "/cgi-bin/draft/add"]
+        self.assertEqual([len(d["articles"]) for d in drafts], [MAX_DRAFT_ARTICLES, 2])
+        self.assertEqual(len(out), len(articles))
+        self.assertEqual([o["index"] for o in out[-3:]], [MAX_DRAFT_ARTICLES - 1, 0, 1])
+        self.assertTrue(all(o["success"] for o in out))
+
+    def test_media_cache_skips_reupload_of_identical_bytes(self):
+        from scripts import media_cache, wechat_api
+        from scripts.disk_cache import DiskCache
+        from scripts.wechat_uploader import upload_image
+        a = os.path.join(self.tmp.name, "cover.jpg")
+        b = os.path.join(self.tmp.name, "copy.jpg")
+        for p in (a, b):
+            with open(p, "wb") as f:
+                f.write(b"same-bytes")
+        with patch.dict(wechat_api._TOKENS, clear=True), \
+             patch("scripts.media_cache._CACHE", DiskCache("wechat_media", root=self.tmp.name)), \
+             patch("scripts.wechat_uploader._native_client", return_value=self._client()):
+            first = upload_image(a, wechat_appid="wx123", wechat_secret="secret")
+            again = upload_image(b, wechat_appid="wx123", wechat_secret="secret")
+            other_app = media_cache.lookup("wx999", "whatever")
+            media_cache.forget_media("wx123", first["media_id"])
+            third = upload_image(a, wechat_appid="wx123", wechat_secret="secret")
+        self.assertNotIn("cached", first)
+        self.assertTrue(again["cached"])
+        self.assertEqual(again["media_id"], first["media_id"])
+        self.assertIsNone(other_app)
+        self.assertNotIn("cached", third)
+        uploads = [c for c in self.calls if c[0] == "/cgi-bin/material/add_material"]
+        self.assertEqual(len(uploads), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -11,11 +11,12 @@ from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from scripts.config import load_config, save_config, CONFIG_FILE
 from scripts.html_renderer import THEMES
 from scripts.wechat_uploader import create_draft
 from tools.store.json_store import load_json, save_json
+from scripts import config_assets
 
 # GZH 4-stage pipeline stores
 from scripts.gzh_store import ensure_dirs, iter_jsonl, add_inspiration, add_published
@@ -46,9 +47,10 @@ def _cache_control(resp):
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-ACCOUNTS_FILE = os.path.join(PROJECT_ROOT, "config", "accounts.json")
-STYLES_FILE = os.path.join(PROJECT_ROOT, "config", "writing_styles.json")
-TOPIC_BANKS_DIR = os.path.join(PROJECT_ROOT, "config", "topic_banks")
+# Reads go through scripts/config_assets (cached, indexed); saves must invalidate it.
+ACCOUNTS_FILE = config_assets.ACCOUNTS_FILE
+STYLES_FILE = config_assets.STYLES_FILE
+TOPIC_BANKS_DIR = config_assets.TOPIC_BANKS_DIR
 
 # Data assets root
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
@@ -73,7 +75,7 @@ def get_config():
 @app.route("/api/config", methods=["POST"])
 def update_config():
     data = request.json
-    cfg = load_config()
+    cfg = load_config(mutable=True)
     
     # 只更新非空、非脱敏的字段
     for key, val in data.items():
@@ -96,8 +98,8 @@ def export_all_config():
             "description": "ArtBot full config backup",
         },
         "config": load_config(),
-        "accounts": load_json(ACCOUNTS_FILE, {"accounts": []}),
-        "writing_styles": load_json(STYLES_FILE, {"styles": []}),
+        "accounts": config_assets.get_accounts_doc(),
+        "writing_styles": {"styles": config_assets.get_writing_styles()},
         "autotopic": load_json(AUTOTOPIC_FILE, {}),
     }
     return app.response_class(
@@ -138,9 +140,11 @@ def import_all_config():
             restored.append("config")
         if "accounts" in bundle:
             save_json(ACCOUNTS_FILE, bundle["accounts"])
+            config_assets.invalidate(ACCOUNTS_FILE)
             restored.append("accounts")
         if "writing_styles" in bundle:
             save_json(STYLES_FILE, bundle["writing_styles"])
+            config_assets.invalidate(STYLES_FILE)
             restored.append("writing_styles")
         if "autotopic" in bundle:
             save_json(AUTOTOPIC_FILE, bundle["autotopic"])
@@ -192,7 +196,7 @@ def get_themes():
 
 @app.route("/api/accounts", methods=["GET"])
 def list_accounts():
-    data = load_json(ACCOUNTS_FILE, {"accounts": []})
+    data = config_assets.get_accounts_doc(mutable=True)
     # Minimal masking for common secret fields
     for a in data.get("accounts", []):
         cred = a.get("credentials") or {}
@@ -211,8 +215,7 @@ def save_accounts():
         return jsonify({"success": False, "error": "accounts must be a list"}), 400
 
     # Merge rule: do not overwrite masked secrets (***).
-    current = load_json(ACCOUNTS_FILE, {"accounts": []})
-    current_map = {a.get("id"): a for a in current.get("accounts", []) if a.get("id")}
+    current_map = {a.get("id"): a for a in config_assets.get_accounts() if a.get("id")}
 
     merged = []
     for acc in payload["accounts"]:
@@ -222,7 +225,7 @@ def save_accounts():
         if not acc_id:
             continue
         prev = current_map.get(acc_id, {})
-        prev_cred = prev.get("credentials") or {}
+        prev_cred = dict(prev.get("credentials") or {})
         cred = acc.get("credentials") or {}
         for k, v in list(cred.items()):
             if isinstance(v, str) and "***" in v:
@@ -235,6 +238,7 @@ def save_accounts():
         merged.append(acc)
 
     save_json(ACCOUNTS_FILE, {"accounts": merged})
+    config_assets.invalidate(ACCOUNTS_FILE)
     return jsonify({"success": True})
 
 
@@ -249,8 +253,7 @@ def get_topic_bank():
     if not account_id:
         return jsonify({"success": False, "error": "account_id is required"}), 400
 
-    path = os.path.join(TOPIC_BANKS_DIR, f"{account_id}.json")
-    if not os.path.exists(path):
+    if not os.path.exists(config_assets.topic_bank_path(account_id)):
         return jsonify({
             "success": True,
             "data": {
@@ -261,7 +264,7 @@ def get_topic_bank():
             }
         })
 
-    return jsonify({"success": True, "data": load_json(path, {})})
+    return jsonify({"success": True, "data": config_assets.get_topic_bank(account_id)})
 
 
 @app.route("/api/topic_banks", methods=["POST"])
@@ -281,8 +284,9 @@ def save_topic_bank():
     data.setdefault("version", 1)
     data["updated_at"] = datetime.now().isoformat()
 
-    path = os.path.join(TOPIC_BANKS_DIR, f"{account_id}.json")
+    path = config_assets.topic_bank_path(account_id)
     save_json(path, data)
+    config_assets.invalidate(path)
     return jsonify({"success": True})
 
 
@@ -344,6 +348,14 @@ def get_status():
     return jsonify({"status": "idle"})
 
 
+@app.route("/api/llm/metrics", methods=["GET"])
+def get_llm_metrics():
+    """文本 LLM 调用统计（本进程）：调用数/缓存/错误 + 各 backend/model 的 p50/p95/p99 延迟"""
+    from scripts.llm import get_global_metrics
+    include_calls = request.args.get("calls") in ("1", "true")
+    return jsonify({"success": True, "metrics": get_global_metrics(include_calls=include_calls)})
+
+
 @app.route("/api/drafts", methods=["GET"])
 def list_drafts():
     """列出最近的草稿（扫描 output/ 下的子目录和 html 文件）
@@ -402,15 +414,19 @@ def list_drafts():
 
 @app.route("/api/push_latest_draft", methods=["POST"])
 def push_latest_draft():
-    """把 output/draft.json 推送到公众号草稿箱
+    """把最近一篇文章的 draft.json 推送到公众号草稿箱
 
-    说明：artbot 的 AI 写作/生图/排版完成后会落地 output/draft.json。
-    这个接口只负责把该文件推到公众号草稿箱（create_draft）。
+    说明：流水线上传图片、排版完成后会在 output/<dir>/draft.json 落地该篇的草稿请求
+    （旧版本写在共享的 output/draft.json，仍然兼容）。
+    这个接口只负责把最新的那个文件推到公众号草稿箱（create_draft）。
     """
+    import glob
+
     output_dir = os.path.join(PROJECT_ROOT, "output")
-    draft_path = os.path.join(output_dir, "draft.json")
-    if not os.path.exists(draft_path):
+    candidates = glob.glob(os.path.join(output_dir, "*", "draft.json")) + glob.glob(os.path.join(output_dir, "draft.json"))
+    if not candidates:
         return jsonify({"success": False, "error": "draft.json 不存在，请先生成文章"}), 400
+    draft_path = max(candidates, key=os.path.getmtime)
 
     with open(draft_path) as f:
         payload = json.load(f)
@@ -463,9 +479,12 @@ def delete_draft(name):
 def draft_push_mp(name):
     """Push a generated draft directory to WeChat MP draft box.
 
-    This re-uploads cover/inline images under output/<name>/ and creates a new MP draft.
+    Uploads cover/inline images under output/<name>/ and creates a new MP draft.
+    Images are optimized like in execute_pipeline, so bytes the pipeline (or an
+    earlier push) already uploaded are served from the media cache, not re-uploaded.
     """
-    from scripts.wechat_uploader import upload_image, create_draft
+    from scripts.image_opt import optimize_images
+    from scripts.wechat_uploader import upload_images, create_draft
     from scripts.html_renderer import render_article
 
     output_dir = os.path.join(PROJECT_ROOT, "output")
@@ -481,8 +500,7 @@ def draft_push_mp(name):
         meta = json.load(f)
 
     # load account credentials from accounts.json (only mp_chaguan currently)
-    accounts_data = load_json(ACCOUNTS_FILE, {"accounts": []})
-    acc = (accounts_data.get("accounts") or [{}])[0]
+    acc = (config_assets.get_accounts() or [{}])[0]
     cred = acc.get("credentials") or {}
     appid = cred.get("appid")
     secret = cred.get("secret")
@@ -494,19 +512,23 @@ def draft_push_mp(name):
     if not os.path.exists(cover_path):
         return jsonify({"success": False, "error": "cover.jpg not found"}), 400
 
-    try:
-        cover_up = upload_image(cover_path, wechat_appid=appid, wechat_secret=secret)
-    except Exception as e:
-        return jsonify({"success": False, "error": f"封面上传失败: {e}"}), 500
-
-    inline_uploads = []
+    inline_paths = []
     i = 1
     while os.path.exists(os.path.join(subdir, f"inline_{i}.jpg")):
-        p = os.path.join(subdir, f"inline_{i}.jpg")
-        up = upload_image(p, wechat_appid=appid, wechat_secret=secret)
-        inline_uploads.append(up)
+        inline_paths.append(os.path.join(subdir, f"inline_{i}.jpg"))
         i += 1
 
+    upload_paths = [o["path"] for o in optimize_images([cover_path] + inline_paths)]
+    uploads = upload_images(upload_paths, wechat_appid=appid, wechat_secret=secret)
+    cover_up = uploads[0]
+    if "error" in cover_up:
+        return jsonify({"success": False, "error": f"封面上传失败: {cover_up['error']}"}), 500
+
+    inline_uploads = [up for up in uploads[1:] if "error" not in up]
+    inline_upload_errors = [
+        {"index": n, "error": up["error"]} for n, up in enumerate(uploads[1:], 1) if "error" in up
+    ]
+
     # build html for MP with mmbiz urls
     sections = meta.get("sections") or []
     inserts = []
@@ -540,7 +562,17 @@ def draft_push_mp(name):
             wechat_appid=appid,
             wechat_secret=secret,
         )
-        return jsonify({"success": True, "draft": draft})
+        resp = {
+            "success": True,
+            "draft": draft,
+            "image_uploads": {
+                "uploaded": sum(1 for up in uploads if "error" not in up and not up.get("cached")),
+                "cached": sum(1 for up in uploads if up.get("cached")),
+            },
+        }
+        if inline_upload_errors:
+            resp["inline_upload_errors"] = inline_upload_errors
+        return jsonify(resp)
     except Exception as e:
         return jsonify({"success": False, "error": f"创建草稿失败: {e}"}), 500
 
@@ -686,38 +718,43 @@ def preview(filepath):
     # If filepath is a directory name, serve article.html inside it (with preview rewrite)
     if os.path.isdir(full):
         html_path = os.path.join(full, "article.html")
-        try:
-            with open(html_path, "r", encoding="utf-8") as f:
-                html = f.read()
-            # If local images exist, rewrite mmbiz urls to local filenames for preview
-            local_order = []
-            if os.path.exists(os.path.join(full, "cover.jpg")):
-                local_order.append("cover.jpg")
-            i = 1
-            while os.path.exists(os.path.join(full, f"inline_{i}.jpg")):
-                local_order.append(f"inline_{i}.jpg")
-                i += 1
-
-            if local_order and ("mmbiz.qpic.cn" in html):
-                import re
-                idx = 0
-
-                def _repl(m):
-                    nonlocal idx
-                    src = m.group(1)
-                    if "mmbiz.qpic.cn" in src and idx < len(local_order):
-                        rep = local_order[idx]
-                        idx += 1
-                        return f'src="{rep}"'
-                    return m.group(0)
-
-                html = re.sub(r'src="([^"]+)"', _repl, html)
-
-            return html, 200, {"Content-Type": "text/html; charset=utf-8"}
-        except Exception:
+        if not os.path.isfile(html_path):
             # Fallback to static file
             return send_from_directory(full, "article.html")
 
+        # If local images exist, rewrite mmbiz urls to local filenames for preview
+        local_order = []
+        if os.path.exists(os.path.join(full, "cover.jpg")):
+            local_order.append("cover.jpg")
+        i = 1
+        while os.path.exists(os.path.join(full, f"inline_{i}.jpg")):
+            local_order.append(f"inline_{i}.jpg")
+            i += 1
+
+        import re
+        idx = 0
+
+        def _repl(m):
+            nonlocal idx
+            src = m.group(1)
+            if "mmbiz.qpic.cn" in src and idx < len(local_order):
+                rep = local_order[idx]
+                idx += 1
+                return f'src="{rep}"'
+            return m.group(0)
+
+        def _stream():
+            # Line by line (the renderer keeps each <img src="..."> on one line),
+            # so long articles are never held in memory as a whole. Opened here, not
+            # before returning, so a response that is never iterated holds no handle.
+            with open(html_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if local_order and "mmbiz.qpic.cn" in line:
+                        line = re.sub(r'src="([^"]+)"', _repl, line)
+                    yield line
+
+        return Response(stream_with_context(_stream()), content_type="text/html; charset=utf-8")
+
     return send_from_directory(output_dir, filepath)
 
 
@@ -782,12 +819,16 @@ def _get_trend_dates(db_dir):
 
 @app.route("/api/layout/preview", methods=["POST"])
 def layout_preview():
-    """渲染一篇示例文章用于主题预览"""
+    """渲染一篇示例文章用于主题预览
+
+    默认返回 JSON {"html", "theme", "platform"}；请求体带 "stream": true 时（公众号风格）
+    直接以 text/html 流式返回，边渲染边输出。
+    """
     data = request.json or {}
     theme = data.get("theme", "snow-cold")
     platform = data.get("platform", "wechat")
 
-    from scripts.html_renderer import render_article
+    from scripts.html_renderer import iter_render_article, render_article
 
     if platform == "xhs":
         # 小红书风格预览
@@ -884,6 +925,10 @@ def layout_preview():
 </body></html>"""
         return jsonify({"html": html, "theme": theme, "platform": platform})
 
+    if data.get("stream"):
+        # Raw HTML, streamed section by section as it is rendered
+        return Response(stream_with_context(iter_render_article(title, subtitle, sections, theme=theme)),
+                        content_type="text/html; charset=utf-8")
     html = render_article(title, subtitle, sections, theme=theme)
     return jsonify({"html": html, "theme": theme, "platform": platform})
 
@@ -936,6 +981,7 @@ def get_autotopic():
         "enabled": False,
         "mode": "auto",
         "auto_count": 3,
+        "auto_push_draft": False,
         "manual_title_count": 5,
         "schedule": "0 9 * * *",
         "timezone": "Asia/Shanghai",
@@ -990,7 +1036,7 @@ def gzh_update_settings():
     if not isinstance(incoming, dict):
         return jsonify({"success": False, "error": "payload must be an object"}), 400
 
-    cfg = load_config()
+    cfg = load_config(mutable=True)
     cur = cfg.get("gzh") or {}
 
     def _merge(a: dict, b: dict) -> dict:
@@ -1144,8 +1190,6 @@ def gzh_write_api():
         return jsonify({"success": False, "error": "account_id and keyword are required"}), 400
 
     from scripts.article_service import create_generation_task, execute_generation_task
-    from scripts.llm import reset_metrics, get_metrics
-    reset_metrics()
 
     try:
         task = create_generation_task(
@@ -1180,14 +1224,13 @@ def gzh_write_api():
             article=article,
             topic_id=topic_id,
             outputs=outputs,
-            metrics={"task": {"status": done.get('status'), "images": done.get('images')}, "quality": done.get('quality', {}), "llm": get_metrics()},
+            metrics={"task": {"status": done.get('status'), "images": done.get('images')}, "quality": done.get('quality', {}), "llm": done.get('llm_metrics') or {}},
             dedup={},
             status='pushed' if payload.get('push_to_draft', True) else 'draft',
         )
     except Exception:
         pass
 
-    done['llm_metrics'] = get_metrics()
     return jsonify({"success": True, "result": done})
 @app.route("/api/gzh/published", methods=["POST"])
 def gzh_add_published_api():
@@ -1283,12 +1326,7 @@ def gzh_topics_generate_batch_api():
     if not account_id:
         return jsonify({"success": False, "error": "account_id is required"}), 400
 
-    accounts_data = load_json(ACCOUNTS_FILE, {"accounts": []})
-    acc = None
-    for a in accounts_data.get("accounts", []):
-        if (a.get("id") or "").strip() == account_id:
-            acc = a
-            break
+    acc = config_assets.get_account(account_id)
     if not acc:
         return jsonify({"success": False, "error": f"account not found: {account_id}"}), 404
 
@@ -1382,8 +1420,7 @@ def autotopic_run_once():
     import subprocess
 
     config = load_json(AUTOTOPIC_FILE, {})
-    accounts_data = load_json(ACCOUNTS_FILE, {"accounts": []})
-    accounts = accounts_data.get("accounts", [])
+    accounts = config_assets.get_accounts(mutable=True)
 
     result = run_autotopic(config=config, accounts=accounts)
 
@@ -1537,19 +1574,24 @@ def autotopic_generate():
 
     请求体:
     - selections: [{"account_id", "title", "platform", ...}]  (来自 /select)
-    - 或 mode: "auto" (自动模式，直接从 state 取 top N)
+    - 或 mode: "auto" (自动模式，直接从 state 取 top N；仅当 autotopic 配置
+      auto_push_draft=true 时才推送草稿箱)
     """
-    from scripts.article_service import create_generation_task, execute_generation_task
+    from scripts.article_service import create_generation_task, execute_generation_task, push_drafts_batched
 
     data = request.json or {}
     tasks = []
     results = []
+    # 公众号文章生成完后按账号合并成一个多图文草稿推送（而不是每篇一次）
+    to_push = []
 
     if data.get("mode") == "auto":
         state_file = os.path.join(PROJECT_ROOT, "output", "autotopic_state.json")
         state = load_json(state_file, {})
         at_config = load_json(AUTOTOPIC_FILE, {})
         auto_count = at_config.get("auto_count", 3)
+        # Auto mode only pushes drafts when explicitly enabled
+        auto_push = bool(at_config.get("auto_push_draft", False))
 
         for label, acc_data in state.get("accounts", {}).items():
             all_candidates = acc_data.get("candidates", []) + acc_data.get("self_candidates", [])
@@ -1566,6 +1608,8 @@ def autotopic_generate():
                     )
                     result = execute_generation_task(task)
                     results.append(result)
+                    if auto_push and result.get("platform") == "wechat_mp":
+                        to_push.append(result)
                 except Exception as e:
                     results.append({"error": str(e), "keyword": c.get("suggested_title", "")})
     else:
@@ -1583,14 +1627,17 @@ def autotopic_generate():
                     hot_title=sel.get("original_title", ""),
                     hot_url=sel.get("url", ""),
                     do_web_search=bool(sel.get("search_suggested")),
-                    push_to_draft=(sel.get("platform") == "wechat_mp"),
                     enqueue=False,
                 )
                 result = execute_generation_task(task)
                 results.append(result)
+                if sel.get("platform") == "wechat_mp":
+                    to_push.append(result)
             except Exception as e:
                 results.append({"error": str(e), "keyword": sel.get("title", "")})
 
+    push_drafts_batched(to_push)
+
     return jsonify({
         "success": True,
         "tasks": [{
@@ -1601,6 +1648,7 @@ def autotopic_generate():
             "account_id": t.get("account_id", ""),
             "keyword": t.get("keyword", ""),
             "error": t.get("error"),
+            "draft": t.get("draft"),
         } for t in results],
         "count": len(results),
     })
@@ -1613,8 +1661,7 @@ def autotopic_generate():
 @app.route("/api/writing_styles", methods=["GET"])
 def get_writing_styles():
     """获取所有写作风格模板"""
-    styles = load_json(STYLES_FILE, {"styles": []})
-    return jsonify(styles.get("styles", []))
+    return jsonify(config_assets.get_writing_styles())
 
 
 @app.route("/api/writing_styles", methods=["POST"])
@@ -1623,6 +1670,7 @@ def save_writing_styles():
     data = request.json
     if isinstance(data, list):
         save_json(STYLES_FILE, {"styles": data})
+        config_assets.invalidate(STYLES_FILE)
     else:
         return jsonify({"success": False, "error": "需要数组格式"}), 400
     return jsonify({"success": True})
@@ -1671,12 +1719,9 @@ def wechat_stats():
     account_id = request.args.get("account_id", "")
 
     # Find account credentials
-    accounts_data = load_json(ACCOUNTS_FILE, {"accounts": []})
-    acc = None
-    for a in accounts_data.get("accounts", []):
-        if a.get("id") == account_id and a.get("platform") == "wechat_mp":
-            acc = a
-            break
+    acc = config_assets.get_account(account_id)
+    if acc and acc.get("platform") != "wechat_mp":
+        acc = None
 
     if not acc:
         cfg = load_config()
@@ -1691,24 +1736,18 @@ def wechat_stats():
         return jsonify({"success": False, "error": "未配置公众号凭证（请在 Accounts 页面填写 AppID 和 Secret）", "articles": []})
 
     try:
-        import urllib.request
-        # Get access_token
-        token_url = f"https://api.weixin.qq.com/cgi-bin/token?grant_type=client_credential&appid={appid}&secret={secret}"
-        with urllib.request.urlopen(token_url, timeout=10) as resp:
-            token_data = json.loads(resp.read().decode())
-
-        access_token = token_data.get("access_token")
-        if not access_token:
-            errmsg = token_data.get("errmsg", "unknown")
-            errcode = token_data.get("errcode", "")
-            return jsonify({"success": False, "error": f"获取token失败: {errmsg} (errcode={errcode})", "articles": []})
+        from scripts.wechat_api import WeChatAPIError, get_client
+
+        # Shared access_token cache: fetching a fresh token here would revoke the one
+        # the pipeline / other workers are using.
+        client = get_client(appid, secret)
+        try:
+            client.access_token()
+        except WeChatAPIError as e:
+            return jsonify({"success": False, "error": f"获取token失败: {e.errmsg} (errcode={e.errcode})", "articles": []})
 
         # Get published articles (freepublish/batchget) — NOT drafts
-        pub_url = f"https://api.weixin.qq.com/cgi-bin/freepublish/batchget?access_token={access_token}"
-        req = urllib.request.Request(pub_url, data=json.dumps({"offset": 0, "count": 20, "no_content": 1}).encode(), method="POST")
-        req.add_header("Content-Type", "application/json")
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            pub_data = json.loads(resp.read().decode())
+        pub_data = client.post_json("/cgi-bin/freepublish/batchget", {"offset": 0, "count": 20, "no_content": 1})
 
         articles = []
         for item in pub_data.get("item", []):
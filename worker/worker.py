@@ -132,21 +132,30 @@ def notify_feishu(task: dict):
         log(f"Notify failed: {e}")
 
 
+def latest_draft_file() -> Path | None:
+    """Newest output/<dir>/draft.json (per article), or the legacy shared output/draft.json."""
+    files = list(OUTPUT_DIR.glob("*/draft.json"))
+    if DRAFT_FILE.exists():
+        files.append(DRAFT_FILE)
+    return max(files, key=lambda p: p.stat().st_mtime) if files else None
+
+
 def maybe_push_draft(task: dict) -> bool:
     """If draft.json exists and looks newer than task.created_at, push to WeChat draft box.
 
     Returns True if pushed successfully.
     """
-    if not DRAFT_FILE.exists():
+    draft_file = latest_draft_file()
+    if draft_file is None:
         return False
 
     created_at = parse_iso(task.get("created_at", ""))
     if created_at:
-        mtime = datetime.fromtimestamp(DRAFT_FILE.stat().st_mtime)
+        mtime = datetime.fromtimestamp(draft_file.stat().st_mtime)
         if mtime < created_at:
             return False
 
-    payload = read_json(DRAFT_FILE)
+    payload = read_json(draft_file)
     if not payload:
         return False
 